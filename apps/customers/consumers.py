@@ -0,0 +1,31 @@
+from channels.generic.websocket import AsyncWebsocketConsumer
+from asgiref.sync import sync_to_async
+import json
+from utils.availability import get_available_item_ids
+from utils.profiling import ProfiledConsumerMixin
+
+
+class MenuAvailabilityConsumer(ProfiledConsumerMixin, AsyncWebsocketConsumer):
+    """
+    Consumer for pushing the items whose availability changed at the branch
+    to clients.
+    """
+
+    async def connect(self):
+        self.branch_id = int(self.scope["url_route"]["kwargs"]["branch_id"])
+        self.group_name = f"menu_{self.branch_id}"
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+
+        await self.accept()
+        available = await sync_to_async(get_available_item_ids)(self.branch_id)
+        await self.send(text_data=json.dumps({"available": sorted(available)}))
+
+    async def disconnect(self, close_code):
+        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def get_availability(self, event):
+        await self.send(
+            text_data=json.dumps(
+                {"available": event["available"], "unavailable": event["unavailable"]}
+            )
+        )
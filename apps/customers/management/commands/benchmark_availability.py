@@ -0,0 +1,99 @@
+"""
+Benchmark of the availability matrix against the per-item menu loop.
+"""
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from utils.availability import AvailabilityMatrix
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the availability matrix with the per-item Python loop "
+        "on a synthetic menu. Nothing is written to the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=10000)
+        parser.add_argument("--branches", type=int, default=50)
+        parser.add_argument("--ingredients", type=int, default=500)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        item_ids = list(range(1, options["items"] + 1))
+        branch_ids = list(range(1, options["branches"] + 1))
+        ingredient_ids = list(range(1, options["ingredients"] + 1))
+
+        composition_rows = []
+        for item_id in item_ids:
+            for ingredient_id in rng.sample(ingredient_ids, rng.randint(2, 8)):
+                composition_rows.append(
+                    (item_id, ingredient_id, Decimal(rng.randint(1, 5000)) / 100)
+                )
+        stock_rows = [
+            (branch_id, ingredient_id, Decimal(rng.randint(0, 100000)) / 100)
+            for branch_id in branch_ids
+            for ingredient_id in ingredient_ids
+            if rng.random() > 0.05
+        ]
+        self.stdout.write(
+            f"{len(item_ids)} items, {len(branch_ids)} branches, "
+            f"{len(composition_rows)} compositions, {len(stock_rows)} stock rows"
+        )
+
+        started = time.perf_counter()
+        loop_result = available_items_loop(branch_ids, composition_rows, stock_rows)
+        loop_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        availability = AvailabilityMatrix.from_rows(
+            item_ids, branch_ids, composition_rows, stock_rows
+        )
+        matrix_result = {
+            branch_id: availability.available_item_ids(branch_id)
+            for branch_id in branch_ids
+        }
+        matrix_time = time.perf_counter() - started
+
+        if loop_result != matrix_result:
+            self.stderr.write("Results differ between the loop and the matrix.")
+            return
+
+        self.stdout.write(f"Python loop:         {loop_time * 1000:10.1f} ms")
+        self.stdout.write(f"Availability matrix: {matrix_time * 1000:10.1f} ms")
+        self.stdout.write(f"Speedup:             {loop_time / matrix_time:10.1f}x")
+
+
+def available_items_loop(branch_ids, composition_rows, stock_rows):
+    """
+    The per-item, per-composition loop that get_available_items used to run
+    for one branch, repeated for every branch.
+    """
+    compositions = {}
+    for item_id, ingredient_id, quantity in composition_rows:
+        compositions.setdefault(item_id, []).append((ingredient_id, quantity))
+    stock = {}
+    for branch_id, ingredient_id, quantity in stock_rows:
+        stock.setdefault(branch_id, {})[ingredient_id] = quantity
+
+    result = {}
+    for branch_id in branch_ids:
+        ingredient_quantities = stock.get(branch_id, {})
+        available = []
+        for item_id in sorted(compositions):
+            can_make = True
+            for ingredient_id, required_quantity in compositions[item_id]:
+                if (
+                    ingredient_id not in ingredient_quantities
+                    or ingredient_quantities[ingredient_id] < required_quantity
+                ):
+                    can_make = False
+                    break
+            if can_make:
+                available.append(item_id)
+        result[branch_id] = available
+    return result
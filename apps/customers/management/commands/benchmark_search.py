@@ -0,0 +1,81 @@
+"""
+Benchmark of the in-process menu search index.
+"""
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from utils.search.local import SearchIndex
+
+
+SYLLABLES = (
+    "ка пу чи но ла те ра ф мо ко ва ни ль шо ма ки ат эс пр со ме до ри ту".split()
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures p50/p99 query latency of the local search index on a "
+        "synthetic menu. Nothing is read from or written to the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--documents", type=int, default=50000)
+        parser.add_argument("--queries", type=int, default=2000)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        vocabulary = sorted(
+            {"".join(rng.choices(SYLLABLES, k=rng.randint(2, 5))) for _ in range(20000)}
+        )
+        categories = rng.sample(vocabulary, 40)
+        ingredients = rng.sample(vocabulary, 500)
+
+        index = SearchIndex()
+        started = time.perf_counter()
+        for document_id in range(1, options["documents"] + 1):
+            index.add(
+                {
+                    "id": document_id,
+                    "name": " ".join(rng.sample(vocabulary, rng.randint(1, 3))),
+                    "category_name": rng.choice(categories),
+                    "description": " ".join(rng.sample(vocabulary, 8)),
+                    "ingredients": [
+                        {"name": name} for name in rng.sample(ingredients, 4)
+                    ],
+                    "is_ready_made_product": document_id % 5 == 0,
+                }
+            )
+        build_time = time.perf_counter() - started
+
+        queries = []
+        for _ in range(options["queries"]):
+            word = rng.choice(vocabulary)
+            kind = rng.random()
+            if kind < 0.5:
+                queries.append(word[: rng.randint(2, len(word))])
+            elif kind < 0.8:
+                position = rng.randrange(len(word))
+                queries.append(word[:position] + word[position + 1 :] or word)
+            else:
+                queries.append(f"{word} {rng.choice(categories)[:3]}")
+
+        latencies = []
+        for query in queries:
+            started = time.perf_counter()
+            index.search(query)
+            latencies.append(time.perf_counter() - started)
+        latencies.sort()
+
+        def percentile(value):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * value))]
+
+        self.stdout.write(
+            f"{len(index)} documents, {len(index.tokens)} tokens, "
+            f"built in {build_time:.1f} s"
+        )
+        self.stdout.write(f"p50: {percentile(0.50) * 1000:8.2f} ms")
+        self.stdout.write(f"p99: {percentile(0.99) * 1000:8.2f} ms")
+        self.stdout.write(f"max: {latencies[-1] * 1000:8.2f} ms")
@@ -0,0 +1,6 @@
+from django.urls import re_path
+from .consumers import MenuAvailabilityConsumer
+
+websocket_urlpatterns = [
+    re_path(r"ws/menu/(?P<branch_id>\d+)/$", MenuAvailabilityConsumer.as_asgi()),
+]
@@ -4,10 +4,6 @@ Module for menu serializers
 from rest_framework import serializers
 from apps.ordering.models import Order, OrderItem
 from apps.storage.serializers import ItemSerializer, CategorySerializer
-from apps.customers.services import (
-    get_my_opened_orders_data,
-    get_my_closed_orders_data,
-)
 import random
 from apps.storage.models import Item, ReadyMadeProduct
 
@@ -262,16 +258,9 @@ class MyOrdersListSerializer(serializers.ModelSerializer):
 
 
 class UserOrdersSerializer(serializers.Serializer):
-    opened_orders = serializers.SerializerMethodField()
-    closed_orders = serializers.SerializerMethodField()
+    opened_orders = MyOrdersListSerializer(many=True)
+    closed_orders = MyOrdersListSerializer(many=True)
+    next_cursor = serializers.CharField(allow_null=True)
 
     class Meta:
-        fields = ["opened_orders", "closed_orders"]
-
-    def get_opened_orders(self, obj):
-        orders = get_my_opened_orders_data(obj)
-        return MyOrdersListSerializer(orders, many=True).data
-
-    def get_closed_orders(self, obj):
-        orders = get_my_closed_orders_data(obj)
-        return MyOrdersListSerializer(orders, many=True).data
+        fields = ["opened_orders", "closed_orders", "next_cursor"]
@@ -1,7 +1,8 @@
-from django.db.models import F
+from django.db.models import F, Prefetch
 from django.contrib.postgres.aggregates import StringAgg
 from apps.branches.models import Branch
-from apps.ordering.models import Order, OrderItem
+from apps.ordering.models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+from utils.pagination import PAGE_SIZE, paginate_many
 
 
 def get_branch_name_and_id_list():
@@ -14,36 +15,53 @@ def get_branch_name_and_id_list():
 
 def get_my_opened_orders_data(user):
     """
-    Get opened orders of the user.
+    Get opened orders of the user with their branches and items.
     """
-    orders = Order.objects.filter(
-        customer=user,
-        status__in=["new", "in_progress"],
-    ).only(
-        "id",
-        "branch__name_of_shop",
-        "branch__image",
-        "created_at",
+    orders = (
+        Order.objects.filter(
+            customer=user,
+            status__in=["new", "in_progress"],
+        )
+        .select_related("branch")
+        .prefetch_related(
+            Prefetch(
+                "items",
+                queryset=OrderItem.objects.select_related("item", "ready_made_product"),
+            )
+        )
+        .order_by("-created_at", "-id")
     )
 
     return orders
 
 
-def get_my_closed_orders_data(user):
+def get_my_closed_orders_data(user, position=None, limit=PAGE_SIZE):
     """
-    Get closed orders of the user.
+    Get the page of closed orders of the user after the position, hot and
+    archived, with their branches and items, and the cursor of the next
+    page.
     """
-    orders = Order.objects.filter(
-        customer=user,
-        status__in=["ready", "cancelled", "completed"],
-    ).only(
-        "id",
-        "branch__name_of_shop",
-        "branch__image",
-        "created_at",
-    )
+    querysets = [
+        model.objects.filter(
+            customer=user,
+            status__in=["ready", "canceled", "completed"],
+        )
+        .select_related("branch")
+        .prefetch_related(
+            Prefetch(
+                "items",
+                queryset=item_model.objects.select_related(
+                    "item", "ready_made_product"
+                ),
+            )
+        )
+        for model, item_model in (
+            (Order, OrderItem),
+            (ArchivedOrder, ArchivedOrderItem),
+        )
+    ]
 
-    return orders
+    return paginate_many(querysets, position, limit)
 
 
 def get_specific_order_data(order_id):
@@ -1,10 +1,20 @@
 """
 Module for testing customers app.
 """
-from django.test import TestCase
+import json
+
+from asgiref.testing import ApplicationCommunicator
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
 
 from apps.accounts.models import CustomUser as User
 from apps.branches.models import Branch, Schedule
+from apps.customers.routing import websocket_urlpatterns
+from apps.notices.models import OutboxEvent
+from apps.ordering.models import Order, OrderItem
 from apps.storage.models import (
     AvailableAtTheBranch,
     Category,
@@ -15,10 +25,20 @@ from apps.storage.models import (
     ReadyMadeProduct,
     ReadyMadeProductAvailableAtTheBranch,
 )
+from utils.availability import (
+    UNLIMITED,
+    build_availability_matrix,
+    get_available_item_ids,
+    get_reverse_index,
+)
 from utils.menu import (
+    check_if_items_can_be_made,
     get_available_items,
     get_available_ready_made_products,
+    item_search,
 )
+from utils.menu_cache import get_menu_cache_stats
+from utils.stock import decrement_ingredients
 
 
 class TestMenu(TestCase):
@@ -463,3 +483,423 @@ class TestReadyMadeProducts(TestCase):
             branch_id
         )
         self.assertEqual(len(ready_made_products_that_can_be_made), 2)
+
+
+# Test for availability matrix
+class TestAvailabilityMatrix(TestCase):
+    """
+    Test availability matrix
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Set up test data.
+        """
+        cls.schedeule = Schedule.objects.create(
+            title="Test schedule", description="Test description"
+        )
+        cls.branch1 = Branch.objects.create(
+            schedule=cls.schedeule,
+            name_of_shop="Branch",
+            address="213 Kurmanzhana Datka St, Osh, Kyrgyzstan",
+            phone_number="+996 509‒01‒09‒05",
+            link_to_map="https://2gis.kg/osh/firm/70000001059486856",
+        )
+        cls.branch2 = Branch.objects.create(
+            schedule=cls.schedeule,
+            name_of_shop="Brio",
+            address="211 Kurmanzhana Datka St, Osh, Kyrgyzstan",
+            phone_number="+996 550‒83‒25‒95",
+            link_to_map="https://2gis.kg/osh/firm/70000001030716336?m=72.794608%2C40.52689%2F18",
+        )
+        cls.category = Category.objects.create(name="Coffee")
+        cls.milk = Ingredient.objects.create(name="Milk", measurement_unit="ml")
+        cls.coffee = Ingredient.objects.create(name="Coffee", measurement_unit="g")
+        cls.latte = Item.objects.create(
+            name="Latte", description="Latte", category=cls.category, price=70
+        )
+        cls.espresso = Item.objects.create(
+            name="Espresso", description="Espresso", category=cls.category, price=50
+        )
+        cls.water = Item.objects.create(
+            name="Water", description="Water", category=cls.category, price=10
+        )
+        Composition.objects.create(item=cls.latte, ingredient=cls.milk, quantity=200)
+        Composition.objects.create(
+            item=cls.latte, ingredient=cls.coffee, quantity="7.50"
+        )
+        Composition.objects.create(
+            item=cls.espresso, ingredient=cls.coffee, quantity="7.50"
+        )
+        AvailableAtTheBranch.objects.create(
+            branch=cls.branch1, ingredient=cls.milk, quantity=1000
+        )
+        AvailableAtTheBranch.objects.create(
+            branch=cls.branch1, ingredient=cls.coffee, quantity="22.50"
+        )
+        AvailableAtTheBranch.objects.create(
+            branch=cls.branch2, ingredient=cls.coffee, quantity="7.49"
+        )
+
+    def test_max_quantity(self):
+        availability = build_availability_matrix()
+        self.assertEqual(availability.max_quantity(self.latte.id, self.branch1.id), 3)
+        self.assertEqual(
+            availability.max_quantity(self.espresso.id, self.branch1.id), 3
+        )
+        self.assertEqual(availability.max_quantity(self.latte.id, self.branch2.id), 0)
+        self.assertEqual(
+            availability.max_quantity(self.espresso.id, self.branch2.id), 0
+        )
+        self.assertEqual(
+            availability.max_quantity(self.water.id, self.branch2.id), UNLIMITED
+        )
+
+    def test_can_be_made(self):
+        availability = build_availability_matrix()
+        self.assertTrue(availability.can_be_made(self.latte.id, self.branch1.id, 3))
+        self.assertFalse(availability.can_be_made(self.latte.id, self.branch1.id, 4))
+        self.assertFalse(availability.can_be_made(self.espresso.id, self.branch2))
+        self.assertFalse(availability.can_be_made(0, self.branch1.id))
+
+    def test_matrix_agrees_with_check_if_items_can_be_made(self):
+        availability = build_availability_matrix()
+        for branch in [self.branch1, self.branch2]:
+            for item in [self.latte, self.espresso, self.water]:
+                for quantity in [1, 3, 4]:
+                    self.assertEqual(
+                        availability.can_be_made(item.id, branch.id, quantity),
+                        check_if_items_can_be_made(item.id, branch.id, quantity),
+                    )
+
+    def test_zero_requirement_does_not_limit(self):
+        Composition.objects.create(item=self.water, ingredient=self.milk, quantity=0)
+        AvailableAtTheBranch.objects.filter(
+            branch=self.branch1, ingredient=self.milk
+        ).update(quantity=0)
+        availability = build_availability_matrix()
+        self.assertEqual(
+            availability.max_quantity(self.water.id, self.branch1.id), UNLIMITED
+        )
+        self.assertTrue(check_if_items_can_be_made(self.water.id, self.branch1.id, 1))
+
+    def test_get_available_items(self):
+        item_ids = [item["id"] for item in get_available_items(self.branch2.id)]
+        self.assertEqual(item_ids, [self.water.id])
+
+    def test_reverse_index(self):
+        cache.clear()
+        index = get_reverse_index()
+        self.assertEqual(index[self.milk.id], {self.latte.id})
+        self.assertEqual(index[self.coffee.id], {self.latte.id, self.espresso.id})
+
+    def test_incremental_update(self):
+        cache.clear()
+        self.assertEqual(
+            get_available_item_ids(self.branch1.id),
+            {self.latte.id, self.espresso.id, self.water.id},
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            decrement_ingredients(self.branch1.id, {self.milk.id: 900})
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                get_available_item_ids(self.branch1.id),
+                {self.espresso.id, self.water.id},
+            )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            AvailableAtTheBranch.objects.filter(
+                branch=self.branch1, ingredient=self.coffee
+            ).first().save()
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                get_available_item_ids(self.branch1.id),
+                {self.espresso.id, self.water.id},
+            )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Composition.objects.filter(item=self.latte, ingredient=self.milk).delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                get_available_item_ids(self.branch1.id),
+                {self.latte.id, self.espresso.id, self.water.id},
+            )
+        self.assertEqual(
+            list(
+                OutboxEvent.objects.filter(
+                    group=f"menu_{self.branch1.id}", type="get_availability"
+                )
+                .order_by("id")
+                .values_list("payload", flat=True)
+            ),
+            [
+                {"available": [], "unavailable": [self.latte.id]},
+                {"available": [self.latte.id], "unavailable": []},
+            ],
+        )
+
+    async def test_availability_changes_are_pushed_to_clients(self):
+        communicator = ApplicationCommunicator(
+            URLRouter(websocket_urlpatterns),
+            {
+                "type": "websocket",
+                "path": f"/ws/menu/{self.branch2.id}/",
+                "headers": [],
+                "subprotocols": [],
+            },
+        )
+        await communicator.send_input({"type": "websocket.connect"})
+        response = await communicator.receive_output()
+        self.assertEqual(response["type"], "websocket.accept")
+        response = await communicator.receive_output()
+        self.assertEqual(json.loads(response["text"]), {"available": [self.water.id]})
+
+        await get_channel_layer().group_send(
+            f"menu_{self.branch2.id}",
+            {"type": "get_availability", "available": [], "unavailable": [1]},
+        )
+        response = await communicator.receive_output()
+        self.assertEqual(
+            json.loads(response["text"]), {"available": [], "unavailable": [1]}
+        )
+        await communicator.send_input({"type": "websocket.disconnect", "code": 1000})
+        await communicator.wait()
+
+
+# Test for menu snapshot cache
+class TestMenuSnapshot(TestCase):
+    """
+    Test menu snapshot cache
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Set up test data.
+        """
+        cls.schedeule = Schedule.objects.create(
+            title="Test schedule", description="Test description"
+        )
+        cls.branch = Branch.objects.create(
+            schedule=cls.schedeule,
+            name_of_shop="Branch",
+            address="213 Kurmanzhana Datka St, Osh, Kyrgyzstan",
+            phone_number="+996 509‒01‒09‒05",
+            link_to_map="https://2gis.kg/osh/firm/70000001059486856",
+        )
+        cls.user = User.objects.create(
+            phone_number="+996777777777",
+            username="abdu",
+            branch=cls.branch,
+        )
+        cls.category = Category.objects.create(name="Coffee")
+        cls.milk = Ingredient.objects.create(name="Milk", measurement_unit="ml")
+        cls.latte = Item.objects.create(
+            name="Latte", description="Latte", category=cls.category, price=70
+        )
+        Composition.objects.create(item=cls.latte, ingredient=cls.milk, quantity=200)
+        AvailableAtTheBranch.objects.create(
+            branch=cls.branch, ingredient=cls.milk, quantity=200
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_menu_ids(self):
+        response = self.client.get("/customers/menu")
+        self.assertEqual(response.status_code, 200)
+        return [item["id"] for item in response.data]
+
+    def test_hits_and_misses(self):
+        self.assertEqual(self.get_menu_ids(), [self.latte.id])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_menu_ids(), [self.latte.id])
+        stats = get_menu_cache_stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+
+    def test_stock_change_invalidates_snapshot(self):
+        self.assertEqual(self.get_menu_ids(), [self.latte.id])
+        decrement_ingredients(self.branch.id, {self.milk.id: 1})
+        self.assertEqual(self.get_menu_ids(), [])
+        self.assertEqual(get_menu_cache_stats()["misses"], 2)
+
+    def test_item_change_invalidates_snapshot(self):
+        self.get_menu_ids()
+        self.latte.name = "Raf"
+        self.latte.save()
+        response = self.client.get("/customers/menu")
+        self.assertEqual(response.data[0]["name"], "Raf")
+
+
+# Test for local search backend
+@override_settings(MENU_SEARCH_BACKEND="local")
+class TestLocalSearch(TestCase):
+    """
+    Test local search backend
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Set up test data.
+        """
+        cls.schedeule = Schedule.objects.create(
+            title="Test schedule", description="Test description"
+        )
+        cls.branch1 = Branch.objects.create(
+            schedule=cls.schedeule,
+            name_of_shop="Branch",
+            address="213 Kurmanzhana Datka St, Osh, Kyrgyzstan",
+            phone_number="+996 509‒01‒09‒05",
+            link_to_map="https://2gis.kg/osh/firm/70000001059486856",
+        )
+        cls.branch2 = Branch.objects.create(
+            schedule=cls.schedeule,
+            name_of_shop="Brio",
+            address="211 Kurmanzhana Datka St, Osh, Kyrgyzstan",
+            phone_number="+996 550‒83‒25‒95",
+            link_to_map="https://2gis.kg/osh/firm/70000001030716336?m=72.794608%2C40.52689%2F18",
+        )
+        cls.user = User.objects.create(
+            phone_number="+996777777777", username="abdu", branch=cls.branch1
+        )
+        cls.coffee = Category.objects.create(name="Кофе")
+        cls.milk = Ingredient.objects.create(name="Молоко", measurement_unit="ml")
+        cls.cappuccino = Item.objects.create(
+            name="Капуччино",
+            description="Эспрессо с молочной пенкой",
+            category=cls.coffee,
+            price=70,
+        )
+        cls.americano = Item.objects.create(
+            name="Американо", description="Черный кофе", category=cls.coffee, price=50
+        )
+        Composition.objects.create(
+            item=cls.cappuccino, ingredient=cls.milk, quantity=150
+        )
+        AvailableAtTheBranch.objects.create(
+            branch=cls.branch1, ingredient=cls.milk, quantity=1000
+        )
+        cls.croissant = ReadyMadeProduct.objects.create(
+            name="Круассан", description="Слоеный", category=cls.coffee, price=40
+        )
+        ReadyMadeProductAvailableAtTheBranch.objects.create(
+            branch=cls.branch1, ready_made_product=cls.croissant, quantity=5
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def search(self, query, branch=None):
+        return [
+            (hit["id"], hit["is_ready_made_product"])
+            for hit in item_search(query, (branch or self.branch1).id)
+        ]
+
+    def test_prefix_and_typo(self):
+        self.assertEqual(self.search("капу"), [(self.cappuccino.id, False)])
+        self.assertEqual(self.search("капучино"), [(self.cappuccino.id, False)])
+
+    def test_fields_and_ranking(self):
+        self.assertEqual(self.search("молоко"), [(self.cappuccino.id, False)])
+        self.assertEqual(
+            self.search("кофе"),
+            [
+                (self.americano.id, False),
+                (self.cappuccino.id, False),
+                (self.croissant.id, True),
+            ],
+        )
+        self.assertEqual(self.search("черный кофе"), [(self.americano.id, False)])
+
+    def test_branch_availability(self):
+        self.assertEqual(
+            self.search("кофе", self.branch2), [(self.americano.id, False)]
+        )
+
+    def test_incremental_update(self):
+        self.search("кофе")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.americano.name = "Раф"
+            self.americano.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.croissant.delete()
+        self.assertEqual(self.search("раф"), [(self.americano.id, False)])
+        self.assertEqual(self.search("американо"), [])
+        self.assertEqual(self.search("круассан"), [])
+
+    def test_search_view(self):
+        response = self.client.get("/customers/search/", {"query": "капу"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]["name"], "Капуччино")
+        self.assertEqual(response.data[0]["branch_id"], self.branch1.id)
+
+
+class TestMyOrders(TestCase):
+    """
+    Test the orders of the customer
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Set up test data.
+        """
+        cls.schedeule = Schedule.objects.create(
+            title="Test schedule", description="Test description"
+        )
+        cls.branch = Branch.objects.create(
+            schedule=cls.schedeule,
+            name_of_shop="Branch",
+            address="213 Kurmanzhana Datka St, Osh, Kyrgyzstan",
+            phone_number="+996 509‒01‒09‒05",
+            link_to_map="https://2gis.kg/osh/firm/70000001059486856",
+        )
+        cls.user = User.objects.create(phone_number="+996555555555", username="client")
+        category = Category.objects.create(name="Coffee")
+        latte = Item.objects.create(
+            name="Латте", description="Test", category=category, price=100
+        )
+        cls.orders = {}
+        for status in ["new", "completed", "canceled", "ready", "completed"]:
+            order = Order.objects.create(
+                customer=cls.user, branch=cls.branch, total_price=100, status=status
+            )
+            OrderItem.objects.create(order=order, item=latte, quantity=1)
+            cls.orders.setdefault(status, []).append(order.id)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_closed_orders_are_paged(self):
+        response = self.client.get("/customers/my-orders/", {"limit": 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [order["id"] for order in response.data["opened_orders"]],
+            self.orders["new"],
+        )
+        closed = sorted(
+            self.orders["completed"] + self.orders["canceled"] + self.orders["ready"],
+            reverse=True,
+        )
+        self.assertEqual(
+            [order["id"] for order in response.data["closed_orders"]], closed[:3]
+        )
+        self.assertEqual(response.data["closed_orders"][0]["order_items"], "Латте")
+
+        response = self.client.get(
+            "/customers/my-orders/",
+            {"limit": 3, "cursor": response.data["next_cursor"]},
+        )
+        self.assertEqual(
+            [order["id"] for order in response.data["closed_orders"]], closed[3:]
+        )
+        self.assertIsNone(response.data["next_cursor"])
@@ -1,3 +1,4 @@
+from django.http import Http404
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import status
@@ -10,6 +11,7 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from apps.ordering.archive import get_order_or_archived
 from apps.ordering.models import Order
 from apps.branches.models import Branch
 from apps.storage.models import Item, ReadyMadeProduct
@@ -18,9 +20,11 @@ from utils.menu import (
     item_search,
     get_popular_items,
     combine_items_and_ready_made_products,
-    check_if_items_can_be_made,
     check_if_ready_made_product_can_be_made,
 )
+from utils.availability import build_availability_matrix
+from utils.menu_cache import get_or_build_snapshot
+from utils.pagination import PAGE_PARAMETERS, get_page_params
 from apps.storage.serializers import ItemSerializer
 from .serializers import (
     ChangeBranchSerializer,
@@ -31,6 +35,7 @@ from .serializers import (
     UserOrdersSerializer,
     MenuItemDetailSerializer,
 )
+from .services import get_my_closed_orders_data, get_my_opened_orders_data
 
 
 # =============================================================
@@ -54,9 +59,17 @@ class Menu(APIView):
         """
         user = request.user
         category_id = request.GET.get("category_id")
-        items = combine_items_and_ready_made_products(user.branch.id, category_id)
-        serializer = ExtendedItemSerializer(items, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        data = get_or_build_snapshot(
+            user.branch.id,
+            category_id,
+            lambda: list(
+                ExtendedItemSerializer(
+                    combine_items_and_ready_made_products(user.branch.id, category_id),
+                    many=True,
+                ).data
+            ),
+        )
+        return Response(data, status=status.HTTP_200_OK)
 
 
 class MenuItemDetailView(APIView):
@@ -249,7 +262,10 @@ class CheckIfItemCanBeMadeView(APIView):
                     {"message": "Item can't be made."},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
-            if check_if_items_can_be_made(item_id, user.branch.id, quantity):
+            availability = build_availability_matrix(
+                [user.branch.id], item_ids=[item_id]
+            )
+            if availability.can_be_made(item_id, user.branch.id, quantity):
                 return Response(
                     {"message": "Item can be made."},
                     status=status.HTTP_200_OK,
@@ -353,7 +369,11 @@ class MyOrdersView(APIView):
 
     @swagger_auto_schema(
         operation_summary="Get orders",
-        operation_description="Use this endpoint to get user's orders.",
+        operation_description=(
+            "Use this endpoint to get user's orders. The closed orders are "
+            "paged, the cursor and limit parameters select their page."
+        ),
+        manual_parameters=PAGE_PARAMETERS,
         responses={
             200: openapi.Response("User's orders"),
         },
@@ -362,8 +382,22 @@ class MyOrdersView(APIView):
         """
         Get user's orders.
         """
+        try:
+            position, limit = get_page_params(request)
+        except ValueError:
+            return Response(
+                {"error": "Invalid cursor or limit"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
         user = request.user
-        serializer = UserOrdersSerializer(user)
+        closed_orders, next_cursor = get_my_closed_orders_data(user, position, limit)
+        serializer = UserOrdersSerializer(
+            {
+                "opened_orders": get_my_opened_orders_data(user),
+                "closed_orders": closed_orders,
+                "next_cursor": next_cursor,
+            }
+        )
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
@@ -371,3 +405,13 @@ class MyOrderDetailView(RetrieveAPIView):
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
     queryset = Order.objects.all()
+
+    def get_object(self):
+        """
+        Get the order or the archived order.
+        """
+        order = get_order_or_archived(self.kwargs["pk"])
+        if order is None:
+            raise Http404
+        self.check_object_permissions(self.request, order)
+        return order
@@ -21,8 +21,8 @@ class ClentNotificationAdmin(admin.ModelAdmin):
 
 
 class AdminNotificationAdmin(admin.ModelAdmin):
-    list_display = ("title", "text", "branch", "date_of_notification")
-    list_filter = ("branch", "date_of_notification")
+    list_display = ("title", "text", "branch", "kind", "date_of_notification")
+    list_filter = ("branch", "kind", "date_of_notification")
 
 
 class ReminderAdmin(admin.ModelAdmin):
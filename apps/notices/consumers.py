@@ -1,6 +1,11 @@
 import json
+from abc import ABC, abstractmethod
+
 from channels.generic.websocket import AsyncWebsocketConsumer
 from asgiref.sync import sync_to_async
+from django.db.models import F
+
+from utils.profiling import ProfiledConsumerMixin
 from .models import (
     BaristaNotification,
     ClentNotification,
@@ -9,50 +14,135 @@ from .models import (
 )
 
 
-class OrderNotificationToBaristaConsumer(AsyncWebsocketConsumer):
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class NotificationStreamConsumer(ProfiledConsumerMixin, AsyncWebsocketConsumer, ABC):
     """
-    Consumer for sending notifications to barista.
+    Base consumer that pushes notification changes as deltas.
+
+    On connect only the newest page is sent. Every event carries the ids of
+    the notifications that were created, updated or deleted, and only those
+    exact notifications are read and sent, so notifications that commit out
+    of id order are not missed. Older pages are requested with
+    {"action": "history", "before_id": id, "limit": n}, and a reconnecting
+    client catches up on what it missed with
+    {"action": "catch_up", "after_id": id, "limit": n}.
     """
 
+    group_name = None
+
+    @abstractmethod
+    def get_queryset(self):
+        """
+        Returns the notifications of the stream.
+        """
+
+    @abstractmethod
+    def serialize(self, notification):
+        """
+        Returns the notification as the dict sent to the client.
+        """
+
     async def connect(self):
-        self.branch_id = self.scope["url_route"]["kwargs"]["branch_id"]
-        self.branch_group_name = f"branch_{self.branch_id}"
         # Connect to group
-        await self.channel_layer.group_add(self.branch_group_name, self.channel_name)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
 
         await self.accept()
-        await self.get_notification()
+        notifications, has_more = await sync_to_async(
+            self.get_page, thread_sensitive=True
+        )()
+        await self.send(
+            text_data=json.dumps({"notifications": notifications, "has_more": has_more})
+        )
 
     async def disconnect(self, close_code):
         # Disconnect from group
-        await self.channel_layer.group_discard(
-            self.branch_group_name, self.channel_name
+        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    def get_page(self, before_id=None, limit=PAGE_SIZE):
+        """
+        Returns the page of notifications older than before_id, oldest
+        first, and whether there are older ones.
+        """
+        queryset = self.get_queryset()
+        if before_id is not None:
+            queryset = queryset.filter(id__lt=before_id)
+        notifications = list(queryset.order_by("-id")[: limit + 1])
+        page = [self.serialize(notification) for notification in notifications[:limit]]
+        return page[::-1], len(notifications) > limit
+
+    def get_catch_up(self, after_id, limit=PAGE_SIZE):
+        """
+        Returns the notifications newer than after_id, oldest first, and
+        whether there are newer ones.
+        """
+        notifications = list(
+            self.get_queryset().filter(id__gt=after_id).order_by("id")[: limit + 1]
         )
+        page = [self.serialize(notification) for notification in notifications[:limit]]
+        return page, len(notifications) > limit
+
+    def get_changes(self, created_ids, updated_ids):
+        """
+        Returns the created and the updated notifications of the event.
+        """
+        ids = set(created_ids) | set(updated_ids)
+        if not ids:
+            return [], []
+        notifications = {
+            notification.id: self.serialize(notification)
+            for notification in self.get_queryset().filter(id__in=ids).order_by("id")
+        }
+        created = [
+            notifications.pop(notification_id)
+            for notification_id in sorted(set(created_ids))
+            if notification_id in notifications
+        ]
+        return created, list(notifications.values())
 
     async def get_notification(self, event=None):
-        notifications = await sync_to_async(list, thread_sensitive=True)(
-            BaristaNotification.objects.filter(branch_id=self.branch_id)
+        event = event or {}
+        created, updated = await sync_to_async(self.get_changes, thread_sensitive=True)(
+            event.get("created", []), event.get("updated", [])
         )
-        notifications_list = []
-        for notification in notifications:
-            notifications_list.append(
-                {
-                    "id": notification.id,
-                    "order_id": notification.order_id,
-                    "title": notification.title,
-                    "body": notification.body,
-                    "exactly_time": notification.created_at.strftime("%H:%M"),
-                    "created_at": notification.created_at.strftime("%d.%m.%Y"),
-                }
+        deleted = event.get("deleted", [])
+        if created or updated or deleted:
+            await self.send(
+                text_data=json.dumps(
+                    {"created": created, "updated": updated, "deleted": deleted}
+                )
             )
-        await self.send(text_data=json.dumps({"notifications": notifications_list}))
 
     async def get_notification_handler(self, event):
         await self.get_notification()
 
     async def receive(self, text_data):
-        text_data_json = json.loads(text_data)
-        # Handle received data if needed
+        try:
+            request = json.loads(text_data)
+            action = request.get("action")
+            if action not in ("history", "catch_up"):
+                return
+            limit = min(max(int(request.get("limit", PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+            if action == "history":
+                before_id = request.get("before_id")
+                before_id = int(before_id) if before_id is not None else None
+            else:
+                after_id = int(request["after_id"])
+        except (ValueError, TypeError, AttributeError, KeyError):
+            return
+        if action == "history":
+            notifications, has_more = await sync_to_async(
+                self.get_page, thread_sensitive=True
+            )(before_id, limit)
+        else:
+            notifications, has_more = await sync_to_async(
+                self.get_catch_up, thread_sensitive=True
+            )(after_id, limit)
+        await self.send(
+            text_data=json.dumps({action: notifications, "has_more": has_more})
+        )
 
     async def receive_get_notification(self, event):
         await self.get_notification()
@@ -60,76 +150,66 @@ class OrderNotificationToBaristaConsumer(AsyncWebsocketConsumer):
     async def send_order_notification(self, event):
         order = event["order"]
 
-        # Send message to barista
         await self.send(text_data=json.dumps({"order": order}))
 
     async def handle_get_notification(self, event):
         await self.get_notification()
 
 
-# =============================================================
-# Client Notifications
-# =============================================================
-class NotificationToClentConsumer(AsyncWebsocketConsumer):
+class OrderNotificationToBaristaConsumer(NotificationStreamConsumer):
     """
-    Consumer for sending notifications to client.
+    Consumer for sending notifications to barista.
     """
 
     async def connect(self):
-        self.user_id = self.scope["url_route"]["kwargs"]["user_id"]
-        self.user_group_name = f"user_{self.user_id}"
-        # Connect to group
-        await self.channel_layer.group_add(self.user_group_name, self.channel_name)
-
-        await self.accept()
-        await self.get_notification()
-
-    async def disconnect(self, close_code):
-        # Disconnect from group
+        self.branch_id = self.scope["url_route"]["kwargs"]["branch_id"]
+        self.group_name = f"branch_{self.branch_id}"
+        await super().connect()
 
-        await self.channel_layer.group_discard(self.user_group_name, self.channel_name)
+    def get_queryset(self):
+        return BaristaNotification.objects.filter(branch_id=self.branch_id)
 
-    async def get_notification(self, event=None):
-        # Send message to barista
-        notifications = await sync_to_async(list, thread_sensitive=True)(
-            ClentNotification.objects.filter(client_id=self.user_id)
-        )
-        notifications_list = []
-        for notification in notifications:
-            notifications_list.append(
-                {
-                    "id": notification.id,
-                    "title": notification.title,
-                    "body": notification.body,
-                    "exactly_time": notification.created_at.strftime("%H:%M"),
-                    "created_at": notification.created_at.strftime("%d.%m.%Y"),
-                }
-            )
-        await self.send(text_data=json.dumps({"notifications": notifications_list}))
+    def serialize(self, notification):
+        return {
+            "id": notification.id,
+            "order_id": notification.order_id,
+            "title": notification.title,
+            "body": notification.body,
+            "exactly_time": notification.created_at.strftime("%H:%M"),
+            "created_at": notification.created_at.strftime("%d.%m.%Y"),
+        }
 
-    async def get_notification_handler(self, event):
-        await self.get_notification()
 
-    async def receive(self, text_data):
-        text_data_json = json.loads(text_data)
-
-    async def send_order_notification(self, event):
-        order = event["order"]
+# =============================================================
+# Client Notifications
+# =============================================================
+class NotificationToClentConsumer(NotificationStreamConsumer):
+    """
+    Consumer for sending notifications to client.
+    """
 
-        # Send message to barista
-        await self.send(text_data=json.dumps({"order": order}))
+    async def connect(self):
+        self.user_id = self.scope["url_route"]["kwargs"]["user_id"]
+        self.group_name = f"user_{self.user_id}"
+        await super().connect()
 
-    async def handle_get_notification(self, event):
-        await self.get_notification()
+    def get_queryset(self):
+        return ClentNotification.objects.filter(client_id=self.user_id)
 
-    async def receive_get_notification(self, event):
-        await self.get_notification()
+    def serialize(self, notification):
+        return {
+            "id": notification.id,
+            "title": notification.title,
+            "body": notification.body,
+            "exactly_time": notification.created_at.strftime("%H:%M"),
+            "created_at": notification.created_at.strftime("%d.%m.%Y"),
+        }
 
 
 # =============================================================
 # Admin Notifications
 # =============================================================
-class NotificationToAdminConsumer(AsyncWebsocketConsumer):
+class NotificationToAdminConsumer(ProfiledConsumerMixin, AsyncWebsocketConsumer):
     """
     Consumer for sending notifications to admin.
     """
@@ -149,24 +229,32 @@ class NotificationToAdminConsumer(AsyncWebsocketConsumer):
     async def get_admin_notification(self, event=None):
         # Send message to barista
         notifications = await sync_to_async(list, thread_sensitive=True)(
-            AdminNotification.objects.select_related("branch").all()
-        )
-        notifications_list = []
-        for notification in notifications:
-            branch_name = await sync_to_async(getattr, thread_sensitive=True)(
-                notification.branch, "name_of_shop"
-            )
-            notifications_list.append(
-                {
-                    "id": notification.id,
-                    "title": notification.title,
-                    "text": notification.text,
-                    "branch": branch_name,
-                    "date_of_notification": notification.date_of_notification.strftime(
-                        "%d.%m.%Y"
-                    ),
-                }
+            AdminNotification.objects.order_by("-id").values(
+                "id",
+                "title",
+                "text",
+                "kind",
+                "ingredient_id",
+                "ready_made_product_id",
+                "date_of_notification",
+                branch_name=F("branch__name_of_shop"),
             )
+        )
+        notifications_list = [
+            {
+                "id": notification["id"],
+                "title": notification["title"],
+                "text": notification["text"],
+                "branch": notification["branch_name"],
+                "kind": notification["kind"],
+                "ingredient": notification["ingredient_id"],
+                "ready_made_product": notification["ready_made_product_id"],
+                "date_of_notification": notification["date_of_notification"].strftime(
+                    "%d.%m.%Y"
+                ),
+            }
+            for notification in notifications
+        ]
         await self.send(text_data=json.dumps({"notifications": notifications_list}))
 
     async def get_admin_notification_handler(self, event):
@@ -185,7 +273,7 @@ class NotificationToAdminConsumer(AsyncWebsocketConsumer):
 # =============================================================
 # Reminder
 # =============================================================
-class ReminderConsumer(AsyncWebsocketConsumer):
+class ReminderConsumer(ProfiledConsumerMixin, AsyncWebsocketConsumer):
     """
     Consumer for sending reminders to admin.
     """
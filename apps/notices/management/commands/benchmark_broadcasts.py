@@ -0,0 +1,53 @@
+"""
+Benchmark of websocket refresh coalescing during an order burst.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.notices.outbox import (
+    get_broadcast_stats,
+    publish_event,
+    relay_outbox,
+    reset_broadcast_stats,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Publishes the refresh events of a synthetic burst of orders, each in "
+        "its own transaction, and reports how many broadcasts were suppressed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=500)
+        parser.add_argument("--branches", type=int, default=5)
+        parser.add_argument("--clients", type=int, default=50)
+
+    def handle(self, *args, **options):
+        reset_broadcast_stats()
+        started = time.perf_counter()
+        for number in range(options["orders"]):
+            branch_id = number % options["branches"] + 1
+            client_id = number % options["clients"] + 1
+            # The events of one create_order: the order board refresh, the
+            # barista notification and the client notification.
+            with transaction.atomic():
+                publish_event(f"new_orders_takeaway_{branch_id}", "get_new_orders")
+                publish_event(f"new_orders_institution_{branch_id}", "get_new_orders")
+            with transaction.atomic():
+                publish_event(f"branch_{branch_id}", "get_notification")
+            with transaction.atomic():
+                publish_event(f"user_{client_id}", "get_notification")
+        # Flush the events left for the trailing relay.
+        relay_outbox(throttle=False)
+        elapsed = time.perf_counter() - started
+
+        stats = get_broadcast_stats()
+        events = stats["sent"] + stats["suppressed"]
+        self.stdout.write(
+            f"{events} events of {options['orders']} orders in {elapsed:.2f} s: "
+            f"{stats['sent']} broadcasts sent, {stats['suppressed']} suppressed "
+            f"({stats['suppression_rate']:.1%})."
+        )
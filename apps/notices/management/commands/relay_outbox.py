@@ -0,0 +1,40 @@
+"""
+Relay of the websocket events outbox.
+"""
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.notices.outbox import get_outbox_latency, purge_outbox, relay_outbox
+
+
+class Command(BaseCommand):
+    help = (
+        "Publishes the outbox events that were not relayed after their commit "
+        "and deletes old published events."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=1.0)
+        parser.add_argument("--retention-hours", type=int, default=24)
+        parser.add_argument(
+            "--once", action="store_true", help="Relay once and print latency."
+        )
+
+    def handle(self, *args, **options):
+        retention = timedelta(hours=options["retention_hours"])
+        while True:
+            sent = relay_outbox()
+            purged = purge_outbox(timezone.now() - retention)
+            if options["once"]:
+                latency = get_outbox_latency()
+                self.stdout.write(
+                    f"Sent {sent} and purged {purged} events. Latency of the "
+                    f"last {latency['events']} events: p50 {latency['p50'] * 1000:.1f} "
+                    f"ms, p99 {latency['p99'] * 1000:.1f} ms, "
+                    f"max {latency['max'] * 1000:.1f} ms."
+                )
+                return
+            time.sleep(options["interval"])
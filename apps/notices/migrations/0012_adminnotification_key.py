@@ -0,0 +1,104 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:37
+
+import re
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+INGREDIENT_TEXT = re.compile(r"^Ингредиент (?P<name>.+) в филиале .+ заканчивается$")
+READY_MADE_PRODUCT_TEXT = re.compile(
+    r"^Готовый продукт (?P<name>.+) в филиале .+ заканчивается$"
+)
+
+
+def set_notification_keys(apps, schema_editor):
+    """
+    Sets the keys of the existing low stock notifications from their text
+    and deletes the older duplicates of a key.
+    """
+    AdminNotification = apps.get_model("notices", "AdminNotification")
+    Ingredient = apps.get_model("storage", "Ingredient")
+    ReadyMadeProduct = apps.get_model("storage", "ReadyMadeProduct")
+    patterns = [
+        (
+            INGREDIENT_TEXT,
+            "ingredient_id",
+            dict(Ingredient.objects.values_list("name", "id")),
+        ),
+        (
+            READY_MADE_PRODUCT_TEXT,
+            "ready_made_product_id",
+            dict(ReadyMadeProduct.objects.values_list("name", "id")),
+        ),
+    ]
+    keys = set()
+    for notification in AdminNotification.objects.order_by("-id"):
+        for pattern, field, ids in patterns:
+            match = pattern.match(notification.text)
+            if match is None or match["name"] not in ids:
+                continue
+            key = (field, notification.branch_id, ids[match["name"]])
+            if key in keys:
+                notification.delete()
+            else:
+                keys.add(key)
+                setattr(notification, field, ids[match["name"]])
+                notification.save(update_fields=[field])
+            break
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("storage", "0018_algoliarecord"),
+        ("notices", "0011_outboxevent"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="adminnotification",
+            name="ingredient",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="admin_notifications",
+                to="storage.ingredient",
+            ),
+        ),
+        migrations.AddField(
+            model_name="adminnotification",
+            name="kind",
+            field=models.CharField(
+                choices=[("low_stock", "Low stock")], default="low_stock", max_length=32
+            ),
+        ),
+        migrations.AddField(
+            model_name="adminnotification",
+            name="ready_made_product",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="admin_notifications",
+                to="storage.readymadeproduct",
+            ),
+        ),
+        migrations.RunPython(set_notification_keys, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="adminnotification",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("ingredient__isnull", False)),
+                fields=("kind", "branch", "ingredient"),
+                name="admin_notification_ingredient_key",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="adminnotification",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("ready_made_product__isnull", False)),
+                fields=("kind", "branch", "ready_made_product"),
+                name="admin_notification_product_key",
+            ),
+        ),
+    ]
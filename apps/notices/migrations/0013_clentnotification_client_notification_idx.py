@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("notices", "0012_adminnotification_key"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="clentnotification",
+            index=models.Index(
+                fields=["client_id", "-id"], name="client_notification_idx"
+            ),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from apps.branches.models import Branch
+from apps.storage.models import Ingredient, ReadyMadeProduct
 
 
 class BaristaNotification(models.Model):
@@ -24,16 +25,53 @@ class ClentNotification(models.Model):
     def __str__(self):
         return f"{self.client_id} - {self.title}"
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["client_id", "-id"], name="client_notification_idx"),
+        ]
+
 
 class AdminNotification(models.Model):
+    LOW_STOCK = "low_stock"
+    KIND_CHOICES = ((LOW_STOCK, "Low stock"),)
+
     title = models.CharField(max_length=255)
     text = models.TextField()
     branch = models.ForeignKey(Branch, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=32, choices=KIND_CHOICES, default=LOW_STOCK)
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="admin_notifications",
+    )
+    ready_made_product = models.ForeignKey(
+        ReadyMadeProduct,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="admin_notifications",
+    )
     date_of_notification = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return self.title
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["kind", "branch", "ingredient"],
+                condition=models.Q(ingredient__isnull=False),
+                name="admin_notification_ingredient_key",
+            ),
+            models.UniqueConstraint(
+                fields=["kind", "branch", "ready_made_product"],
+                condition=models.Q(ready_made_product__isnull=False),
+                name="admin_notification_product_key",
+            ),
+        ]
+
 
 class Reminder(models.Model):
     content = models.TextField()
@@ -45,3 +83,28 @@ class Reminder(models.Model):
 
     class Meta:
         ordering = ["-date_of_reminder"]
+
+
+class OutboxEvent(models.Model):
+    """
+    Websocket event written in the transaction of the change it announces
+    and published to the channel layer group after the commit.
+    """
+
+    group = models.CharField(max_length=255)
+    type = models.CharField(max_length=255)
+    payload = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    published_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.group} - {self.type}"
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["id"],
+                condition=models.Q(published_at__isnull=True),
+                name="outbox_pending_idx",
+            ),
+        ]
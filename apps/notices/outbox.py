@@ -0,0 +1,229 @@
+"""
+Module for the transactional outbox of websocket events.
+
+publish_event writes the event in the current transaction, so it is
+stored only if the change it announces is committed and is never sent
+before the data can be read. Right after the commit the relay sends the
+pending events to the channel layer in batches and marks them published.
+Refreshes of one channel group are coalesced: equal events are merged and
+a group is broadcast to at most once per BROADCAST_COALESCE_WINDOW, with a
+trailing relay for the events that came in between. The periodic
+sweep_outbox_task, or the relay_outbox command, sends the events a crashed
+process left behind and deletes the old published ones.
+"""
+import json
+import math
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from celery import shared_task
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from apps.notices.models import OutboxEvent
+from utils.dispatch import dispatch
+
+
+BATCH_SIZE = 100
+THROTTLE_KEY = "broadcast:throttle:{group}:{type}"
+SENT_KEY = "broadcast:sent"
+SUPPRESSED_KEY = "broadcast:suppressed"
+
+
+def publish_event(group, type, **payload):
+    """
+    Writes an event for the channel layer group and relays it after the
+    transaction commits.
+    """
+    event = OutboxEvent.objects.create(group=group, type=type, payload=payload)
+    _relay_on_commit()
+    return event
+
+
+def _relay_on_commit():
+    """
+    Registers one relay for the current transaction.
+
+    The events of a transaction are sent by a single relay, so only the
+    first publish registers it. A relay registered in a rolled back
+    savepoint is dropped by Django and the next publish registers another.
+    """
+    connection = transaction.get_connection()
+    for _, callback, _ in connection.run_on_commit:
+        if getattr(callback, "pending_relay", False):
+            return
+
+    def relay_outbox_after_commit():
+        relay_outbox_after_commit.pending_relay = False
+        relay_outbox()
+
+    relay_outbox_after_commit.pending_relay = True
+    transaction.on_commit(relay_outbox_after_commit, robust=True)
+
+
+def relay_outbox(batch_size=BATCH_SIZE, throttle=True):
+    """
+    Sends pending events to the channel layer in id order.
+
+    Equal events of a batch are merged into one group_send. With throttle,
+    an event whose group and type were already broadcast within the
+    coalescing window stays pending and a trailing relay is scheduled, so
+    a burst of refreshes ends with one broadcast of the final state.
+
+    Each batch is locked, sent and marked published in one transaction, so
+    concurrent relays skip each other's rows and a batch that fails to send
+    is sent again by the next relay. Returns the number of published events.
+    """
+    channel_layer = get_channel_layer()
+    window = settings.BROADCAST_COALESCE_WINDOW
+    published = 0
+    last_id = 0
+    deferred = False
+    while True:
+        with transaction.atomic():
+            events = list(
+                OutboxEvent.objects.filter(published_at__isnull=True, id__gt=last_id)
+                .select_for_update(skip_locked=True)
+                .order_by("id")[:batch_size]
+            )
+            if not events:
+                break
+            last_id = events[-1].id
+
+            broadcasts = {}
+            for event in events:
+                key = (event.group, event.type, _canonical(event.payload))
+                broadcasts.setdefault(key, []).append(event)
+            sends, sent_events = [], []
+            for (group, type, _), merged in broadcasts.items():
+                if (
+                    throttle
+                    and window
+                    and not cache.add(
+                        THROTTLE_KEY.format(group=group, type=type), 1, timeout=window
+                    )
+                ):
+                    deferred = True
+                    continue
+                sends.append(merged[0])
+                sent_events.extend(merged)
+
+            async_to_sync(_send)(channel_layer, sends)
+            OutboxEvent.objects.filter(
+                id__in=[event.id for event in sent_events]
+            ).update(published_at=timezone.now())
+        _count(SENT_KEY, len(sends))
+        _count(SUPPRESSED_KEY, len(sent_events) - len(sends))
+        published += len(sent_events)
+        if len(events) < batch_size:
+            break
+
+    if deferred:
+        dispatch(relay_outbox_task, window=window)
+    return published
+
+
+@shared_task
+def relay_outbox_task():
+    """
+    Trailing relay that sends the events deferred by the coalescing window.
+    """
+    return relay_outbox(throttle=False)
+
+
+async def _send(channel_layer, events):
+    """
+    Sends the events in one event loop pass.
+    """
+    for event in events:
+        await channel_layer.group_send(
+            event.group, {**event.payload, "type": event.type}
+        )
+
+
+def _canonical(payload):
+    """
+    Returns a hashable form of the event payload.
+    """
+    return json.dumps(payload, sort_keys=True)
+
+
+def purge_outbox(before):
+    """
+    Deletes events published before the given time.
+    """
+    return OutboxEvent.objects.filter(published_at__lt=before).delete()[0]
+
+
+@shared_task
+def sweep_outbox_task():
+    """
+    Sends the events that were not relayed after their commit and deletes
+    the events published more than OUTBOX_RETENTION seconds ago.
+    """
+    sent = relay_outbox()
+    purged = purge_outbox(timezone.now() - timedelta(seconds=settings.OUTBOX_RETENTION))
+    return sent, purged
+
+
+def get_outbox_latency(limit=1000):
+    """
+    Returns p50, p99 and max seconds between writing and publishing of the
+    latest published events.
+    """
+    latencies = sorted(
+        (published_at - created_at).total_seconds()
+        for created_at, published_at in OutboxEvent.objects.filter(
+            published_at__isnull=False
+        )
+        .order_by("-id")
+        .values_list("created_at", "published_at")[:limit]
+    )
+    if not latencies:
+        return {"events": 0, "p50": 0.0, "p99": 0.0, "max": 0.0}
+
+    def percentile(value):
+        return latencies[min(len(latencies) - 1, math.ceil(len(latencies) * value) - 1)]
+
+    return {
+        "events": len(latencies),
+        "p50": percentile(0.50),
+        "p99": percentile(0.99),
+        "max": latencies[-1],
+    }
+
+
+def _count(key, value):
+    """
+    Adds the value to a broadcast counter.
+    """
+    if value and not cache.add(key, value, timeout=None):
+        try:
+            cache.incr(key, value)
+        except ValueError:
+            cache.add(key, value, timeout=None)
+
+
+def get_broadcast_stats():
+    """
+    Returns counters of sent and suppressed broadcasts.
+    """
+    counters = cache.get_many([SENT_KEY, SUPPRESSED_KEY])
+    sent = counters.get(SENT_KEY, 0)
+    suppressed = counters.get(SUPPRESSED_KEY, 0)
+    total = sent + suppressed
+    return {
+        "sent": sent,
+        "suppressed": suppressed,
+        "suppression_rate": round(suppressed / total, 4) if total else 0.0,
+    }
+
+
+def reset_broadcast_stats():
+    """
+    Resets broadcast counters.
+    """
+    cache.delete_many([SENT_KEY, SUPPRESSED_KEY])
@@ -4,9 +4,9 @@ from .models import (
     AdminNotification,
     Reminder,
 )
-from apps.branches.models import Branch
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+from apps.notices.outbox import publish_event
+from django.db import transaction
+
 
 def delete_baristas_notification(id):
     """
@@ -44,33 +44,6 @@ def clear_waiter_notifications(waiter_id):
         return False
 
 
-def if_exists_admin_notification(text, branch_id):
-    """
-    Checks if notification exists.
-    """
-    try:
-        branch = Branch.objects.get(id=branch_id)
-        notification = AdminNotification.objects.get(text=text, branch=branch)
-        return True
-    except:
-        return False
-
-
-def create_admin_notification(text, branch_id):
-    """
-    Creates notification.
-    """
-    try:
-        branch = Branch.objects.get(id=branch_id)
-        notification = AdminNotification.objects.create(
-            text=text, branch=branch, title="Running out of"
-        )
-        return True
-    except Exception as e:
-        print(e)
-        return False
-
-
 def delete_admin_notification(id):
     """
     Deletes admin notification.
@@ -101,14 +74,9 @@ def delete_reminder(id):
     """
     try:
         notification = Reminder.objects.get(id=id)
-        notification.delete()
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            f"reminder_{notification.branch.id}",
-            {
-                "type": "get_reminder",
-            },
-        )
+        with transaction.atomic():
+            notification.delete()
+            publish_event(f"reminder_{notification.branch_id}", "get_reminder")
         return True
     except:
-        return False
\ No newline at end of file
+        return False
@@ -1,67 +1,110 @@
-from django.db.models.signals import post_save, post_delete
-from django.dispatch import receiver
-import time
+from django.db.models.signals import post_save, post_delete, pre_save
 from apps.notices.models import BaristaNotification, ClentNotification
+from apps.notices.outbox import publish_event
 from apps.storage.models import (
     AvailableAtTheBranch,
     MinimalLimitReached,
     ReadyMadeProductAvailableAtTheBranch,
 )
-from apps.notices.tasks import (
-    update_notifications_on_barista_side,
-    update_notifications_on_client_side,
-    create_notification_for_admin_task,
+from utils.low_stock import (
+    detect_limit_change,
+    detect_low_ingredients,
+    detect_low_ready_made_products,
 )
 
 
-# Barista notifications
-@receiver(post_save, sender=BaristaNotification)
-def send_notification(sender, instance, **kwargs):
-    update_notifications_on_barista_side.delay(instance.branch_id)
+# Barista and client notifications
+def get_notification_delta(instance, **kwargs):
+    """
+    Returns the event payload with the changed notification id.
+    """
+    if "created" not in kwargs:
+        return {"deleted": [instance.id]}
+    if kwargs["created"]:
+        return {"created": [instance.id]}
+    return {"updated": [instance.id]}
 
 
-@receiver(post_delete, sender=BaristaNotification)
-def send_notification(sender, instance, **kwargs):
-    update_notifications_on_barista_side.delay(instance.branch_id)
+def publish_barista_notifications(sender, instance, **kwargs):
+    """
+    Push the notification changes of the branch to baristas.
+    """
+    publish_event(
+        f"branch_{instance.branch_id}",
+        "get_notification",
+        **get_notification_delta(instance, **kwargs),
+    )
 
 
-# Client notifications
-@receiver(post_save, sender=ClentNotification)
-def send_notification(sender, instance, **kwargs):
-    update_notifications_on_client_side.delay(instance.client_id)
+def publish_client_notifications(sender, instance, **kwargs):
+    """
+    Push the notification changes of the client.
+    """
+    publish_event(
+        f"user_{instance.client_id}",
+        "get_notification",
+        **get_notification_delta(instance, **kwargs),
+    )
 
 
-@receiver(post_delete, sender=ClentNotification)
-def send_notification(sender, instance, **kwargs):
-    update_notifications_on_client_side.delay(instance.client_id)
+post_save.connect(publish_barista_notifications, sender=BaristaNotification)
+post_delete.connect(publish_barista_notifications, sender=BaristaNotification)
+post_save.connect(publish_client_notifications, sender=ClentNotification)
+post_delete.connect(publish_client_notifications, sender=ClentNotification)
 
 
 # Admin notifications
-@receiver(post_save, sender=AvailableAtTheBranch)
-def send_notification(sender, instance, **kwargs):
-    create_notification_for_admin_task.delay()
-
-
-@receiver(post_delete, sender=AvailableAtTheBranch)
-def send_notification(sender, instance, **kwargs):
-    create_notification_for_admin_task.delay()
-
-
-@receiver(post_save, sender=MinimalLimitReached)
-def send_notification(sender, instance, **kwargs):
-    create_notification_for_admin_task.delay()
-
-
-@receiver(post_delete, sender=MinimalLimitReached)
-def send_notification(sender, instance, **kwargs):
-    create_notification_for_admin_task.delay()
-
-
-@receiver(post_save, sender=ReadyMadeProductAvailableAtTheBranch)
-def send_notification(sender, instance, **kwargs):
-    create_notification_for_admin_task.delay()
-
-
-@receiver(post_delete, sender=ReadyMadeProductAvailableAtTheBranch)
-def send_notification(sender, instance, **kwargs):
-    create_notification_for_admin_task.delay()
+def remember_quantity(sender, instance, **kwargs):
+    """
+    Remember the stored quantity before the row is saved.
+    """
+    instance._old_quantity = (
+        sender.objects.filter(pk=instance.pk).values_list("quantity", flat=True).first()
+        if instance.pk
+        else None
+    )
+
+
+def get_quantities(instance, **kwargs):
+    """
+    Returns the old and the new quantity of a saved or deleted row.
+    """
+    if "created" not in kwargs:
+        return instance.quantity, None
+    return getattr(instance, "_old_quantity", None), instance.quantity
+
+
+def detect_low_ingredient(sender, instance, **kwargs):
+    """
+    Alert admins when the ingredient crosses its minimal limit.
+    """
+    detect_low_ingredients(
+        instance.branch_id, {instance.ingredient_id: get_quantities(instance, **kwargs)}
+    )
+
+
+def detect_low_ready_made_product(sender, instance, **kwargs):
+    """
+    Alert admins when the ready made product crosses its minimal limit.
+    """
+    detect_low_ready_made_products(
+        instance.branch_id,
+        {instance.ready_made_product_id: get_quantities(instance, **kwargs)},
+    )
+
+
+def detect_low_stock_on_limit_change(sender, instance, **kwargs):
+    """
+    Alert admins when the changed minimal limit crosses the stock.
+    """
+    detect_limit_change(instance, *get_quantities(instance, **kwargs))
+
+
+for model, receiver in [
+    (AvailableAtTheBranch, detect_low_ingredient),
+    (ReadyMadeProductAvailableAtTheBranch, detect_low_ready_made_product),
+    (MinimalLimitReached, detect_low_stock_on_limit_change),
+]:
+    pre_save.connect(remember_quantity, sender=model)
+    post_save.connect(receiver, sender=model)
+    post_delete.connect(receiver, sender=model)
@@ -7,22 +7,20 @@ from apps.notices.models import (
 )
 from apps.ordering.models import Order
 from apps.branches.models import Branch
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
-import time
+from django.db import transaction
 from apps.storage.services import (
     get_ingredients_in_stock_more_than_minimal_limit_in_branches,
     get_ready_made_products_in_stock_more_than_minimal_limit_in_branches,
 )
-from apps.notices.services import (
-    if_exists_admin_notification,
-    create_admin_notification,
+from apps.notices.outbox import publish_event
+from utils.low_stock import (
+    INGREDIENT_TEXT,
+    READY_MADE_PRODUCT_TEXT,
+    create_alerts,
+    get_alert,
 )
 
 
-SLEEP_TIME = 2
-
-
 @shared_task
 def create_notification_for_barista(order_id, title, body, branch_id):
     """
@@ -61,40 +59,14 @@ def create_notification_for_admin(title, running_out_of, branch_id):
     )
 
 
-@shared_task
-def update_notifications_on_barista_side(branch_id):
-    """
-    Updates notifications on barista side.
-    """
-    time.sleep(SLEEP_TIME)
-    channel_layer = get_channel_layer()
-    async_to_sync(channel_layer.group_send)(
-        f"branch_{branch_id}",
-        {
-            "type": "get_notification",
-        },
-    )
-
-
-@shared_task
-def update_notifications_on_client_side(client_id):
-    """
-    Updates notifications on client side.
-    """
-    time.sleep(SLEEP_TIME)
-    channel_layer = get_channel_layer()
-    async_to_sync(channel_layer.group_send)(
-        f"user_{client_id}",
-        {
-            "type": "get_notification",
-        },
-    )
-
-
 @shared_task
 def create_notification_for_admin_task():
     """
-    Creates notification for admin.
+    Creates notifications for admin about every low stock row.
+
+    Stock changes are checked one row at a time by utils.low_stock, this
+    periodic full scan only reconciles the alerts and inserts the missing
+    ones in one statement.
     """
     ingredients_in_stock_more_than_minimal_limit = (
         get_ingredients_in_stock_more_than_minimal_limit_in_branches()
@@ -102,32 +74,31 @@ def create_notification_for_admin_task():
     ready_made_products_in_stock_more_than_minimal_limit = (
         get_ready_made_products_in_stock_more_than_minimal_limit_in_branches()
     )
-    for ingredient in ingredients_in_stock_more_than_minimal_limit:
-        if not if_exists_admin_notification(
-            f'Ингредиент {ingredient["ingredient_name"]} в филиале {ingredient["name_of_shop"]} заканчивается',
+    alerts = [
+        get_alert(
             ingredient["branch_id_annotation"],
-        ):
-            create_admin_notification(
-                f'Ингредиент {ingredient["ingredient_name"]} в филиале {ingredient["name_of_shop"]} заканчивается',
-                ingredient["branch_id_annotation"],
-            )
-    for ready_made_product in ready_made_products_in_stock_more_than_minimal_limit:
-        if not if_exists_admin_notification(
-            f'Готовый продукт {ready_made_product["ready_made_product_name"]} в филиале {ready_made_product["name_of_shop"]} заканчивается',
+            "ingredient_id",
+            ingredient["ingredient_id"],
+            INGREDIENT_TEXT.format(
+                name=ingredient["ingredient_name"], shop=ingredient["name_of_shop"]
+            ),
+        )
+        for ingredient in ingredients_in_stock_more_than_minimal_limit
+    ]
+    alerts += [
+        get_alert(
             ready_made_product["branch_id_annotation"],
-        ):
-            create_admin_notification(
-                f'Готовый продукт {ready_made_product["ready_made_product_name"]} в филиале {ready_made_product["name_of_shop"]} заканчивается',
-                ready_made_product["branch_id_annotation"],
-            )
-    time.sleep(SLEEP_TIME)
-    channel_layer = get_channel_layer()
-    async_to_sync(channel_layer.group_send)(
-        f"admin",
-        {
-            "type": "get_admin_notification",
-        },
-    )
+            "ready_made_product_id",
+            ready_made_product["ready_made_product_id"],
+            READY_MADE_PRODUCT_TEXT.format(
+                name=ready_made_product["ready_made_product_name"],
+                shop=ready_made_product["name_of_shop"],
+            ),
+        )
+        for ready_made_product in ready_made_products_in_stock_more_than_minimal_limit
+    ]
+    create_alerts(alerts)
+    publish_event("admin", "get_admin_notification")
 
 
 @shared_task
@@ -135,17 +106,11 @@ def create_reminder(branch_id, order_id):
     """
     Creates reminder.
     """
-    if Order.objects.filter(id=order_id, status="new").exists():
-        branch = Branch.objects.get(id=branch_id)
-        Reminder.objects.create(
-            content=f"Примите заказ №{order_id}",
-            branch=branch,
-        )
-        time.sleep(SLEEP_TIME)
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            f"reminder_{branch_id}",
-            {
-                "type": "get_reminder",
-            },
-        )
+    with transaction.atomic():
+        if Order.objects.filter(id=order_id, status="new").exists():
+            branch = Branch.objects.get(id=branch_id)
+            Reminder.objects.create(
+                content=f"Примите заказ №{order_id}",
+                branch=branch,
+            )
+            publish_event(f"reminder_{branch_id}", "get_reminder")
@@ -0,0 +1,503 @@
+import json
+from datetime import timedelta
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase
+from django.utils import timezone
+
+from apps.accounts.models import CustomUser
+from apps.branches.models import Branch, Schedule
+from apps.notices.consumers import NotificationStreamConsumer
+from apps.notices.models import AdminNotification, BaristaNotification, OutboxEvent
+from apps.notices.routing import websocket_urlpatterns
+from apps.notices.outbox import (
+    get_broadcast_stats,
+    get_outbox_latency,
+    publish_event,
+    relay_outbox,
+    reset_broadcast_stats,
+    sweep_outbox_task,
+)
+from apps.ordering.models import Order
+from apps.storage.models import AvailableAtTheBranch, Ingredient, MinimalLimitReached
+from utils.dispatch import run_coalesced_task
+from apps.notices.tasks import create_notification_for_admin_task
+from utils.low_stock import detect_low_ingredients
+from utils.stock import decrement_ingredients, increment_ingredients
+
+
+# ==============================================================================
+# Outbox test
+# ==============================================================================
+class OutboxTest(TestCase):
+    """
+    Tests for the transactional outbox of websocket events.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Set up test data.
+        """
+        cls.schedeule = Schedule.objects.create(
+            title="Test schedule", description="Test description"
+        )
+        cls.branch = Branch.objects.create(
+            schedule=cls.schedeule,
+            name_of_shop="Test shop",
+            address="Test address",
+            phone_number="+375291234567",
+            link_to_map="https://www.google.com/",
+        )
+        cls.user = CustomUser.objects.create(
+            phone_number="+996777777777",
+            username="abdu",
+            branch=cls.branch,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.channel_layer = get_channel_layer()
+        OutboxEvent.objects.all().delete()
+
+    def listen(self, group):
+        channel = async_to_sync(self.channel_layer.new_channel)()
+        async_to_sync(self.channel_layer.group_add)(group, channel)
+        return channel
+
+    def receive(self, channel):
+        return async_to_sync(self.channel_layer.receive)(channel)
+
+    def test_event_is_sent_after_commit(self):
+        channel = self.listen("admin")
+        with self.captureOnCommitCallbacks() as callbacks:
+            publish_event("admin", "get_admin_notification", count=1)
+        self.assertIsNone(OutboxEvent.objects.get().published_at)
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(
+            self.receive(channel), {"type": "get_admin_notification", "count": 1}
+        )
+        self.assertIsNotNone(OutboxEvent.objects.get().published_at)
+
+    def test_rolled_back_event_is_not_stored(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                publish_event("admin", "get_admin_notification")
+                transaction.set_rollback(True)
+        self.assertEqual(callbacks, [])
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_relay_sends_pending_events_in_batches(self):
+        channel = self.listen("reminder_1")
+        OutboxEvent.objects.bulk_create(
+            OutboxEvent(group="reminder_1", type="get_reminder", payload={"n": n})
+            for n in range(5)
+        )
+        self.assertEqual(relay_outbox(batch_size=2, throttle=False), 5)
+        self.assertEqual(
+            [self.receive(channel)["n"] for _ in range(5)], [0, 1, 2, 3, 4]
+        )
+        self.assertFalse(OutboxEvent.objects.filter(published_at__isnull=True).exists())
+        self.assertEqual(relay_outbox(), 0)
+
+    def test_sweep_relays_pending_and_purges_old_events(self):
+        channel = self.listen("admin")
+        old, recent = OutboxEvent.objects.bulk_create(
+            OutboxEvent(group="admin", type="get_reminder", published_at=timezone.now())
+            for _ in range(2)
+        )
+        OutboxEvent.objects.filter(id=old.id).update(
+            published_at=timezone.now() - timedelta(days=2)
+        )
+        OutboxEvent.objects.create(group="admin", type="get_admin_notification")
+        self.assertEqual(sweep_outbox_task(), (1, 1))
+        self.assertEqual(self.receive(channel), {"type": "get_admin_notification"})
+        self.assertFalse(OutboxEvent.objects.filter(id=old.id).exists())
+        self.assertTrue(OutboxEvent.objects.filter(id=recent.id).exists())
+
+    def test_new_order_publishes_board_events(self):
+        channel = self.listen(f"new_orders_takeaway_{self.branch.id}")
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.create(
+                customer=self.user, branch=self.branch, total_price=100
+            )
+        self.assertEqual(self.receive(channel), {"type": "get_new_orders"})
+
+    def test_barista_notification_publishes_event(self):
+        channel = self.listen(f"branch_{self.branch.id}")
+        with self.captureOnCommitCallbacks(execute=True):
+            notification = BaristaNotification.objects.create(
+                branch=self.branch, order_id="1", title="Test", body="Test"
+            )
+        self.assertEqual(
+            self.receive(channel),
+            {"type": "get_notification", "created": [notification.id]},
+        )
+
+    def test_latency(self):
+        now = timezone.now()
+        for delay in (0.01, 0.02, 0.5):
+            event = OutboxEvent.objects.create(group="admin", type="get_reminder")
+            OutboxEvent.objects.filter(id=event.id).update(
+                created_at=now, published_at=now + timedelta(seconds=delay)
+            )
+        latency = get_outbox_latency()
+        self.assertEqual(latency["events"], 3)
+        self.assertAlmostEqual(latency["p50"], 0.02)
+        self.assertAlmostEqual(latency["max"], 0.5)
+
+    def test_equal_events_are_merged(self):
+        channel = self.listen("branch_1")
+        reset_broadcast_stats()
+        OutboxEvent.objects.bulk_create(
+            OutboxEvent(group="branch_1", type="get_notification") for _ in range(3)
+        )
+        self.assertEqual(relay_outbox(), 3)
+        self.assertEqual(self.receive(channel), {"type": "get_notification"})
+        self.assertEqual(
+            get_broadcast_stats(),
+            {"sent": 1, "suppressed": 2, "suppression_rate": 0.6667},
+        )
+
+    @patch("apps.ordering.signals.create_reminder")
+    @patch.object(run_coalesced_task, "apply_async")
+    def test_order_burst_is_coalesced_per_group(self, apply_async, create_reminder):
+        channel = self.listen(f"new_orders_takeaway_{self.branch.id}")
+        reset_broadcast_stats()
+        for _ in range(10):
+            with self.captureOnCommitCallbacks(execute=True):
+                Order.objects.create(
+                    customer=self.user, branch=self.branch, total_price=100
+                )
+        # The first order is broadcast at once and the rest wait for one
+        # trailing relay.
+        self.assertEqual(self.receive(channel), {"type": "get_new_orders"})
+        self.assertEqual(OutboxEvent.objects.filter(published_at=None).count(), 18)
+        apply_async.assert_called_once()
+
+        run_coalesced_task(*apply_async.call_args.kwargs["args"])
+        self.assertEqual(self.receive(channel), {"type": "get_new_orders"})
+        self.assertFalse(OutboxEvent.objects.filter(published_at=None).exists())
+        self.assertEqual(
+            get_broadcast_stats(),
+            {"sent": 4, "suppressed": 16, "suppression_rate": 0.8},
+        )
+
+
+# ==============================================================================
+# Notification stream test
+# ==============================================================================
+class NotificationStreamTest(TestCase):
+    """
+    Tests for the delta protocol of the notification consumers.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Set up test data.
+        """
+        cls.schedeule = Schedule.objects.create(
+            title="Test schedule", description="Test description"
+        )
+        cls.branch = Branch.objects.create(
+            schedule=cls.schedeule,
+            name_of_shop="Test shop",
+            address="Test address",
+            phone_number="+375291234567",
+            link_to_map="https://www.google.com/",
+        )
+        cls.notifications = [
+            BaristaNotification.objects.create(
+                branch=cls.branch, order_id=str(n), title=f"Заказ №{n}", body="Test"
+            )
+            for n in range(25)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        OutboxEvent.objects.all().delete()
+
+    async def connect(self):
+        path = f"/ws/to-baristas/branch/{self.branch.id}/"
+        communicator = ApplicationCommunicator(
+            URLRouter(websocket_urlpatterns),
+            {"type": "websocket", "path": path, "headers": [], "subprotocols": []},
+        )
+        await communicator.send_input({"type": "websocket.connect"})
+        response = await communicator.receive_output()
+        self.assertEqual(response["type"], "websocket.accept")
+        return communicator
+
+    async def receive(self, communicator):
+        response = await communicator.receive_output()
+        return json.loads(response["text"])
+
+    async def send(self, communicator, data):
+        await communicator.send_input(
+            {"type": "websocket.receive", "text": json.dumps(data)}
+        )
+
+    async def disconnect(self, communicator):
+        await communicator.send_input({"type": "websocket.disconnect", "code": 1000})
+        await communicator.wait()
+
+    async def relay(self):
+        await sync_to_async(relay_outbox)(throttle=False)
+
+    def test_base_consumer_is_abstract(self):
+        with self.assertRaises(TypeError):
+            NotificationStreamConsumer()
+
+    async def test_connect_sends_newest_page(self):
+        communicator = await self.connect()
+        response = await self.receive(communicator)
+        self.assertTrue(response["has_more"])
+        self.assertEqual(
+            [notification["id"] for notification in response["notifications"]],
+            [notification.id for notification in self.notifications[5:]],
+        )
+        await self.disconnect(communicator)
+
+    async def test_history_is_paged_by_before_id(self):
+        communicator = await self.connect()
+        page = await self.receive(communicator)
+        await self.send(
+            communicator,
+            {
+                "action": "history",
+                "before_id": page["notifications"][0]["id"],
+                "limit": 10,
+            },
+        )
+        response = await self.receive(communicator)
+        self.assertFalse(response["has_more"])
+        self.assertEqual(
+            [notification["id"] for notification in response["history"]],
+            [notification.id for notification in self.notifications[:5]],
+        )
+        await self.disconnect(communicator)
+
+    async def test_events_send_only_changes(self):
+        communicator = await self.connect()
+        await self.receive(communicator)
+
+        notification = await sync_to_async(BaristaNotification.objects.create)(
+            branch=self.branch, order_id="100", title="Заказ №100", body="Test"
+        )
+        await self.relay()
+        response = await self.receive(communicator)
+        self.assertEqual(
+            [created["id"] for created in response["created"]], [notification.id]
+        )
+        self.assertEqual(response["updated"], [])
+        self.assertEqual(response["deleted"], [])
+
+        first = self.notifications[-1]
+        first.title = "Заказ изменен"
+        await sync_to_async(first.save)()
+        await self.relay()
+        response = await self.receive(communicator)
+        self.assertEqual(response["created"], [])
+        self.assertEqual(response["updated"][0]["title"], "Заказ изменен")
+
+        notification_id = notification.id
+        await sync_to_async(notification.delete)()
+        await self.relay()
+        response = await self.receive(communicator)
+        self.assertEqual(
+            response, {"created": [], "updated": [], "deleted": [notification_id]}
+        )
+        await self.disconnect(communicator)
+
+    async def test_out_of_order_commits_are_not_missed(self):
+        communicator = await self.connect()
+        await self.receive(communicator)
+        first, second = [
+            await sync_to_async(BaristaNotification.objects.create)(
+                branch=self.branch, order_id=str(n), title=f"Заказ №{n}", body="Test"
+            )
+            for n in (100, 101)
+        ]
+        for notification in (second, first):
+            await get_channel_layer().group_send(
+                f"branch_{self.branch.id}",
+                {"type": "get_notification", "created": [notification.id]},
+            )
+            response = await self.receive(communicator)
+            self.assertEqual(
+                [created["id"] for created in response["created"]], [notification.id]
+            )
+        await self.disconnect(communicator)
+
+    async def test_catch_up_sends_notifications_after_id(self):
+        communicator = await self.connect()
+        await self.receive(communicator)
+        await self.send(
+            communicator,
+            {"action": "catch_up", "after_id": self.notifications[19].id, "limit": 3},
+        )
+        response = await self.receive(communicator)
+        self.assertTrue(response["has_more"])
+        self.assertEqual(
+            [notification["id"] for notification in response["catch_up"]],
+            [notification.id for notification in self.notifications[20:23]],
+        )
+        await self.disconnect(communicator)
+
+    async def test_refresh_without_changes_sends_nothing(self):
+        communicator = await self.connect()
+        await self.receive(communicator)
+        await get_channel_layer().group_send(
+            f"branch_{self.branch.id}", {"type": "get_notification"}
+        )
+        self.assertTrue(await communicator.receive_nothing())
+        await self.disconnect(communicator)
+
+
+# ==============================================================================
+# Low stock alert test
+# ==============================================================================
+class LowStockAlertTest(TestCase):
+    """
+    Tests for the threshold-crossing low stock detector.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Set up test data.
+        """
+        cls.schedeule = Schedule.objects.create(
+            title="Test schedule", description="Test description"
+        )
+        cls.branch = Branch.objects.create(
+            schedule=cls.schedeule,
+            name_of_shop="Test shop",
+            address="Test address",
+            phone_number="+375291234567",
+            link_to_map="https://www.google.com/",
+        )
+        cls.milk = Ingredient.objects.create(name="Молоко", measurement_unit="ml")
+        cls.limit = MinimalLimitReached.objects.create(
+            branch=cls.branch, ingredient=cls.milk, quantity=100
+        )
+        cls.stock = AvailableAtTheBranch.objects.create(
+            branch=cls.branch, ingredient=cls.milk, quantity=500
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def alerts(self):
+        return list(AdminNotification.objects.values_list("text", flat=True))
+
+    def set_quantity(self, quantity):
+        self.stock.quantity = quantity
+        self.stock.save()
+
+    def test_alert_is_created_when_limit_is_crossed(self):
+        self.set_quantity(50)
+        self.assertEqual(
+            self.alerts(), ["Ингредиент Молоко в филиале Test shop заканчивается"]
+        )
+        self.assertTrue(OutboxEvent.objects.filter(group="admin").exists())
+
+    def test_alert_is_not_repeated_below_limit(self):
+        self.set_quantity(50)
+        OutboxEvent.objects.all().delete()
+        self.set_quantity(40)
+        self.assertEqual(len(self.alerts()), 1)
+        self.assertFalse(OutboxEvent.objects.filter(group="admin").exists())
+
+    def test_alert_is_cleared_when_restocked(self):
+        self.set_quantity(50)
+        self.set_quantity(100)
+        self.assertEqual(self.alerts(), [])
+
+    def test_change_above_limit_reads_only_the_limit(self):
+        with self.assertNumQueries(1):
+            detect_low_ingredients(self.branch.id, {self.milk.id: (500, 400)})
+        self.assertEqual(self.alerts(), [])
+
+    def test_write_off_reads_limits_with_the_stock(self):
+        # Savepoint, locked read of quantities and limits, update, release.
+        with self.assertNumQueries(4):
+            decrement_ingredients(self.branch.id, {self.milk.id: 100})
+        self.assertEqual(self.alerts(), [])
+
+    def test_write_off_and_return_cross_the_limit(self):
+        decrement_ingredients(self.branch.id, {self.milk.id: 450})
+        self.assertEqual(len(self.alerts()), 1)
+        increment_ingredients(self.branch.id, {self.milk.id: 450})
+        self.assertEqual(self.alerts(), [])
+
+    def test_alert_is_keyed_by_ingredient(self):
+        self.set_quantity(50)
+        notification = AdminNotification.objects.get()
+        self.assertEqual(notification.kind, AdminNotification.LOW_STOCK)
+        self.assertEqual(notification.ingredient_id, self.milk.id)
+        self.assertIsNone(notification.ready_made_product_id)
+
+    def test_reconciliation_inserts_only_missing_alerts(self):
+        AvailableAtTheBranch.objects.filter(id=self.stock.id).update(quantity=50)
+        for _ in range(2):
+            with self.assertNumQueries(4):
+                create_notification_for_admin_task()
+        self.assertEqual(len(self.alerts()), 1)
+
+    def test_admin_consumer_sends_keys(self):
+        self.set_quantity(50)
+        notification = AdminNotification.objects.get()
+
+        async def receive():
+            communicator = ApplicationCommunicator(
+                URLRouter(websocket_urlpatterns),
+                {
+                    "type": "websocket",
+                    "path": "/ws/notifications/admin/",
+                    "headers": [],
+                    "subprotocols": [],
+                },
+            )
+            await communicator.send_input({"type": "websocket.connect"})
+            await communicator.receive_output()
+            response = await communicator.receive_output()
+            await communicator.send_input(
+                {"type": "websocket.disconnect", "code": 1000}
+            )
+            await communicator.wait()
+            return json.loads(response["text"])
+
+        self.assertEqual(
+            async_to_sync(receive)()["notifications"],
+            [
+                {
+                    "id": notification.id,
+                    "title": "Running out of",
+                    "text": notification.text,
+                    "branch": "Test shop",
+                    "kind": "low_stock",
+                    "ingredient": self.milk.id,
+                    "ready_made_product": None,
+                    "date_of_notification": notification.date_of_notification.strftime(
+                        "%d.%m.%Y"
+                    ),
+                }
+            ],
+        )
+
+    def test_raised_limit_creates_alert(self):
+        self.limit.quantity = 600
+        self.limit.save()
+        self.assertEqual(len(self.alerts()), 1)
+        self.limit.delete()
+        self.assertEqual(self.alerts(), [])
@@ -2,7 +2,7 @@
 Module for admin models for ordering app.
 """
 from django.contrib import admin
-from apps.ordering.models import Order, OrderItem
+from apps.ordering.models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
 
 
 class OrderItemInline(admin.TabularInline):
@@ -31,3 +31,30 @@ class OrderAdmin(admin.ModelAdmin):
 
 
 admin.site.register(Order, OrderAdmin)
+
+
+class ArchivedOrderItemInline(admin.TabularInline):
+    """
+    Inline model for archived order items.
+    """
+
+    model = ArchivedOrderItem
+    extra = 0
+
+
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    """
+    Admin model for archived orders.
+    """
+
+    list_display = [
+        "id",
+        "customer",
+        "created_at",
+        "total_price",
+    ]
+    list_filter = ["created_at", "status"]
+    inlines = [ArchivedOrderItemInline]
+
+
+admin.site.register(ArchivedOrder, ArchivedOrderAdmin)
@@ -0,0 +1,92 @@
+"""
+Module for the order archive.
+
+Completed and canceled orders are moved out of the orders table once they
+are older than ORDER_ARCHIVE_AGE days, so the tables the order boards,
+the table occupancy checks and the popularity updates scan keep only the
+recent orders. archive_orders copies a batch of old closed orders and
+their items into the archive tables and deletes them from the hot ones in
+one transaction. Archived rows keep their ids, so a customer's links to
+an order stay valid.
+
+The deletes skip the model signals: closed orders are on no order board,
+and a signal per row would publish a board refresh for every archived
+order. The readers of the history (customer orders and the rollup
+backfills) read both tables.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from apps.ordering.models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+
+
+CLOSED_STATUSES = ("completed", "canceled")
+ORDER_FIELDS = [field.attname for field in Order._meta.concrete_fields]
+ITEM_FIELDS = [field.attname for field in OrderItem._meta.concrete_fields]
+
+
+def archive_orders(before=None, batch_size=1000):
+    """
+    Moves the closed orders created before the given time, ORDER_ARCHIVE_AGE
+    days ago by default, with their items into the archive tables. Returns
+    the number of moved orders.
+    """
+    if before is None:
+        before = timezone.now() - timedelta(days=settings.ORDER_ARCHIVE_AGE)
+    moved = 0
+    while True:
+        with transaction.atomic():
+            order_ids = list(
+                Order.objects.select_for_update(skip_locked=True)
+                .filter(status__in=CLOSED_STATUSES, created_at__lt=before)
+                .order_by("id")
+                .values_list("id", flat=True)[:batch_size]
+            )
+            if not order_ids:
+                return moved
+            ArchivedOrder.objects.bulk_create(
+                ArchivedOrder(**row)
+                for row in Order.objects.filter(id__in=order_ids).values(*ORDER_FIELDS)
+            )
+            ArchivedOrderItem.objects.bulk_create(
+                (
+                    ArchivedOrderItem(**row)
+                    for row in OrderItem.objects.filter(order_id__in=order_ids).values(
+                        *ITEM_FIELDS
+                    )
+                ),
+                batch_size=batch_size,
+            )
+            items = OrderItem.objects.filter(order_id__in=order_ids)
+            items._raw_delete(items.db)
+            orders = Order.objects.filter(id__in=order_ids)
+            orders._raw_delete(orders.db)
+        moved += len(order_ids)
+
+
+def get_order_or_archived(order_id):
+    """
+    Returns the order or the archived order with the id, with its branch,
+    customer and items, or None.
+    """
+    for model, item_model in ((Order, OrderItem), (ArchivedOrder, ArchivedOrderItem)):
+        order = (
+            model.objects.filter(id=order_id)
+            .select_related("branch", "customer")
+            .prefetch_related(
+                Prefetch(
+                    "items",
+                    queryset=item_model.objects.select_related(
+                        "item__category", "ready_made_product__category"
+                    ),
+                )
+            )
+            .first()
+        )
+        if order is not None:
+            return order
+    return None
@@ -0,0 +1,30 @@
+"""
+Archive of the old closed orders.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.ordering.archive import archive_orders
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves the completed and canceled orders older than --days with their "
+        "items into the archive tables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=settings.ORDER_ARCHIVE_AGE)
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.ORDER_ARCHIVE_BATCH_SIZE
+        )
+
+    def handle(self, *args, **options):
+        moved = archive_orders(
+            timezone.now() - timedelta(days=options["days"]),
+            batch_size=options["batch_size"],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} orders."))
@@ -0,0 +1,102 @@
+"""
+Backfill of the item co-occurrence store from order history.
+"""
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.ordering.models import ArchivedOrderItem, ItemCooccurrence, OrderItem
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the per-branch item co-occurrence counts from the items "
+        "of every order, hot and archived."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        # The archived orders are part of the history; they keep the ids of
+        # the orders, so the ids of both tables do not overlap.
+        rows = [
+            row
+            for model in (OrderItem, ArchivedOrderItem)
+            for row in model.objects.filter(order__branch__isnull=False)
+            .exclude(item__isnull=True, ready_made_product__isnull=True)
+            .values_list(
+                "order_id", "order__branch_id", "item_id", "ready_made_product_id"
+            )
+            .iterator(chunk_size=options["batch_size"])
+        ]
+        order_ids = np.fromiter((row[0] for row in rows), np.int64, len(rows))
+        branch_ids = np.fromiter((row[1] for row in rows), np.int64, len(rows))
+        codes = np.fromiter(
+            (row[3] * 2 + 1 if row[3] is not None else row[2] * 2 for row in rows),
+            np.int64,
+            len(rows),
+        )
+        branches, sources, targets, counts = count_pairs(order_ids, branch_ids, codes)
+
+        with transaction.atomic():
+            ItemCooccurrence.objects.all().delete()
+            ItemCooccurrence.objects.bulk_create(
+                (
+                    ItemCooccurrence(
+                        branch_id=branch_id,
+                        source_id=source // 2,
+                        source_is_ready_made_product=bool(source % 2),
+                        target_id=target // 2,
+                        target_is_ready_made_product=bool(target % 2),
+                        count=count,
+                    )
+                    for branch_id, source, target, count in zip(
+                        branches.tolist(),
+                        sources.tolist(),
+                        targets.tolist(),
+                        counts.tolist(),
+                    )
+                ),
+                batch_size=options["batch_size"],
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f"Backfilled {counts.size} co-occurrence rows.")
+        )
+
+
+def count_pairs(order_ids, branch_ids, codes):
+    """
+    Counts in how many orders of a branch every ordered pair of codes
+    occurs together.
+
+    codes encode items as id * 2 and ready made products as id * 2 + 1.
+    Returns the branch, source, target and count arrays of the pairs.
+    """
+    empty = np.empty(0, dtype=np.int64)
+    if not order_ids.size:
+        return empty, empty, empty, empty
+
+    # One row per distinct (order, code), grouped by order.
+    rows = np.unique(np.stack([order_ids, codes, branch_ids], axis=1), axis=0)
+    order_ids, codes, branch_ids = rows[:, 0], rows[:, 1], rows[:, 2]
+    starts = np.flatnonzero(np.r_[True, order_ids[1:] != order_ids[:-1]])
+    sizes = np.diff(np.r_[starts, order_ids.size])
+
+    # Pair every row with every row of its order.
+    row_sizes = np.repeat(sizes, sizes)
+    row_starts = np.repeat(starts, sizes)
+    left = np.repeat(np.arange(order_ids.size), row_sizes)
+    offsets = np.arange(left.size) - np.repeat(
+        np.cumsum(row_sizes) - row_sizes, row_sizes
+    )
+    right = np.repeat(row_starts, row_sizes) + offsets
+    distinct = left != right
+    left, right = left[distinct], right[distinct]
+
+    pairs, counts = np.unique(
+        np.stack([branch_ids[left], codes[left], codes[right]], axis=1),
+        axis=0,
+        return_counts=True,
+    )
+    return pairs[:, 0], pairs[:, 1], pairs[:, 2], counts
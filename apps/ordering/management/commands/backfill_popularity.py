@@ -0,0 +1,63 @@
+"""
+Backfill of the item popularity rollup from order history.
+"""
+from itertools import chain
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models.functions import Coalesce
+
+from apps.ordering.models import ArchivedOrderItem, ItemPopularity, OrderItem
+from apps.ordering.services import get_popularity_weight
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the time-decayed item popularity rollup of every branch "
+        "from the items of completed orders, hot and archived."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        querysets = [
+            model.objects.filter(order__status="completed", order__branch__isnull=False)
+            .exclude(item__isnull=True, ready_made_product__isnull=True)
+            .annotate(sold_at=Coalesce("order__completed_at", "order__created_at"))
+            .values_list(
+                "order__branch_id",
+                "item_id",
+                "ready_made_product_id",
+                "quantity",
+                "sold_at",
+            )
+            # The archived orders are part of the history.
+            for model in (OrderItem, ArchivedOrderItem)
+        ]
+        rows = chain.from_iterable(
+            queryset.iterator(chunk_size=options["batch_size"])
+            for queryset in querysets
+        )
+        scores = {}
+        for branch_id, item_id, product_id, quantity, sold_at in rows:
+            key = (branch_id, item_id, product_id)
+            scores[key] = scores.get(key, 0) + quantity * get_popularity_weight(sold_at)
+
+        with transaction.atomic():
+            ItemPopularity.objects.all().delete()
+            ItemPopularity.objects.bulk_create(
+                [
+                    ItemPopularity(
+                        branch_id=branch_id,
+                        item_id=item_id,
+                        ready_made_product_id=product_id,
+                        score=score,
+                    )
+                    for (branch_id, item_id, product_id), score in scores.items()
+                ],
+                batch_size=options["batch_size"],
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f"Backfilled {len(scores)} popularity rows.")
+        )
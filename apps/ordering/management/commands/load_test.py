@@ -0,0 +1,104 @@
+"""
+Lunch rush load test of the ASGI application.
+"""
+import asyncio
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from apps.storage.models import AvailableAtTheBranch
+from utils.load_data import offline_environment, seed_dataset
+from utils.load_test import get_actors, run_load_test
+
+
+# Ingredient stock of every branch during the test, so orders are not
+# rejected for stock.
+STOCK = 10**7
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds a test database and drives config.asgi:application with "
+        "simulated customers, baristas and waiters. Reports the throughput, "
+        "latency percentiles and error rates of every endpoint. On SQLite "
+        "concurrent orders can fail with 'database is locked', which counts "
+        "as errors."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--customers", type=int, default=100)
+        parser.add_argument("--waiters", type=int, default=3)
+        parser.add_argument("--duration", type=float, default=30.0)
+        parser.add_argument("--ramp-up", type=float, default=5.0)
+        parser.add_argument(
+            "--think-time",
+            type=float,
+            default=1.0,
+            help="Mean pause of a user between iterations in seconds.",
+        )
+        parser.add_argument("--transport", choices=["asgi", "uvicorn"], default="asgi")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--branches", type=int, default=3)
+        parser.add_argument("--orders", type=int, default=3000)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        # Every request runs in its own thread, which cannot share the
+        # in-memory SQLite test database, so it is written to a file. Writers
+        # wait for the lock instead of failing and readers do not block them.
+        database_name = None
+        if connection.vendor == "sqlite":
+            database_name = os.path.join(tempfile.mkdtemp(), "load_test.sqlite3")
+            connection.settings_dict["OPTIONS"]["timeout"] = 30
+
+        with offline_environment(database_name):
+            if database_name is not None:
+                with connection.cursor() as cursor:
+                    cursor.execute("PRAGMA journal_mode=WAL")
+            seed_dataset(
+                branches=options["branches"],
+                customers=max(options["customers"], 200),
+                orders=options["orders"],
+                seed=options["seed"],
+            )
+            AvailableAtTheBranch.objects.update(quantity=STOCK)
+            actors = get_actors(options["customers"], options["waiters"])
+            # The application is imported once the settings are replaced.
+            from config.asgi import application
+
+            recorder, duration = asyncio.run(
+                run_load_test(
+                    application,
+                    actors,
+                    duration=options["duration"],
+                    ramp_up=options["ramp_up"],
+                    think_time=options["think_time"],
+                    transport=options["transport"],
+                    port=options["port"],
+                    seed=options["seed"],
+                )
+            )
+            connection.close()
+
+        report = recorder.report(duration)
+        self.stdout.write(
+            f"{'endpoint':45} {'requests':>8} {'rps':>8} {'p50 ms':>8} "
+            f"{'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'4xx':>7} {'errors':>7}"
+        )
+        for label, stats in report.items():
+            self.stdout.write(
+                f"{label:45} {stats['requests']:8} {stats['rps']:8.2f} "
+                f"{stats['p50']:8.2f} {stats['p95']:8.2f} {stats['p99']:8.2f} "
+                f"{stats['max']:8.2f} {stats['rejected']:7.2%} "
+                f"{stats['errors']:7.2%}"
+            )
+        orders = report.get("POST ordering/create-order/", {"requests": 0})
+        completed = report.get("GET web/complete-order/", {"requests": 0})
+        self.stdout.write(
+            f"{len(actors['customers'])} customers, {len(actors['baristas'])} "
+            f"baristas and {len(actors['waiters'])} waiters for {duration:.1f} s: "
+            f"{orders['requests'] / duration:.2f} orders/s created, "
+            f"{completed['requests'] / duration:.2f} orders/s completed."
+        )
@@ -0,0 +1,95 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("branches", "0009_branch_counts_of_tables"),
+        (
+            "storage",
+            "0017_alter_readymadeproductavailableatthebranch_ready_made_product",
+        ),
+        ("ordering", "0010_alter_orderitem_options"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ItemPopularity",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("score", models.FloatField(default=0, verbose_name="Score")),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Updated at"),
+                ),
+                (
+                    "branch",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="popularities",
+                        to="branches.branch",
+                        verbose_name="Branch",
+                    ),
+                ),
+                (
+                    "item",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="popularities",
+                        to="storage.item",
+                        verbose_name="Item",
+                    ),
+                ),
+                (
+                    "ready_made_product",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="popularities",
+                        to="storage.readymadeproduct",
+                        verbose_name="Ready made product",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Item popularity",
+                "verbose_name_plural": "Item popularities",
+                "ordering": ["-score"],
+                "indexes": [
+                    models.Index(
+                        fields=["branch", "-score"],
+                        name="ordering_it_branch__5e0ea3_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="itempopularity",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("item__isnull", False)),
+                fields=("branch", "item"),
+                name="unique_item_popularity",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="itempopularity",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("ready_made_product__isnull", False)),
+                fields=("branch", "ready_made_product"),
+                name="unique_ready_made_product_popularity",
+            ),
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("branches", "0009_branch_counts_of_tables"),
+        ("ordering", "0011_itempopularity"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ItemCooccurrence",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("source_id", models.PositiveIntegerField(verbose_name="Source id")),
+                (
+                    "source_is_ready_made_product",
+                    models.BooleanField(
+                        default=False, verbose_name="Source is ready made product"
+                    ),
+                ),
+                ("target_id", models.PositiveIntegerField(verbose_name="Target id")),
+                (
+                    "target_is_ready_made_product",
+                    models.BooleanField(
+                        default=False, verbose_name="Target is ready made product"
+                    ),
+                ),
+                ("count", models.PositiveIntegerField(default=0, verbose_name="Count")),
+                (
+                    "branch",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="cooccurrences",
+                        to="branches.branch",
+                        verbose_name="Branch",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Item co-occurrence",
+                "verbose_name_plural": "Item co-occurrences",
+                "ordering": ["-count"],
+                "indexes": [
+                    models.Index(
+                        fields=[
+                            "branch",
+                            "source_id",
+                            "source_is_ready_made_product",
+                            "-count",
+                        ],
+                        name="cooccurrence_lookup_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="itemcooccurrence",
+            constraint=models.UniqueConstraint(
+                fields=(
+                    "branch",
+                    "source_id",
+                    "source_is_ready_made_product",
+                    "target_id",
+                    "target_is_ready_made_product",
+                ),
+                name="unique_item_cooccurrence",
+            ),
+        ),
+    ]
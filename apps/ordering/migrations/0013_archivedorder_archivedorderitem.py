@@ -0,0 +1,164 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:18
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("storage", "0018_algoliarecord"),
+        ("branches", "0009_branch_counts_of_tables"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("ordering", "0012_itemcooccurrence"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedOrder",
+            fields=[
+                (
+                    "id",
+                    models.BigIntegerField(
+                        primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                (
+                    "table",
+                    models.IntegerField(
+                        blank=True, null=True, verbose_name="Table number"
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("new", "New"),
+                            ("in_progress", "In progress"),
+                            ("ready", "Ready"),
+                            ("canceled", "Canceled"),
+                            ("completed", "Completed"),
+                        ],
+                        max_length=20,
+                        verbose_name="Status",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(verbose_name="Created at")),
+                ("updated_at", models.DateTimeField(verbose_name="Updated at")),
+                (
+                    "completed_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Completed at"
+                    ),
+                ),
+                (
+                    "cancelled_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Cancelled at"
+                    ),
+                ),
+                (
+                    "total_price",
+                    models.DecimalField(
+                        decimal_places=2, max_digits=10, verbose_name="Total price"
+                    ),
+                ),
+                (
+                    "spent_bonus_points",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Spent bonus points"
+                    ),
+                ),
+                (
+                    "in_an_institution",
+                    models.BooleanField(
+                        default=False, verbose_name="In an institution"
+                    ),
+                ),
+                (
+                    "branch",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_orders",
+                        to="branches.branch",
+                        verbose_name="Branch",
+                    ),
+                ),
+                (
+                    "customer",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_orders",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Customer",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Archived order",
+                "verbose_name_plural": "Archived orders",
+                "ordering": ["-created_at"],
+            },
+        ),
+        migrations.CreateModel(
+            name="ArchivedOrderItem",
+            fields=[
+                (
+                    "id",
+                    models.BigIntegerField(
+                        primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                (
+                    "quantity",
+                    models.PositiveIntegerField(default=1, verbose_name="Quantity"),
+                ),
+                ("created_at", models.DateTimeField(verbose_name="Created at")),
+                (
+                    "item",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_order_items",
+                        to="storage.item",
+                        verbose_name="Item",
+                    ),
+                ),
+                (
+                    "order",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="items",
+                        to="ordering.archivedorder",
+                        verbose_name="Order",
+                    ),
+                ),
+                (
+                    "ready_made_product",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_order_items",
+                        to="storage.readymadeproduct",
+                        verbose_name="Ready made product",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Archived order item",
+                "verbose_name_plural": "Archived order items",
+                "ordering": ["-created_at"],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="archivedorder",
+            index=models.Index(
+                fields=["customer", "-created_at", "-id"],
+                name="archived_order_customer_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ordering", "0013_archivedorder_archivedorderitem"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                condition=models.Q(("in_an_institution", True)),
+                fields=["branch", "status", "-created_at", "-id"],
+                name="order_institution_board_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                condition=models.Q(("in_an_institution", False)),
+                fields=["branch", "status", "-created_at", "-id"],
+                name="order_takeaway_board_idx",
+            ),
+        ),
+    ]
@@ -83,6 +83,18 @@ class Order(models.Model):
         verbose_name = "Order"
         verbose_name_plural = "Orders"
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(
+                fields=["branch", "status", "-created_at", "-id"],
+                condition=models.Q(in_an_institution=True),
+                name="order_institution_board_idx",
+            ),
+            models.Index(
+                fields=["branch", "status", "-created_at", "-id"],
+                condition=models.Q(in_an_institution=False),
+                name="order_takeaway_board_idx",
+            ),
+        ]
 
 
 class OrderItem(models.Model):
@@ -128,3 +140,259 @@ class OrderItem(models.Model):
         verbose_name = "Order item"
         verbose_name_plural = "Order items"
         ordering = ["-created_at"]
+
+
+class ArchivedOrder(models.Model):
+    """
+    Model for closed orders moved out of the orders table (see
+    apps/ordering/archive.py). Archived orders keep the ids of the orders.
+    """
+
+    id = models.BigIntegerField(
+        primary_key=True,
+        verbose_name="ID",
+    )
+    branch = models.ForeignKey(
+        "branches.Branch",
+        on_delete=models.CASCADE,
+        related_name="archived_orders",
+        verbose_name="Branch",
+        null=True,
+        blank=True,
+    )
+    customer = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name="archived_orders",
+        verbose_name="Customer",
+    )
+    table = models.IntegerField(
+        null=True,
+        blank=True,
+        verbose_name="Table number",
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=Order.STATUS_CHOICES,
+        verbose_name="Status",
+    )
+    created_at = models.DateTimeField(
+        verbose_name="Created at",
+    )
+    updated_at = models.DateTimeField(
+        verbose_name="Updated at",
+    )
+    completed_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Completed at",
+    )
+    cancelled_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Cancelled at",
+    )
+    total_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        verbose_name="Total price",
+    )
+    spent_bonus_points = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Spent bonus points",
+    )
+    in_an_institution = models.BooleanField(
+        default=False,
+        verbose_name="In an institution",
+    )
+
+    def __str__(self):
+        return f"Archived order #{self.id} by {self.customer}"
+
+    class Meta:
+        verbose_name = "Archived order"
+        verbose_name_plural = "Archived orders"
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(
+                fields=["customer", "-created_at", "-id"],
+                name="archived_order_customer_idx",
+            ),
+        ]
+
+
+class ArchivedOrderItem(models.Model):
+    """
+    Model for the items of archived orders.
+    """
+
+    id = models.BigIntegerField(
+        primary_key=True,
+        verbose_name="ID",
+    )
+    order = models.ForeignKey(
+        ArchivedOrder,
+        on_delete=models.CASCADE,
+        related_name="items",
+        verbose_name="Order",
+    )
+    item = models.ForeignKey(
+        Item,
+        on_delete=models.CASCADE,
+        related_name="archived_order_items",
+        verbose_name="Item",
+        null=True,
+        blank=True,
+    )
+    ready_made_product = models.ForeignKey(
+        "storage.ReadyMadeProduct",
+        on_delete=models.CASCADE,
+        related_name="archived_order_items",
+        verbose_name="Ready made product",
+        null=True,
+        blank=True,
+    )
+    quantity = models.PositiveIntegerField(
+        default=1,
+        verbose_name="Quantity",
+    )
+    created_at = models.DateTimeField(
+        verbose_name="Created at",
+    )
+
+    def __str__(self):
+        return f"Archived order #{self.order_id} item {self.item}"
+
+    class Meta:
+        verbose_name = "Archived order item"
+        verbose_name_plural = "Archived order items"
+        ordering = ["-created_at"]
+
+
+class ItemPopularity(models.Model):
+    """
+    Model for time-decayed sales of an item or a ready made product at a
+    branch.
+
+    Score is a forward-decayed sum: every sold unit adds
+    exp(ln(2) * (sold_at - landmark) / half_life), so newer sales weigh
+    more and rows can be ranked by score without ever being rescaled.
+    """
+
+    branch = models.ForeignKey(
+        "branches.Branch",
+        on_delete=models.CASCADE,
+        related_name="popularities",
+        verbose_name="Branch",
+    )
+    item = models.ForeignKey(
+        Item,
+        on_delete=models.CASCADE,
+        related_name="popularities",
+        verbose_name="Item",
+        null=True,
+        blank=True,
+    )
+    ready_made_product = models.ForeignKey(
+        "storage.ReadyMadeProduct",
+        on_delete=models.CASCADE,
+        related_name="popularities",
+        verbose_name="Ready made product",
+        null=True,
+        blank=True,
+    )
+    score = models.FloatField(
+        default=0,
+        verbose_name="Score",
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Updated at",
+    )
+
+    def __str__(self):
+        return f"{self.item or self.ready_made_product} at {self.branch}: {self.score}"
+
+    class Meta:
+        verbose_name = "Item popularity"
+        verbose_name_plural = "Item popularities"
+        ordering = ["-score"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["branch", "item"],
+                condition=models.Q(item__isnull=False),
+                name="unique_item_popularity",
+            ),
+            models.UniqueConstraint(
+                fields=["branch", "ready_made_product"],
+                condition=models.Q(ready_made_product__isnull=False),
+                name="unique_ready_made_product_popularity",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["branch", "-score"]),
+        ]
+
+
+class ItemCooccurrence(models.Model):
+    """
+    Model for how many orders at a branch contained both the source and the
+    target. Items and ready made products are told apart by the
+    is_ready_made_product flags, so both directions of a pair are stored.
+    """
+
+    branch = models.ForeignKey(
+        "branches.Branch",
+        on_delete=models.CASCADE,
+        related_name="cooccurrences",
+        verbose_name="Branch",
+    )
+    source_id = models.PositiveIntegerField(
+        verbose_name="Source id",
+    )
+    source_is_ready_made_product = models.BooleanField(
+        default=False,
+        verbose_name="Source is ready made product",
+    )
+    target_id = models.PositiveIntegerField(
+        verbose_name="Target id",
+    )
+    target_is_ready_made_product = models.BooleanField(
+        default=False,
+        verbose_name="Target is ready made product",
+    )
+    count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Count",
+    )
+
+    def __str__(self):
+        return f"{self.source_id} -> {self.target_id} at {self.branch}: {self.count}"
+
+    class Meta:
+        verbose_name = "Item co-occurrence"
+        verbose_name_plural = "Item co-occurrences"
+        ordering = ["-count"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=[
+                    "branch",
+                    "source_id",
+                    "source_is_ready_made_product",
+                    "target_id",
+                    "target_is_ready_made_product",
+                ],
+                name="unique_item_cooccurrence",
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=[
+                    "branch",
+                    "source_id",
+                    "source_is_ready_made_product",
+                    "-count",
+                ],
+                name="cooccurrence_lookup_idx",
+            ),
+        ]
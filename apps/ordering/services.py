@@ -1,16 +1,19 @@
 """
 Module for services
 """
-from django.db import transaction
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
 from rest_framework import status
 
-from apps.ordering.models import Order, OrderItem
+from apps.ordering.archive import get_order_or_archived
+from apps.ordering.models import ItemCooccurrence, ItemPopularity, Order, OrderItem
 from apps.storage.models import (
     ReadyMadeProduct,
     Item,
     Composition,
-    AvailableAtTheBranch,
-    ReadyMadeProductAvailableAtTheBranch,
 )
 from apps.accounts.models import CustomUser
 from apps.notices.tasks import (
@@ -20,6 +23,13 @@ from apps.notices.tasks import (
 from apps.ordering.tasks import (
     update_user_bonus_points,
 )
+from utils.cart import check_cart
+from utils.stock import (
+    InsufficientStock,
+    increment_ingredients,
+    increment_ready_made_products,
+    retry_on_conflict,
+)
 from utils.menu import (
     check_if_items_can_be_made,
     update_ingredient_stock_on_cooking,
@@ -31,6 +41,7 @@ from utils.menu import (
 # ============================================================
 # Actions
 # ============================================================
+@retry_on_conflict()
 def create_order(
     user_id,
     total_price,
@@ -45,6 +56,13 @@ def create_order(
     """
     with transaction.atomic():
         user = CustomUser.objects.get(id=user_id)
+        if len(items) == 0:
+            return None
+        cart = check_cart(items, user.branch_id, lock=True)
+        if not pass_check_if_all_items_can_be_made and not cart.is_feasible:
+            return None
+        if not cart.available_lines:
+            return None
         order = Order.objects.create(
             customer=user,
             total_price=total_price,
@@ -53,49 +71,32 @@ def create_order(
             branch=user.branch,
             table=table_number,
         )
-        update_user_bonus_points.delay(user_id, total_price, spent_bonus_points)
 
         order_items = []
-        if len(items) == 0:
-            return None
-        for item in items:
-            is_ready_made_product = item["is_ready_made_product"]
-            item_id = item["item_id"]
-            if is_ready_made_product:
-                ready_made_product_instance = ReadyMadeProduct.objects.get(id=item_id)
-                if check_if_ready_made_product_can_be_made(
-                    ready_made_product_instance, user.branch, item["quantity"]
-                ):
-                    quantity = item["quantity"]
-                    order_items.append(
-                        OrderItem(
-                            order=order,
-                            ready_made_product=ready_made_product_instance,
-                            quantity=quantity,
-                        )
-                    )
-                    update_ready_made_product_stock_on_cooking(
-                        ready_made_product_instance, user.branch, item["quantity"]
+        for line in cart.available_lines:
+            if line["is_ready_made_product"]:
+                order_items.append(
+                    OrderItem(
+                        order=order,
+                        ready_made_product=line["instance"],
+                        quantity=line["quantity"],
                     )
+                )
             else:
-                item_instance = Item.objects.get(id=item_id)
-                if check_if_items_can_be_made(
-                    item_instance, user.branch.id, item["quantity"]
-                ):
-                    quantity = item["quantity"]
-                    order_items.append(
-                        OrderItem(
-                            order=order,
-                            item=item_instance,
-                            quantity=quantity,
-                        )
-                    )
-                    update_ingredient_stock_on_cooking(
-                        item_instance, user.branch, item["quantity"]
+                order_items.append(
+                    OrderItem(
+                        order=order,
+                        item=line["instance"],
+                        quantity=line["quantity"],
                     )
-        if not pass_check_if_all_items_can_be_made and len(order_items) != len(items):
+                )
+        try:
+            cart.reserve()
+        except InsufficientStock:
+            transaction.set_rollback(True)
             return None
         OrderItem.objects.bulk_create(order_items)
+        update_cooccurrence(order.branch_id, get_order_keys(order_items))
         order_items_names_and_quantities = get_order_items_names_and_quantities(
             order_items
         )
@@ -105,33 +106,42 @@ def create_order(
                 for order_item in order_items_names_and_quantities
             ]
         )
-        create_notification_for_client.delay(
-            client_id=user.id,
-            title=f"Ваш заказ №{order.id} создан"
+        client_notification = {
+            "client_id": user.id,
+            "title": f"Ваш заказ №{order.id} создан"
             if user.position == "waiter"
             else f"Заказ №{order.id} создан",
-            body=order_items_names_and_quantities_str,
-        )
-        create_notification_for_barista.delay(
-            order_id=order.id,
-            title=f"Заказ №{order.id} создан (в заведении), ожидайте"
+            "body": order_items_names_and_quantities_str,
+        }
+        barista_notification = {
+            "order_id": order.id,
+            "title": f"Заказ №{order.id} создан (в заведении), ожидайте"
             if in_an_institution
             else f"Заказ №{order.id} создан",
-            body=order_items_names_and_quantities_str,
-            branch_id=user.branch.id,
-        )
+            "body": order_items_names_and_quantities_str,
+            "branch_id": user.branch.id,
+        }
+
+        def enqueue_order_tasks():
+            update_user_bonus_points.delay(user_id, total_price, spent_bonus_points)
+            create_notification_for_client.delay(**client_notification)
+            create_notification_for_barista.delay(**barista_notification)
+
+        # Workers must not see the order before it is committed.
+        transaction.on_commit(enqueue_order_tasks, robust=True)
         return order
 
 
 def reorder(order_id):
     """
-    Reorders order.
+    Reorders order. The order may be archived.
     """
     with transaction.atomic():
-        order = Order.objects.get(id=order_id)
-        order_items = OrderItem.objects.filter(order=order)
+        order = get_order_or_archived(order_id)
+        if order is None:
+            raise Order.DoesNotExist(f"Order {order_id} does not exist.")
         items = []
-        for order_item in order_items:
+        for order_item in order.items.all():
             if order_item.ready_made_product:
                 items.append(
                     {
@@ -158,67 +168,73 @@ def reorder(order_id):
         return order_create
 
 
+@retry_on_conflict()
 def add_item_to_order(order_id, item_id, is_ready_made_product, quantity=1):
     """
     Adds item to order.
     """
-    with transaction.atomic():
-        order = Order.objects.get(id=order_id)
-        if not check_if_order_new(order):
-            return None
-        if is_ready_made_product:
-            ready_made_product = ReadyMadeProduct.objects.get(id=item_id)
-            if check_if_ready_made_product_can_be_made(
-                ready_made_product, order.customer.branch, quantity
-            ):
-                try:
-                    order_item = OrderItem.objects.get(
-                        order=order,
-                        ready_made_product=ready_made_product,
-                    )
-                    order_item.quantity += quantity
-                    order_item.save()
-                except OrderItem.DoesNotExist:
-                    OrderItem.objects.create(
-                        order=order,
-                        ready_made_product=ready_made_product,
-                        quantity=quantity,
-                    )
-                update_ready_made_product_stock_on_cooking(
-                    ready_made_product, order.customer.branch, quantity
-                )
-                order.total_price += ready_made_product.price * quantity
-                order.save()
-                return order  # Return the Order object
-            else:
+    try:
+        with transaction.atomic():
+            order = Order.objects.get(id=order_id)
+            if not check_if_order_new(order):
                 return None
-        else:
-            try:
-                item = Item.objects.get(id=item_id)
-                if check_if_items_can_be_made(item, order.customer.branch.id, quantity):
+            if is_ready_made_product:
+                ready_made_product = ReadyMadeProduct.objects.get(id=item_id)
+                if check_if_ready_made_product_can_be_made(
+                    ready_made_product, order.customer.branch, quantity
+                ):
                     try:
                         order_item = OrderItem.objects.get(
                             order=order,
-                            item=item,
+                            ready_made_product=ready_made_product,
                         )
                         order_item.quantity += quantity
                         order_item.save()
                     except OrderItem.DoesNotExist:
                         OrderItem.objects.create(
                             order=order,
-                            item=item,
+                            ready_made_product=ready_made_product,
                             quantity=quantity,
                         )
-                    update_ingredient_stock_on_cooking(
-                        item, order.customer.branch, quantity
+                    update_ready_made_product_stock_on_cooking(
+                        ready_made_product, order.customer.branch, quantity
                     )
-                    order.total_price += item.price * quantity
+                    order.total_price += ready_made_product.price * quantity
                     order.save()
                     return order  # Return the Order object
                 else:
                     return None
-            except Item.DoesNotExist:
-                return None
+            else:
+                try:
+                    item = Item.objects.get(id=item_id)
+                    if check_if_items_can_be_made(
+                        item, order.customer.branch.id, quantity
+                    ):
+                        try:
+                            order_item = OrderItem.objects.get(
+                                order=order,
+                                item=item,
+                            )
+                            order_item.quantity += quantity
+                            order_item.save()
+                        except OrderItem.DoesNotExist:
+                            OrderItem.objects.create(
+                                order=order,
+                                item=item,
+                                quantity=quantity,
+                            )
+                        update_ingredient_stock_on_cooking(
+                            item, order.customer.branch, quantity
+                        )
+                        order.total_price += item.price * quantity
+                        order.save()
+                        return order  # Return the Order object
+                    else:
+                        return None
+                except Item.DoesNotExist:
+                    return None
+    except InsufficientStock:
+        return None
 
 
 def check_if_order_new(order):
@@ -263,6 +279,119 @@ def remove_order_item(order_item_id):
         return order
 
 
+# ============================================================
+# Popularity
+# ============================================================
+POPULARITY_HALF_LIFE = timedelta(days=14)
+POPULARITY_LANDMARK = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def get_popularity_weight(moment):
+    """
+    Returns the forward-decay weight of a unit sold at the moment.
+    """
+    age = (moment - POPULARITY_LANDMARK) / POPULARITY_HALF_LIFE
+    return math.exp(math.log(2) * age)
+
+
+def add_popularity(branch_id, quantities, moment):
+    """
+    Adds sold quantities {(item_id, ready_made_product_id): quantity} to
+    the popularity rollup of the branch.
+    """
+    weight = get_popularity_weight(moment)
+    for (item_id, ready_made_product_id), quantity in quantities.items():
+        lookup = {
+            "branch_id": branch_id,
+            "item_id": item_id,
+            "ready_made_product_id": ready_made_product_id,
+        }
+        score = quantity * weight
+        if ItemPopularity.objects.filter(**lookup).update(score=F("score") + score):
+            continue
+        try:
+            with transaction.atomic():
+                ItemPopularity.objects.create(score=score, **lookup)
+        except IntegrityError:
+            ItemPopularity.objects.filter(**lookup).update(score=F("score") + score)
+
+
+def update_popularity(order):
+    """
+    Adds the items of the completed order to the popularity rollup.
+    """
+    if order.branch_id is None:
+        return
+    quantities = {}
+    for item_id, ready_made_product_id, quantity in OrderItem.objects.filter(
+        order=order
+    ).values_list("item_id", "ready_made_product_id", "quantity"):
+        if item_id is None and ready_made_product_id is None:
+            continue
+        key = (item_id, ready_made_product_id)
+        quantities[key] = quantities.get(key, 0) + quantity
+    add_popularity(order.branch_id, quantities, order.completed_at or order.created_at)
+
+
+# ============================================================
+# Co-occurrence
+# ============================================================
+def update_cooccurrence(branch_id, keys):
+    """
+    Counts one more order at the branch for every ordered pair of the
+    distinct (id, is_ready_made_product) keys of the order.
+
+    Missing pairs are inserted with zero count and then all pairs are
+    incremented by one statement, so concurrent orders do not lose counts.
+    """
+    keys = sorted(set(keys))
+    if branch_id is None or len(keys) < 2:
+        return
+    ItemCooccurrence.objects.bulk_create(
+        [
+            ItemCooccurrence(
+                branch_id=branch_id,
+                source_id=source_id,
+                source_is_ready_made_product=source_is_ready_made_product,
+                target_id=target_id,
+                target_is_ready_made_product=target_is_ready_made_product,
+            )
+            for source_id, source_is_ready_made_product in keys
+            for target_id, target_is_ready_made_product in keys
+            if (source_id, source_is_ready_made_product)
+            != (target_id, target_is_ready_made_product)
+        ],
+        ignore_conflicts=True,
+    )
+    sources = Q()
+    targets = Q()
+    for key_id, is_ready_made_product in keys:
+        sources |= Q(
+            source_id=key_id, source_is_ready_made_product=is_ready_made_product
+        )
+        targets |= Q(
+            target_id=key_id, target_is_ready_made_product=is_ready_made_product
+        )
+    ItemCooccurrence.objects.filter(sources, targets, branch_id=branch_id).exclude(
+        source_id=F("target_id"),
+        source_is_ready_made_product=F("target_is_ready_made_product"),
+    ).update(count=F("count") + 1)
+
+
+def get_order_keys(order_items):
+    """
+    Returns (id, is_ready_made_product) keys of the order items.
+    """
+    return [
+        (order_item.ready_made_product_id, True)
+        if order_item.ready_made_product_id is not None
+        else (order_item.item_id, False)
+        for order_item in order_items
+        if order_item.ready_made_product_id is not None
+        or order_item.item_id is not None
+    ]
+
+
 # ============================================================
 # Getters
 # ============================================================
@@ -291,42 +420,35 @@ def get_order_items_names_and_quantities(order_items):
 
 def get_reorder_information(order_id):
     """
-    Returns reorder information.
+    Returns reorder information. The order may be archived.
     """
     try:
-        try:
-            order = Order.objects.get(id=order_id)
-        except Order.DoesNotExist:
+        order = get_order_or_archived(order_id)
+        if order is None:
             return {
                 "message": "Заказ не найден.",
                 "details": "Заказ не найден.",
                 "status": status.HTTP_404_NOT_FOUND,
             }
         current_branch = order.customer.branch
-        try:
-            order_items = OrderItem.objects.filter(order=order)
-        except OrderItem.DoesNotExist:
-            return {
-                "message": "Заказ не найден.",
-                "details": "Заказ не найден.",
-                "status": status.HTTP_404_NOT_FOUND,
-            }
-        not_available_items = []
-        for order_item in order_items:
-            if order_item.ready_made_product:
-                if check_if_ready_made_product_can_be_made(
-                    order_item.ready_made_product, current_branch, order_item.quantity
-                ):
-                    continue
-                else:
-                    not_available_items.append(order_item.ready_made_product.name)
-            else:
-                if check_if_items_can_be_made(
-                    order_item.item, current_branch.id, order_item.quantity
-                ):
-                    continue
-                else:
-                    not_available_items.append(order_item.item.name)
+        order_items = order.items.all()
+        cart = check_cart(
+            [
+                {
+                    "item_id": order_item.ready_made_product_id
+                    if order_item.ready_made_product_id
+                    else order_item.item_id,
+                    "is_ready_made_product": order_item.ready_made_product_id
+                    is not None,
+                    "quantity": order_item.quantity,
+                }
+                for order_item in order_items
+            ],
+            current_branch.id,
+        )
+        not_available_items = [
+            line["instance"].name for line in cart.short_lines if line["instance"]
+        ]
         if len(not_available_items) == len(order_items):
             return {
                 "message": f"Заказать в заведении {current_branch.name_of_shop}?",
@@ -358,38 +480,25 @@ def return_item_ingredients_to_storage(item_id, branch_id, quantity):
     """
     Return item ingredients to storage.
     """
-    try:
-        compositions = Composition.objects.filter(item_id=item_id).select_related(
-            "ingredient"
+    supply = {}
+    for ingredient_id, ingredient_quantity in Composition.objects.filter(
+        item_id=item_id, ingredient__isnull=False
+    ).values_list("ingredient_id", "quantity"):
+        supply[ingredient_id] = (
+            supply.get(ingredient_id, 0) + ingredient_quantity * quantity
         )
-        ingredients_to_update = []
-
-        for composition in compositions:
-            available_ingredient = AvailableAtTheBranch.objects.get(
-                branch_id=branch_id, ingredient_id=composition.ingredient_id
-            )
-            available_ingredient.quantity += composition.quantity * quantity
-            ingredients_to_update.append(available_ingredient)
-
-        AvailableAtTheBranch.objects.bulk_update(ingredients_to_update, ["quantity"])
-        return "Updated successfully."
-    except Exception as e:
-        raise e
+    increment_ingredients(branch_id, supply)
+    return "Updated successfully."
 
 
 def return_ready_made_product_to_storage(ready_made_product, branch_id, quantity):
     """
     Return ready made product to storage.
     """
-    try:
-        available_product = ReadyMadeProductAvailableAtTheBranch.objects.get(
-            branch_id=branch_id, ready_made_product=ready_made_product
-        )
-        available_product.quantity += quantity
-        available_product.save()
-        return "Updated successfully."
-    except Exception as e:
-        raise e
+    increment_ready_made_products(
+        branch_id, {getattr(ready_made_product, "pk", ready_made_product): quantity}
+    )
+    return "Updated successfully."
 
 
 def return_order_item_to_storage(order_item):
@@ -1,30 +1,57 @@
+from django.db import transaction
 from django.db.models.signals import post_save, post_delete
-from django.dispatch import receiver
-from apps.ordering.tasks import (
-    update_new_orders_list_on_barista_side,
-)
-from apps.notices.tasks import (
-    update_notifications_on_barista_side,
-    create_reminder,
-)
+from apps.notices.outbox import publish_event
+from apps.notices.tasks import create_reminder
 
 from apps.ordering.models import Order, OrderItem
+from utils.order_board import bump_order_board_on_commit
 
 
-@receiver(post_save, sender=Order)
-def send_notification(sender, instance, **kwargs):
+def publish_new_orders(branch_id):
+    """
+    Push the new orders lists of the branch to baristas.
+    """
+    publish_event(f"new_orders_takeaway_{branch_id}", "get_new_orders")
+    publish_event(f"new_orders_institution_{branch_id}", "get_new_orders")
+
+
+def send_notification(sender, instance, created, **kwargs):
     """
     Sends notification to barista when new order is updated or created.
     """
-    update_new_orders_list_on_barista_side.delay(instance.branch_id)
-    update_notifications_on_barista_side.delay(instance.branch_id)
-    create_reminder.apply_async((instance.branch_id, instance.id), countdown=120)
+    bump_order_board_on_commit(instance.branch_id)
+    publish_new_orders(instance.branch_id)
+    if created:
+        branch_id, order_id = instance.branch_id, instance.id
+
+        def schedule_reminder():
+            create_reminder.apply_async((branch_id, order_id), countdown=120)
+
+        transaction.on_commit(schedule_reminder, robust=True)
 
 
-@receiver(post_delete, sender=Order)
-def send_notification(sender, instance, **kwargs):
+def send_deletion_notification(sender, instance, **kwargs):
     """
     Sends notification to barista when new order is deleted.
     """
-    update_new_orders_list_on_barista_side.delay(instance.branch_id)
-    update_notifications_on_barista_side.delay(instance.branch_id)
+    bump_order_board_on_commit(instance.branch_id)
+    publish_new_orders(instance.branch_id)
+
+
+def invalidate_order_board(sender, instance, **kwargs):
+    """
+    Invalidates the order board of the branch of the changed order item.
+    """
+    branch_id = (
+        Order.objects.filter(id=instance.order_id)
+        .values_list("branch_id", flat=True)
+        .first()
+    )
+    if branch_id is not None:
+        bump_order_board_on_commit(branch_id)
+
+
+post_save.connect(send_notification, sender=Order)
+post_delete.connect(send_deletion_notification, sender=Order)
+post_save.connect(invalidate_order_board, sender=OrderItem)
+post_delete.connect(invalidate_order_board, sender=OrderItem)
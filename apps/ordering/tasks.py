@@ -1,9 +1,8 @@
 from celery import shared_task
 from decimal import Decimal
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+from django.conf import settings
 from apps.accounts.models import CustomUser
-import time
+from apps.ordering.archive import archive_orders
 
 
 @shared_task
@@ -18,21 +17,8 @@ def update_user_bonus_points(user_id, total_price, spent_bonus_points):
 
 
 @shared_task
-def update_new_orders_list_on_barista_side(branch_id):
+def archive_orders_task():
     """
-    Updates new orders list on barista side.
+    Moves old closed orders into the archive tables.
     """
-    time.sleep(2)
-    channel_layer = get_channel_layer()
-    async_to_sync(channel_layer.group_send)(
-        f"new_orders_takeaway_{branch_id}",
-        {
-            "type": "get_new_orders",
-        },
-    )
-    async_to_sync(channel_layer.group_send)(
-        f"new_orders_institution_{branch_id}",
-        {
-            "type": "get_new_orders",
-        },
-    )
+    return archive_orders(batch_size=settings.ORDER_ARCHIVE_BATCH_SIZE)
@@ -1,7 +1,30 @@
-from django.test import TestCase
+import asyncio
+import re
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from datetime import timedelta
+from unittest.mock import Mock, patch
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models.signals import post_delete
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 import json
 from rest_framework.test import APIClient
-from utils.menu import update_ingredient_stock_on_cooking
+from utils.cart import check_cart
+from utils.stock import (
+    InsufficientStock,
+    decrement_ingredients,
+    decrement_ready_made_products,
+)
+from utils.menu import (
+    get_compatibles,
+    get_popular_items,
+    update_ingredient_stock_on_cooking,
+)
 from apps.storage.models import (
     Ingredient,
     AvailableAtTheBranch,
@@ -12,8 +35,28 @@ from apps.storage.models import (
     ReadyMadeProduct,
 )
 from apps.branches.models import Branch, Schedule
-from apps.ordering.models import Order, OrderItem
+from apps.ordering.archive import archive_orders
+from apps.ordering.models import (
+    ArchivedOrder,
+    ArchivedOrderItem,
+    ItemCooccurrence,
+    ItemPopularity,
+    Order,
+    OrderItem,
+)
 from apps.accounts.models import CustomUser
+from apps.ordering.services import (
+    POPULARITY_HALF_LIFE,
+    create_order,
+    get_popularity_weight,
+)
+from apps.notices.consumers import NotificationToClentConsumer
+from apps.notices.models import OutboxEvent
+from apps.notices.services import clear_waiter_notifications
+from apps.waiter.services import get_orders_in_institution
+from apps.web.services import build_order_board, complete_order, get_orders
+from utils.load_test import ASGIClient, Recorder
+from utils.pagination import paginate
 
 
 # ==============================================================================
@@ -333,3 +376,863 @@ class CreateOrderViewTest(TestCase):
             ReadyMadeProductAvailableAtTheBranch.objects.get(id=2).quantity, 998
         )
         self.assertEqual(Order.objects.get().table, 4)
+
+    def test_order_change_publishes_no_empty_notification(self):
+        """
+        Test that branch notification events always carry their delta.
+        """
+        order = Order.objects.create(
+            branch=self.branch1, customer=self.user2, total_price=4
+        )
+        order.status = "in_progress"
+        order.save()
+        self.assertTrue(
+            OutboxEvent.objects.filter(
+                group=f"new_orders_takeaway_{self.branch1.id}"
+            ).exists()
+        )
+        self.assertFalse(
+            OutboxEvent.objects.filter(
+                group=f"branch_{self.branch1.id}", payload={}
+            ).exists()
+        )
+
+
+# ==============================================================================
+# check_cart test
+# ==============================================================================
+class CheckCartTest(TestCase):
+    """
+    Tests for check_cart function.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Set up test data.
+        """
+        cls.schedeule = Schedule.objects.create(
+            title="Test schedule", description="Test description"
+        )
+        cls.branch = Branch.objects.create(
+            schedule=cls.schedeule,
+            name_of_shop="Test shop",
+            address="Test address",
+            phone_number="+375291234567",
+            link_to_map="https://www.google.com/",
+        )
+        cls.user = CustomUser.objects.create(
+            phone_number="+996777777777",
+            first_name="Abdu",
+            last_name="Rozik",
+            branch=cls.branch,
+            username="abdu",
+            password="AbduGiga",
+        )
+        cls.milk = Ingredient.objects.create(name="Milk", measurement_unit="ml")
+        cls.espresso = Ingredient.objects.create(name="Espresso", measurement_unit="g")
+        cls.available_milk = AvailableAtTheBranch.objects.create(
+            branch=cls.branch, ingredient=cls.milk, quantity=500
+        )
+        cls.available_espresso = AvailableAtTheBranch.objects.create(
+            branch=cls.branch, ingredient=cls.espresso, quantity=1000
+        )
+        cls.category = Category.objects.create(name="Coffee")
+        cls.latte = Item.objects.create(
+            name="Latte",
+            category=cls.category,
+            description="Test description",
+            price=2.00,
+        )
+        cls.cappuccino = Item.objects.create(
+            name="Cappuccino",
+            category=cls.category,
+            description="Test description",
+            price=2.00,
+        )
+        Composition.objects.create(item=cls.latte, ingredient=cls.milk, quantity=200)
+        Composition.objects.create(item=cls.latte, ingredient=cls.espresso, quantity=50)
+        Composition.objects.create(
+            item=cls.cappuccino, ingredient=cls.milk, quantity=150
+        )
+        cls.croissant = ReadyMadeProduct.objects.create(
+            name="Croissant",
+            category=cls.category,
+            description="Test description",
+            price=2.00,
+        )
+        cls.available_croissant = ReadyMadeProductAvailableAtTheBranch.objects.create(
+            branch=cls.branch, ready_made_product=cls.croissant, quantity=3
+        )
+
+    def line(self, instance, quantity=1):
+        return {
+            "item_id": instance.id,
+            "is_ready_made_product": isinstance(instance, ReadyMadeProduct),
+            "quantity": quantity,
+        }
+
+    def test_shared_ingredient_demand(self):
+        """
+        Lines that share an ingredient are checked against the same stock.
+        """
+        cart = check_cart(
+            [
+                self.line(self.latte),
+                self.line(self.latte),
+                self.line(self.cappuccino),
+                self.line(self.croissant, 2),
+                self.line(self.croissant, 2),
+            ],
+            self.branch.id,
+        )
+        self.assertFalse(cart.is_feasible)
+        self.assertEqual([line["index"] for line in cart.short_lines], [2, 4])
+        self.assertEqual([line["index"] for line in cart.available_lines], [0, 1, 3])
+
+    def test_unknown_item_is_short(self):
+        cart = check_cart(
+            [{"item_id": 0, "is_ready_made_product": False, "quantity": 1}],
+            self.branch.id,
+        )
+        self.assertEqual([line["index"] for line in cart.short_lines], [0])
+
+    def test_query_count_does_not_depend_on_cart_size(self):
+        with self.assertNumQueries(5):
+            check_cart(
+                [self.line(self.latte), self.line(self.croissant)], self.branch.id
+            )
+        with self.assertNumQueries(5):
+            check_cart(
+                [self.line(self.latte), self.line(self.croissant)] * 10
+                + [self.line(self.cappuccino)] * 10,
+                self.branch.id,
+            )
+
+    def test_reserve(self):
+        cart = check_cart(
+            [self.line(self.latte, 2), self.line(self.croissant, 3)],
+            self.branch.id,
+            lock=True,
+        )
+        cart.reserve()
+        self.available_milk.refresh_from_db()
+        self.available_espresso.refresh_from_db()
+        self.available_croissant.refresh_from_db()
+        self.assertEqual(self.available_milk.quantity, 100)
+        self.assertEqual(self.available_espresso.quantity, 900)
+        self.assertEqual(self.available_croissant.quantity, 0)
+
+    def test_decrement_is_all_or_nothing(self):
+        with self.assertRaises(InsufficientStock) as error:
+            decrement_ingredients(
+                self.branch.id, {self.milk.id: 400, self.espresso.id: 1001}
+            )
+        self.assertEqual(error.exception.keys, [self.espresso.id])
+        self.available_milk.refresh_from_db()
+        self.assertEqual(self.available_milk.quantity, 500)
+        decrement_ingredients(self.branch.id, {self.milk.id: 400, self.espresso.id: 1})
+        self.available_milk.refresh_from_db()
+        self.assertEqual(self.available_milk.quantity, 100)
+
+    def test_create_order_with_short_line(self):
+        """
+        An order with a short line is not created and stock is untouched.
+        """
+        order = create_order(
+            user_id=self.user.id,
+            total_price=6.00,
+            items=[self.line(self.latte, 2), self.line(self.cappuccino)],
+            in_an_institution=False,
+        )
+        self.assertIsNone(order)
+        self.assertEqual(Order.objects.count(), 0)
+        self.available_milk.refresh_from_db()
+        self.assertEqual(self.available_milk.quantity, 500)
+
+    def test_create_order_passing_short_lines(self):
+        order = create_order(
+            user_id=self.user.id,
+            total_price=6.00,
+            items=[self.line(self.latte, 2), self.line(self.cappuccino)],
+            in_an_institution=False,
+            pass_check_if_all_items_can_be_made=True,
+        )
+        self.assertEqual(order.items.count(), 1)
+        self.available_milk.refresh_from_db()
+        self.assertEqual(self.available_milk.quantity, 100)
+
+
+# ==============================================================================
+# Concurrent orders test
+# ==============================================================================
+class ConcurrentOrdersTest(TransactionTestCase):
+    """
+    Fires parallel orders at one branch and checks that stock is written
+    off exactly once per accepted order and never goes below zero.
+    """
+
+    orders = 200
+    workers = 8
+
+    def setUp(self):
+        """
+        Set up test dependencies.
+        """
+        self.schedeule = Schedule.objects.create(
+            title="Test schedule", description="Test description"
+        )
+        self.branch = Branch.objects.create(
+            schedule=self.schedeule,
+            name_of_shop="Test shop",
+            address="Test address",
+            phone_number="+375291234567",
+            link_to_map="https://www.google.com/",
+        )
+        self.users = [
+            CustomUser.objects.create(
+                phone_number=f"+996700{index:06d}",
+                username=f"user{index}",
+                branch=self.branch,
+            )
+            for index in range(self.workers)
+        ]
+        self.milk = Ingredient.objects.create(name="Milk", measurement_unit="ml")
+        self.espresso = Ingredient.objects.create(name="Espresso", measurement_unit="g")
+        self.available_milk = AvailableAtTheBranch.objects.create(
+            branch=self.branch, ingredient=self.milk, quantity=15000
+        )
+        self.available_espresso = AvailableAtTheBranch.objects.create(
+            branch=self.branch, ingredient=self.espresso, quantity=100000
+        )
+        category = Category.objects.create(name="Coffee")
+        self.latte = Item.objects.create(
+            name="Latte", category=category, description="Latte", price=2.00
+        )
+        Composition.objects.create(item=self.latte, ingredient=self.milk, quantity=100)
+        Composition.objects.create(
+            item=self.latte, ingredient=self.espresso, quantity=10
+        )
+        self.croissant = ReadyMadeProduct.objects.create(
+            name="Croissant", category=category, description="Croissant", price=2.00
+        )
+        self.available_croissant = ReadyMadeProductAvailableAtTheBranch.objects.create(
+            branch=self.branch, ready_made_product=self.croissant, quantity=1000
+        )
+
+    def place_order(self, index):
+        try:
+            return create_order(
+                user_id=self.users[index % self.workers].id,
+                total_price=4.00,
+                items=[
+                    {
+                        "item_id": self.latte.id,
+                        "is_ready_made_product": False,
+                        "quantity": 1,
+                    },
+                    {
+                        "item_id": self.croissant.id,
+                        "is_ready_made_product": True,
+                        "quantity": 1,
+                    },
+                ],
+                in_an_institution=False,
+            )
+        finally:
+            connection.close()
+
+    @patch("apps.ordering.signals.create_reminder")
+    @patch("apps.ordering.services.create_notification_for_barista")
+    @patch("apps.ordering.services.create_notification_for_client")
+    @patch("apps.ordering.services.update_user_bonus_points")
+    def test_parallel_orders(self, *tasks):
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            results = list(executor.map(self.place_order, range(self.orders)))
+
+        accepted = [order for order in results if order is not None]
+        self.assertEqual(len(accepted), 150)
+        self.assertEqual(Order.objects.count(), 150)
+        self.available_milk.refresh_from_db()
+        self.available_espresso.refresh_from_db()
+        self.available_croissant.refresh_from_db()
+        self.assertEqual(self.available_milk.quantity, 0)
+        self.assertEqual(self.available_espresso.quantity, 100000 - 150 * 10)
+        self.assertEqual(self.available_croissant.quantity, 1000 - 150)
+
+
+# ==============================================================================
+# Popularity test
+# ==============================================================================
+class PopularityTest(TestCase):
+    """
+    Tests for the item popularity rollup.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Set up test data.
+        """
+        cls.schedeule = Schedule.objects.create(
+            title="Test schedule", description="Test description"
+        )
+        cls.branch1 = Branch.objects.create(
+            schedule=cls.schedeule,
+            name_of_shop="Branch",
+            address="Test address",
+            phone_number="+375291234567",
+            link_to_map="https://www.google.com/",
+        )
+        cls.branch2 = Branch.objects.create(
+            schedule=cls.schedeule,
+            name_of_shop="Brio",
+            address="Test address",
+            phone_number="+375291234568",
+            link_to_map="https://www.google.com/",
+        )
+        cls.user = CustomUser.objects.create(
+            phone_number="+996777777777", username="abdu", branch=cls.branch1
+        )
+        cls.category = Category.objects.create(name="Coffee")
+        cls.latte = Item.objects.create(
+            name="Latte", category=cls.category, description="Latte", price=2.00
+        )
+        cls.espresso = Item.objects.create(
+            name="Espresso", category=cls.category, description="Espresso", price=1.00
+        )
+        cls.croissant = ReadyMadeProduct.objects.create(
+            name="Croissant", category=cls.category, description="Croissant", price=2
+        )
+        ReadyMadeProductAvailableAtTheBranch.objects.create(
+            branch=cls.branch1, ready_made_product=cls.croissant, quantity=10
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def complete(self, branch, lines, completed_at=None):
+        order = Order.objects.create(
+            customer=self.user,
+            branch=branch,
+            total_price=0,
+            status="ready",
+        )
+        for instance, quantity in lines:
+            OrderItem.objects.create(
+                order=order,
+                quantity=quantity,
+                **{
+                    "ready_made_product"
+                    if isinstance(instance, ReadyMadeProduct)
+                    else "item": instance
+                },
+            )
+        self.assertTrue(complete_order(order.id))
+        if completed_at is not None:
+            Order.objects.filter(id=order.id).update(completed_at=completed_at)
+        return order
+
+    def test_rollup_is_branch_scoped(self):
+        self.complete(self.branch1, [(self.latte, 1), (self.croissant, 2)])
+        self.complete(self.branch2, [(self.espresso, 5)])
+        self.complete(self.branch1, [(self.latte, 2)])
+        popularities = ItemPopularity.objects.filter(branch=self.branch1)
+        self.assertEqual(popularities.count(), 2)
+        self.assertEqual(
+            get_popular_items(self.branch1.id), [self.latte, self.croissant]
+        )
+        self.assertEqual(get_popular_items(self.branch2.id), [self.espresso])
+
+    def test_recent_sales_weigh_more(self):
+        now = timezone.now()
+        self.assertAlmostEqual(
+            get_popularity_weight(now)
+            / get_popularity_weight(now - POPULARITY_HALF_LIFE),
+            2,
+        )
+
+    def test_unavailable_items_are_skipped(self):
+        ReadyMadeProductAvailableAtTheBranch.objects.update(quantity=0)
+        self.complete(self.branch1, [(self.croissant, 5), (self.latte, 1)])
+        self.assertEqual(get_popular_items(self.branch1.id), [self.latte])
+
+    def test_backfill_matches_incremental_rollup(self):
+        first = self.complete(self.branch1, [(self.latte, 1), (self.croissant, 2)])
+        self.complete(self.branch2, [(self.espresso, 5)])
+        Order.objects.filter(id=first.id).update(
+            completed_at=timezone.now() - POPULARITY_HALF_LIFE
+        )
+        call_command("backfill_popularity", stdout=StringIO())
+        scores = dict(
+            ItemPopularity.objects.filter(branch=self.branch1).values_list(
+                "ready_made_product_id", "score"
+            )
+        )
+        self.assertAlmostEqual(
+            scores[self.croissant.id],
+            2 * get_popularity_weight(timezone.now() - POPULARITY_HALF_LIFE),
+            delta=1e-3 * scores[self.croissant.id],
+        )
+        self.assertEqual(ItemPopularity.objects.count(), 3)
+
+
+# ==============================================================================
+# Co-occurrence test
+# ==============================================================================
+class CooccurrenceTest(TestCase):
+    """
+    Tests for the item co-occurrence store.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Set up test data.
+        """
+        cls.schedeule = Schedule.objects.create(
+            title="Test schedule", description="Test description"
+        )
+        cls.branch = Branch.objects.create(
+            schedule=cls.schedeule,
+            name_of_shop="Branch",
+            address="Test address",
+            phone_number="+375291234567",
+            link_to_map="https://www.google.com/",
+        )
+        cls.user = CustomUser.objects.create(
+            phone_number="+996777777777", username="abdu", branch=cls.branch
+        )
+        cls.category = Category.objects.create(name="Coffee")
+        cls.latte = Item.objects.create(
+            name="Latte", category=cls.category, description="Latte", price=2.00
+        )
+        cls.espresso = Item.objects.create(
+            name="Espresso", category=cls.category, description="Espresso", price=1.00
+        )
+        cls.tea = Item.objects.create(
+            name="Tea", category=cls.category, description="Tea", price=1.00
+        )
+        cls.croissant = ReadyMadeProduct.objects.create(
+            name="Croissant", category=cls.category, description="Croissant", price=2
+        )
+        ReadyMadeProductAvailableAtTheBranch.objects.create(
+            branch=cls.branch, ready_made_product=cls.croissant, quantity=100
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def order(self, *instances):
+        return create_order(
+            user_id=self.user.id,
+            total_price=0,
+            items=[
+                {
+                    "item_id": instance.id,
+                    "is_ready_made_product": isinstance(instance, ReadyMadeProduct),
+                    "quantity": 1,
+                }
+                for instance in instances
+            ],
+            in_an_institution=False,
+        )
+
+    def counts(self):
+        return sorted(
+            ItemCooccurrence.objects.values_list(
+                "source_id",
+                "source_is_ready_made_product",
+                "target_id",
+                "target_is_ready_made_product",
+                "count",
+            )
+        )
+
+    def test_get_compatibles(self):
+        self.order(self.latte, self.croissant)
+        self.order(self.latte, self.croissant, self.espresso)
+        self.order(self.latte, self.tea, self.tea)
+        self.assertEqual(
+            get_compatibles(self.latte.id, False, self.branch.id),
+            [self.croissant, self.espresso, self.tea],
+        )
+        self.assertEqual(
+            get_compatibles(self.croissant.id, True, self.branch.id),
+            [self.latte, self.espresso],
+        )
+        ReadyMadeProductAvailableAtTheBranch.objects.update(quantity=0)
+        self.assertEqual(
+            get_compatibles(self.latte.id, False, self.branch.id, limit=1),
+            [self.espresso],
+        )
+
+    def test_backfill_matches_incremental_counts(self):
+        self.order(self.latte, self.croissant)
+        self.order(self.latte, self.croissant, self.espresso)
+        self.order(self.tea, self.croissant)
+        incremental = self.counts()
+        self.assertEqual(len(incremental), 8)
+        call_command("backfill_cooccurrence", stdout=StringIO())
+        self.assertEqual(self.counts(), incremental)
+
+
+# ==============================================================================
+# Load test tests
+# ==============================================================================
+class LoadTestTest(TestCase):
+    """
+    Tests for the recorder and the in-process client of the load test.
+    """
+
+    def test_report(self):
+        recorder = Recorder()
+        for n in range(1, 101):
+            recorder.record("GET menu", n / 1000, 200)
+        recorder.record("POST order", 0.2, 201)
+        recorder.record("POST order", 0.1, 400)
+        recorder.record("POST order", 0.3, 500)
+        recorder.record("POST order", 0.4, None)
+        report = recorder.report(10)
+        self.assertEqual(list(report), ["GET menu", "POST order"])
+        self.assertEqual(report["GET menu"]["requests"], 100)
+        self.assertEqual(report["GET menu"]["rps"], 10)
+        self.assertEqual(report["GET menu"]["p50"], 50)
+        self.assertEqual(report["GET menu"]["p95"], 95)
+        self.assertEqual(report["GET menu"]["p99"], 99)
+        self.assertEqual(report["GET menu"]["max"], 100)
+        self.assertEqual(report["GET menu"]["errors"], 0)
+        self.assertEqual(report["POST order"]["p50"], 200)
+        self.assertEqual(report["POST order"]["rejected"], 0.25)
+        self.assertEqual(report["POST order"]["errors"], 0.5)
+
+    def test_asgi_client(self):
+        received = {}
+
+        async def application(scope, receive, send):
+            received["scope"] = scope
+            received["body"] = (await receive())["body"]
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 201,
+                    "headers": [(b"content-type", b"application/json")],
+                }
+            )
+            await send({"type": "http.response.body", "body": b'{"id": 1}'})
+
+        status, body = asyncio.run(
+            ASGIClient(application).request(
+                "POST",
+                "/ordering/create-order/",
+                params={"a": 1},
+                data={"items": []},
+                token="token",
+            )
+        )
+        self.assertEqual((status, body), (201, {"id": 1}))
+        headers = dict(received["scope"]["headers"])
+        self.assertEqual(headers[b"authorization"], b"Bearer token")
+        self.assertEqual(headers[b"content-length"], b"13")
+        self.assertEqual(received["scope"]["query_string"], b"a=1")
+        self.assertEqual(json.loads(received["body"]), {"items": []})
+
+
+# ==============================================================================
+# Order archive tests
+# ==============================================================================
+class OrderArchiveTest(TestCase):
+    """
+    Tests for moving old closed orders into the archive tables.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Set up test data.
+        """
+        cls.schedeule = Schedule.objects.create(
+            title="Test schedule", description="Test description"
+        )
+        cls.branch = Branch.objects.create(
+            schedule=cls.schedeule,
+            name_of_shop="Branch",
+            address="Test address",
+            phone_number="+375291234567",
+            link_to_map="https://www.google.com/",
+        )
+        cls.user = CustomUser.objects.create(
+            phone_number="+996777777777", username="abdu", branch=cls.branch
+        )
+        cls.category = Category.objects.create(name="Coffee")
+        cls.latte = Item.objects.create(
+            name="Latte", category=cls.category, description="Latte", price=2.00
+        )
+        cls.croissant = ReadyMadeProduct.objects.create(
+            name="Croissant", category=cls.category, description="Croissant", price=2
+        )
+        now = timezone.now()
+        cls.cutoff = now - timedelta(days=30)
+        cls.orders = {}
+        for name, status, days in [
+            ("old_completed", "completed", 40),
+            ("old_canceled", "canceled", 35),
+            ("old_new", "new", 40),
+            ("recent_completed", "completed", 1),
+        ]:
+            order = Order.objects.create(
+                customer=cls.user,
+                branch=cls.branch,
+                total_price=4,
+                status=status,
+                completed_at=now - timedelta(days=days)
+                if status == "completed"
+                else None,
+            )
+            OrderItem.objects.create(order=order, item=cls.latte, quantity=1)
+            OrderItem.objects.create(
+                order=order, ready_made_product=cls.croissant, quantity=2
+            )
+            Order.objects.filter(id=order.id).update(
+                created_at=now - timedelta(days=days)
+            )
+            cls.orders[name] = order
+
+    def setUp(self):
+        cache.clear()
+
+    def test_old_closed_orders_are_moved(self):
+        order = Order.objects.get(id=self.orders["old_completed"].id)
+        receiver = Mock()
+        post_delete.connect(receiver, sender=Order, weak=False)
+        self.addCleanup(post_delete.disconnect, receiver, sender=Order)
+
+        self.assertEqual(archive_orders(self.cutoff, batch_size=1), 2)
+        receiver.assert_not_called()
+        moved = [self.orders["old_completed"].id, self.orders["old_canceled"].id]
+        self.assertFalse(Order.objects.filter(id__in=moved).exists())
+        self.assertFalse(OrderItem.objects.filter(order_id__in=moved).exists())
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertCountEqual(ArchivedOrder.objects.values_list("id", flat=True), moved)
+        archived = ArchivedOrder.objects.get(id=order.id)
+        for field in ("customer_id", "branch_id", "status", "total_price"):
+            self.assertEqual(getattr(archived, field), getattr(order, field))
+        self.assertEqual(archived.created_at, order.created_at)
+        self.assertEqual(archived.completed_at, order.completed_at)
+        self.assertEqual(ArchivedOrderItem.objects.filter(order=archived).count(), 2)
+        self.assertEqual(archive_orders(self.cutoff), 0)
+
+    def test_customer_history_reads_the_archive(self):
+        archive_orders(self.cutoff)
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get("/customers/my-orders/", {"limit": 2})
+        self.assertEqual(
+            [order["id"] for order in response.data["closed_orders"]],
+            [self.orders["recent_completed"].id, self.orders["old_canceled"].id],
+        )
+        response = client.get(
+            "/customers/my-orders/",
+            {"limit": 2, "cursor": response.data["next_cursor"]},
+        )
+        self.assertEqual(
+            [order["id"] for order in response.data["closed_orders"]],
+            [self.orders["old_completed"].id],
+        )
+
+        response = client.get(
+            f"/customers/my-orders/{self.orders['old_completed'].id}/"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["status"], "completed")
+        self.assertEqual(len(response.data["items"]), 2)
+        self.assertEqual(client.get("/customers/my-orders/0/").status_code, 404)
+
+    def test_archived_order_is_reordered(self):
+        ReadyMadeProductAvailableAtTheBranch.objects.create(
+            branch=self.branch, ready_made_product=self.croissant, quantity=10
+        )
+        archive_orders(self.cutoff)
+        order_id = self.orders["old_completed"].id
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get("/ordering/reorder-information/", {"order_id": order_id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["details"], "Все товары доступны.")
+
+        response = client.get("/ordering/reorder/", {"order_id": order_id})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Order.objects.count(), 3)
+        order = Order.objects.latest("id")
+        self.assertCountEqual(
+            order.items.values_list("item_id", "ready_made_product_id", "quantity"),
+            [(self.latte.id, None, 1), (None, self.croissant.id, 2)],
+        )
+
+    def test_backfills_read_the_archive(self):
+        def rollups():
+            call_command("backfill_popularity", stdout=StringIO())
+            call_command("backfill_cooccurrence", stdout=StringIO())
+            return (
+                {
+                    (item_id, product_id): score
+                    for item_id, product_id, score in ItemPopularity.objects.values_list(
+                        "item_id", "ready_made_product_id", "score"
+                    )
+                },
+                sorted(ItemCooccurrence.objects.values_list("source_id", "count")),
+            )
+
+        popularity, cooccurrence = rollups()
+        archive_orders(self.cutoff)
+        archived_popularity, archived_cooccurrence = rollups()
+        self.assertEqual(archived_cooccurrence, cooccurrence)
+        self.assertEqual(len(archived_popularity), 2)
+        for key, score in popularity.items():
+            self.assertAlmostEqual(archived_popularity[key], score)
+
+
+# ==============================================================================
+# Query plan test
+# ==============================================================================
+class QueryPlanTest(TestCase):
+    """
+    Tests that the hot queries of the order boards, the stock write-offs and
+    the client notifications read their tables through an index.
+    """
+
+    # Patterns of a full table scan and of a sort in the query plan of each
+    # backend.
+    FULL_SCANS = {
+        "sqlite": re.compile(r"\bSCAN (\w+)"),
+        "postgresql": re.compile(r"Seq Scan on (\w+)"),
+    }
+    SORTS = {
+        "sqlite": re.compile(r"USE TEMP B-TREE FOR ORDER BY"),
+        "postgresql": re.compile(r"\bSort\b"),
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Set up test data.
+        """
+        cls.schedule = Schedule.objects.create(
+            title="Test schedule", description="Test description"
+        )
+        cls.branch = Branch.objects.create(
+            schedule=cls.schedule,
+            name_of_shop="Branch",
+            address="Test address",
+            phone_number="+375291234567",
+            link_to_map="https://www.google.com/",
+        )
+        cls.user = CustomUser.objects.create(
+            phone_number="+996777777777", username="abdu", branch=cls.branch
+        )
+        cls.category = Category.objects.create(name="Coffee")
+        cls.milk = Ingredient.objects.create(name="Milk", measurement_unit="ml")
+        cls.latte = Item.objects.create(
+            name="Latte", category=cls.category, description="Latte", price=2.00
+        )
+        Composition.objects.create(item=cls.latte, ingredient=cls.milk, quantity=200)
+        cls.croissant = ReadyMadeProduct.objects.create(
+            name="Croissant", category=cls.category, description="Croissant", price=2
+        )
+        AvailableAtTheBranch.objects.create(
+            branch=cls.branch, ingredient=cls.milk, quantity=1000
+        )
+        ReadyMadeProductAvailableAtTheBranch.objects.create(
+            branch=cls.branch, ready_made_product=cls.croissant, quantity=10
+        )
+        Order.objects.create(customer=cls.user, branch=cls.branch, total_price=2)
+
+    def setUp(self):
+        if connection.vendor not in self.FULL_SCANS:
+            self.skipTest(f"No query plan check for {connection.vendor}")
+        if connection.vendor == "postgresql":
+            # The planner reads small tables sequentially and sorts them
+            # whatever their indexes are, so that must be the only way left.
+            with connection.cursor() as cursor:
+                cursor.execute("SET enable_seqscan = off")
+                cursor.execute("SET enable_sort = off")
+
+    def get_plans(self, table, run):
+        """
+        Runs the function and returns the query plans of its queries that
+        read or write the table.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            run()
+        plans = []
+        for query in queries:
+            sql = query["sql"]
+            if not re.match(rf'(SELECT .*? FROM|UPDATE|DELETE FROM) "{table}"', sql):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute(f"{connection.ops.explain_query_prefix()} {sql}")
+                plans.append("\n".join(str(row[-1]) for row in cursor.fetchall()))
+        self.assertTrue(plans, f"No query of {table}")
+        return plans
+
+    def assert_index_scan(self, table, run, ordered=False):
+        """
+        Asserts that the queries of the function read the table through an
+        index, and in the index order when ordered is True.
+        """
+        for plan in self.get_plans(table, run):
+            self.assertNotIn(
+                table, self.FULL_SCANS[connection.vendor].findall(plan), plan
+            )
+            if ordered:
+                self.assertIsNone(self.SORTS[connection.vendor].search(plan), plan)
+
+    def test_order_board_queries(self):
+        def run():
+            for in_an_institution in (True, False):
+                orders = get_orders(self.branch.id, in_an_institution, "new")
+                paginate(orders)
+                paginate(orders, (timezone.now(), 1))
+                build_order_board(self.branch.id, in_an_institution, "ready")
+
+        self.assert_index_scan("ordering_order", run, ordered=True)
+
+    def test_table_order_queries(self):
+        self.assert_index_scan(
+            "ordering_order", lambda: get_orders_in_institution(self.branch.id)
+        )
+
+    def test_stock_queries(self):
+        def run():
+            check_cart(
+                [
+                    {
+                        "item_id": self.latte.id,
+                        "quantity": 1,
+                        "is_ready_made_product": False,
+                    },
+                    {
+                        "item_id": self.croissant.id,
+                        "quantity": 1,
+                        "is_ready_made_product": True,
+                    },
+                ],
+                self.branch.id,
+            )
+            decrement_ingredients(self.branch.id, {self.milk.id: 10})
+            decrement_ready_made_products(self.branch.id, {self.croissant.id: 1})
+
+        self.assert_index_scan("storage_availableatthebranch", run)
+        self.assert_index_scan("storage_readymadeproductavailableatthebranch", run)
+
+    def test_client_notification_queries(self):
+        def run():
+            consumer = NotificationToClentConsumer()
+            consumer.user_id = str(self.user.id)
+            consumer.get_page()
+            consumer.get_page(before_id=100)
+            consumer.get_catch_up(0)
+            consumer.get_changes([2], [1])
+            clear_waiter_notifications(self.user.id)
+
+        self.assert_index_scan("notices_clentnotification", run, ordered=True)
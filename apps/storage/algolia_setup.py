@@ -1,65 +1,179 @@
-from algoliasearch.search_client import SearchClient
-from apps.storage.models import Item, ReadyMadeProduct
-from apps.branches.models import Branch
+"""
+Module for the Algolia menu index synchronization.
+
+Every available (object, branch) pair is one record. The fingerprint of
+each pushed record is kept in AlgoliaRecord, so a sync sends only the
+records that were added or changed and deletes only the records that
+disappeared, instead of saving the whole menu of every branch. A sync
+can be limited to some branches, whose records are then the only ones
+built and compared.
+"""
+import hashlib
+import json
+import logging
+
 from django.conf import settings
-from utils.menu import (
-    check_if_items_can_be_made,
-    check_if_ready_made_product_can_be_made,
-)
+from django.db import transaction
+
+from apps.branches.models import Branch
+from apps.storage.models import AlgoliaRecord, ReadyMadeProductAvailableAtTheBranch
+from utils.availability import build_availability_matrix
+from utils.search.algolia import get_menu_index
+from utils.search.local import load_documents
+
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+
+def get_object_id(document, branch_id):
+    """
+    Returns the objectID of the document at the branch.
+
+    Ready made products are prefixed so they do not collide with items
+    that have the same id.
+    """
+    prefix = "p" if document["is_ready_made_product"] else ""
+    return f"{prefix}{document['id']}_{branch_id}"
+
+
+def get_fingerprint(record):
+    """
+    Returns the SHA-1 of the canonical JSON of the record.
+    """
+    payload = json.dumps(record, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def build_records(branch_ids=None):
+    """
+    Builds {objectID: record} of every object available at branch_ids or at
+    every branch.
+
+    Item availability comes from one availability matrix and product
+    availability from one stock query, so the number of queries does not
+    depend on the number of branches or items.
+    """
+    branches = Branch.objects.all()
+    if branch_ids is not None:
+        branches = branches.filter(id__in=branch_ids)
+    branch_ids = list(branches.values_list("id", flat=True))
+    matrix = build_availability_matrix(branch_ids)
+    available_products = set(
+        ReadyMadeProductAvailableAtTheBranch.objects.filter(
+            branch_id__in=branch_ids, quantity__gte=1
+        ).values_list("branch_id", "ready_made_product_id")
+    )
+
+    records = {}
+    documents = load_documents()
+    for branch_id in branch_ids:
+        available_items = set(matrix.available_item_ids(branch_id))
+        for document in documents:
+            if document["is_ready_made_product"]:
+                if (branch_id, document["id"]) not in available_products:
+                    continue
+            elif document["id"] not in available_items:
+                continue
+            object_id = get_object_id(document, branch_id)
+            records[object_id] = dict(document, objectID=object_id, branch_id=branch_id)
+    return records
+
+
+def diff_records(records, fingerprints):
+    """
+    Compares records with the {objectID: fingerprint} of the pushed ones.
+
+    Returns the changed records with their fingerprints and the objectIDs
+    that have to be deleted.
+    """
+    changed = {}
+    for object_id, record in records.items():
+        fingerprint = get_fingerprint(record)
+        if fingerprints.get(object_id) != fingerprint:
+            changed[object_id] = (record, fingerprint)
+    removed = [object_id for object_id in fingerprints if object_id not in records]
+    return changed, removed
+
+
+def replace_menu(index, records):
+    """
+    Replaces every record of the index, including the ones that were never
+    tracked in AlgoliaRecord, and stores the new fingerprints. Returns the
+    number of sent and removed records.
+    """
+    pushed = set(AlgoliaRecord.objects.values_list("object_id", flat=True))
+    index.replace_all_objects(list(records.values()), {"safe": True})
+    with transaction.atomic():
+        AlgoliaRecord.objects.all().delete()
+        AlgoliaRecord.objects.bulk_create(
+            (
+                AlgoliaRecord(
+                    object_id=object_id,
+                    branch_id=record["branch_id"],
+                    fingerprint=get_fingerprint(record),
+                )
+                for object_id, record in records.items()
+            ),
+            batch_size=BATCH_SIZE,
+        )
+    return len(records), len(pushed - set(records))
+
+
+def sync_menu(index=None, full=False, branch_ids=None):
+    """
+    Pushes the difference between the menu of branch_ids, or of every
+    branch, and the Algolia index.
+
+    With full=True the whole index is replaced by the menu of every branch.
+    Returns the number of updated and deleted records.
+    """
+    index = index or get_menu_index()
+    if full:
+        return replace_menu(index, build_records())
+    records = build_records(branch_ids)
+    pushed = AlgoliaRecord.objects.all()
+    if branch_ids is not None:
+        pushed = pushed.filter(branch_id__in=branch_ids)
+    fingerprints = dict(pushed.values_list("object_id", "fingerprint"))
+    changed, removed = diff_records(records, fingerprints)
 
+    object_ids = list(changed)
+    for start in range(0, len(object_ids), BATCH_SIZE):
+        batch = object_ids[start : start + BATCH_SIZE]
+        index.partial_update_objects(
+            [changed[object_id][0] for object_id in batch],
+            {"createIfNotExists": True},
+        )
+        with transaction.atomic():
+            AlgoliaRecord.objects.filter(object_id__in=batch).delete()
+            AlgoliaRecord.objects.bulk_create(
+                AlgoliaRecord(
+                    object_id=object_id,
+                    branch_id=changed[object_id][0]["branch_id"],
+                    fingerprint=changed[object_id][1],
+                )
+                for object_id in batch
+            )
 
-client = SearchClient.create(settings.ALGOLIA_APPLICATION_ID, settings.ALGOLIA_API_KEY)
-index = client.init_index("menu")
+    for start in range(0, len(removed), BATCH_SIZE):
+        batch = removed[start : start + BATCH_SIZE]
+        index.delete_objects(batch)
+        AlgoliaRecord.objects.filter(object_id__in=batch).delete()
 
-index.set_settings({"attributesForFaceting": ["branch_id"]})
+    return len(changed), len(removed)
 
 
-def index_menu():
+def index_menu(branch_ids=None):
     """
-    Indexes all items in the database
+    Indexes changed items of branch_ids, or of every branch, in the
+    database. Nothing is sent when the menu is searched locally, since the
+    hosted index is not used then.
     """
+    if settings.MENU_SEARCH_BACKEND != "algolia":
+        return
     try:
-        branches = Branch.objects.all().only("id")
-        items = Item.objects.prefetch_related("compositions__ingredient").all()
-        ready_made_product = ReadyMadeProduct.objects.all()
-        items_to_index = []
-        for branch in branches:
-            for item in items:
-                if check_if_items_can_be_made(item.id, branch.id, 1):
-                    item_to_index = {
-                        "objectID": f"{item.id}_{branch.id}",
-                        "id": item.id,
-                        "name": item.name,
-                        "price": float(item.price),
-                        "image": item.image.url if item.image else None,
-                        "category_name": item.category.name,
-                        "description": item.description,
-                        "branch_id": branch.id,
-                        "ingredients": [
-                            {"name": composition.ingredient.name}
-                            for composition in item.compositions.all()
-                        ],
-                        "is_ready_made_product": False,
-                    }
-                    items_to_index.append(item_to_index)
-
-            for product in ready_made_product:
-                if check_if_ready_made_product_can_be_made(product.id, branch.id, 1):
-                    item_to_index = {
-                        "objectID": f"{product.id}_{branch.id}",
-                        "id": product.id,
-                        "name": product.name,
-                        "price": float(product.price),
-                        "image": product.image.url if product.image else None,
-                        "category_name": product.category.name,
-                        "description": product.description,
-                        "branch_id": branch.id,
-                        "ingredients": [],
-                        "is_ready_made_product": True,
-                    }
-                    items_to_index.append(item_to_index)
-
-        index.save_objects(items_to_index)
-
-    except Exception as e:
-        print(e)
+        sync_menu(branch_ids=branch_ids)
+    except Exception:
+        logger.exception("Algolia menu sync failed.")
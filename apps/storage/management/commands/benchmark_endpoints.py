@@ -0,0 +1,91 @@
+"""
+Query count and latency benchmark of the REST endpoints.
+"""
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+
+from utils.endpoint_benchmark import (
+    compare,
+    load_baseline,
+    run_benchmark,
+    save_baseline,
+)
+from utils.load_data import offline_environment, seed_dataset
+
+
+DATASET = {
+    "branches": 3,
+    "categories": 6,
+    "items": 60,
+    "ready_made_products": 15,
+    "ingredients": 40,
+    "customers": 200,
+    "orders": 3000,
+    "days": 90,
+    "seed": 42,
+}
+# The order history ends at a fixed time, so the same orders are open.
+END = datetime(2024, 1, 15, 13, 0, tzinfo=timezone.utc)
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds a test database, requests every endpoint of the apps and "
+        "compares query counts and times with utils/endpoint_baseline.json. "
+        "Fails when a budget is exceeded; --update rewrites the baseline."
+    )
+
+    def add_arguments(self, parser):
+        for name, default in DATASET.items():
+            parser.add_argument(
+                f"--{name.replace('_', '-')}", type=int, default=default
+            )
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument(
+            "--time-tolerance",
+            type=float,
+            default=1.0,
+            help="Allowed relative growth of the SQL and wall times.",
+        )
+        parser.add_argument(
+            "--slack-ms",
+            type=float,
+            default=5.0,
+            help="Allowed absolute growth of the SQL and wall times.",
+        )
+        parser.add_argument("--update", action="store_true")
+
+    def handle(self, *args, **options):
+        dataset = {name: options[name] for name in DATASET}
+        described = {**dataset, "end": END.isoformat()}
+        if not options["update"]:
+            baseline = load_baseline()
+            if baseline["dataset"] != described:
+                raise CommandError(
+                    f"The baseline was measured on {baseline['dataset']}."
+                )
+
+        with offline_environment():
+            samples = seed_dataset(**dataset, end=END)
+            results = run_benchmark(samples, repeat=options["repeat"])
+
+        for key, result in results.items():
+            self.stdout.write(
+                f"{result['status']:3} {result['queries']:4} queries "
+                f"{result['sql_ms']:8.2f} ms SQL {result['wall_ms']:8.2f} ms  {key}"
+            )
+        if options["update"]:
+            save_baseline(results, described)
+            self.stdout.write(f"Baseline of {len(results)} endpoints saved.")
+            return
+
+        regressions = compare(
+            results,
+            baseline["endpoints"],
+            time_tolerance=options["time_tolerance"],
+            slack_ms=options["slack_ms"],
+        )
+        if regressions:
+            raise CommandError("\n".join(regressions))
+        self.stdout.write(f"{len(results)} endpoints within the budget.")
@@ -0,0 +1,76 @@
+"""
+Synthetic dataset for load testing.
+"""
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.branches.models import Branch
+from apps.ordering.models import Order
+from utils.load_data import seed_dataset
+
+
+class Command(BaseCommand):
+    help = (
+        "Fills an empty database with branches, a menu with stock, staff, "
+        "customers and an order history. The same seed and --end give the "
+        "same rows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--branches", type=int, default=10)
+        parser.add_argument("--categories", type=int, default=10)
+        parser.add_argument("--items", type=int, default=200)
+        parser.add_argument("--ready-made-products", type=int, default=50)
+        parser.add_argument("--ingredients", type=int, default=150)
+        parser.add_argument("--customers", type=int, default=100000)
+        parser.add_argument("--orders", type=int, default=1000000)
+        parser.add_argument("--days", type=int, default=365)
+        parser.add_argument(
+            "--end",
+            help="ISO time the history ends at, the current time by default.",
+        )
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if Branch.objects.exists() or Order.objects.exists():
+            raise CommandError("The database already has branches or orders.")
+        end = None
+        if options["end"]:
+            try:
+                end = datetime.fromisoformat(options["end"])
+            except ValueError:
+                raise CommandError(f"Invalid --end: {options['end']}")
+            if timezone.is_naive(end):
+                end = timezone.make_aware(end)
+
+        started = time.perf_counter()
+        step = max(options["orders"] // 20, 1)
+
+        def progress(orders):
+            if orders % step < options["batch_size"] or orders == options["orders"]:
+                self.stdout.write(
+                    f"{orders} of {options['orders']} orders, "
+                    f"{time.perf_counter() - started:.0f} s"
+                )
+
+        seed_dataset(
+            branches=options["branches"],
+            categories=options["categories"],
+            items=options["items"],
+            ready_made_products=options["ready_made_products"],
+            ingredients=options["ingredients"],
+            customers=options["customers"],
+            orders=options["orders"],
+            days=options["days"],
+            end=end,
+            seed=options["seed"],
+            batch_size=options["batch_size"],
+            progress=progress,
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"Seeded in {time.perf_counter() - started:.1f} s.")
+        )
@@ -0,0 +1,26 @@
+"""
+Synchronization of the Algolia menu index.
+"""
+from django.core.management.base import BaseCommand
+
+from apps.storage.algolia_setup import sync_menu
+
+
+class Command(BaseCommand):
+    help = (
+        "Pushes the menu records that changed since the last sync to Algolia "
+        "and deletes the records that are no longer available."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Replace the whole index, removing records the sync does not track.",
+        )
+
+    def handle(self, *args, **options):
+        updated, deleted = sync_menu(full=options["full"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Updated {updated} and deleted {deleted} records.")
+        )
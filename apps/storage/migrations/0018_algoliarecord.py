@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        (
+            "storage",
+            "0017_alter_readymadeproductavailableatthebranch_ready_made_product",
+        ),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AlgoliaRecord",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("object_id", models.CharField(max_length=255, unique=True)),
+                ("fingerprint", models.CharField(max_length=40)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:24
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_stock(apps, schema_editor):
+    """
+    Merges the stock rows of the same product at a branch into the oldest
+    one with the sum of their quantities.
+    """
+    for model_name, field in (
+        ("AvailableAtTheBranch", "ingredient"),
+        ("ReadyMadeProductAvailableAtTheBranch", "ready_made_product"),
+    ):
+        model = apps.get_model("storage", model_name)
+        duplicates = (
+            model.objects.filter(**{f"{field}__isnull": False})
+            .values("branch", field)
+            .annotate(count=Count("id"), first=Min("id"), quantity=Sum("quantity"))
+            .filter(count__gt=1)
+        )
+        for duplicate in duplicates:
+            model.objects.filter(id=duplicate["first"]).update(
+                quantity=duplicate["quantity"]
+            )
+            model.objects.filter(
+                branch=duplicate["branch"], **{field: duplicate[field]}
+            ).exclude(id=duplicate["first"]).delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("storage", "0018_algoliarecord"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_stock, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="availableatthebranch",
+            constraint=models.UniqueConstraint(
+                fields=("branch", "ingredient"), name="available_at_the_branch_key"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="readymadeproductavailableatthebranch",
+            constraint=models.UniqueConstraint(
+                fields=("branch", "ready_made_product"),
+                name="ready_made_product_available_at_the_branch_key",
+            ),
+        ),
+    ]
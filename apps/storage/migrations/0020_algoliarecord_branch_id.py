@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:23
+
+from django.db import migrations, models
+
+
+def fill_branch_ids(apps, schema_editor):
+    """
+    Reads the branch id of every record from the end of its objectID.
+    """
+    AlgoliaRecord = apps.get_model("storage", "AlgoliaRecord")
+    records = list(AlgoliaRecord.objects.all())
+    for record in records:
+        branch_id = record.object_id.rpartition("_")[2]
+        record.branch_id = int(branch_id) if branch_id.isdigit() else None
+    AlgoliaRecord.objects.bulk_update(records, ["branch_id"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("storage", "0019_availableatthebranch_available_at_the_branch_key_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="algoliarecord",
+            name="branch_id",
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(fill_branch_ids, migrations.RunPython.noop),
+    ]
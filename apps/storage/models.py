@@ -119,6 +119,14 @@ class AvailableAtTheBranch(models.Model):
     def __str__(self):
         return f"{self.branch.address} - {self.ingredient.name} {self.ingredient.measurement_unit}"
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["branch", "ingredient"],
+                name="available_at_the_branch_key",
+            ),
+        ]
+
 
 class MinimalLimitReached(models.Model):
     """
@@ -162,3 +170,27 @@ class ReadyMadeProductAvailableAtTheBranch(models.Model):
 
     def __str__(self):
         return f"{self.branch.address} - {self.ready_made_product.name}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["branch", "ready_made_product"],
+                name="ready_made_product_available_at_the_branch_key",
+            ),
+        ]
+
+
+class AlgoliaRecord(models.Model):
+    """
+    AlgoliaRecord model.
+
+    Fingerprint of a menu record as it was last pushed to the Algolia index.
+    """
+
+    object_id = models.CharField(max_length=255, unique=True)
+    branch_id = models.IntegerField(null=True, blank=True, db_index=True)
+    fingerprint = models.CharField(max_length=40)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.object_id
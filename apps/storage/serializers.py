@@ -15,6 +15,8 @@ from apps.storage.models import (
     ReadyMadeProduct,
     ReadyMadeProductAvailableAtTheBranch,
 )
+from utils.low_stock import detect_low_ready_made_products
+from utils.menu_cache import bump_stock_version_on_commit
 
 
 # =====================================================================
@@ -216,6 +218,16 @@ class ScheduleUpdateSerializer(serializers.ModelSerializer):
 # =====================================================================
 # INGREDIENT SERIALIZERS
 # =====================================================================
+def get_total_quantity(instance, stock):
+    """
+    Returns the total_quantity annotation of the instance, or sums its stock
+    if the instance was fetched without it.
+    """
+    if hasattr(instance, "total_quantity"):
+        return instance.total_quantity
+    return stock.aggregate(total_quantity=models.Sum("quantity"))["total_quantity"]
+
+
 class AvailableAtTheBranchSerializer(serializers.ModelSerializer):
     """
     AvailableAtTheBranch serializer.
@@ -286,6 +298,15 @@ class CreateIngredientSerializer(serializers.ModelSerializer):
             "available_at_branches",
         ]
 
+    def validate_available_at_branches(self, value):
+        """
+        Validate that every branch is listed once.
+        """
+        branches = [data["branch"] for data in value if "branch" in data]
+        if len(branches) != len(set(branches)):
+            raise serializers.ValidationError("Every branch can be listed only once.")
+        return value
+
     def create(self, validated_data):
         """
         Create ingredient.
@@ -320,14 +341,16 @@ class AvailableAtTheBranchForIngredientSerializer(serializers.ModelSerializer):
         fields = ["id", "branch", "quantity", "minimal_limit"]
 
     def get_minimal_limit(self, obj):
-        if MinimalLimitReached.objects.filter(
-            branch=obj.branch, ingredient=obj.ingredient
-        ).exists():
-            return MinimalLimitReached.objects.get(
-                branch=obj.branch, ingredient=obj.ingredient
-            ).quantity
-        else:
-            return 0
+        minimal_limit = getattr(obj, "minimal_limit", None)
+        if not hasattr(obj, "minimal_limit"):
+            minimal_limit = (
+                MinimalLimitReached.objects.filter(
+                    branch_id=obj.branch_id, ingredient_id=obj.ingredient_id
+                )
+                .values_list("quantity", flat=True)
+                .first()
+            )
+        return minimal_limit if minimal_limit is not None else 0
 
     def to_representation(self, instance):
         """
@@ -363,7 +386,7 @@ class IngredientSerializer(serializers.ModelSerializer):
 
     def get_available_at_branches(self, obj):
         return AvailableAtTheBranchForIngredientSerializer(
-            AvailableAtTheBranch.objects.filter(ingredient=obj), many=True
+            obj.available_at_the_branch.all(), many=True
         ).data
 
     def to_representation(self, instance):
@@ -371,9 +394,7 @@ class IngredientSerializer(serializers.ModelSerializer):
         Change quantity to kg or l if measurement unit is kg or l.
         """
         representation = super().to_representation(instance)
-        total_quantity = AvailableAtTheBranch.objects.filter(
-            ingredient=instance
-        ).aggregate(total_quantity=models.Sum("quantity"))["total_quantity"]
+        total_quantity = get_total_quantity(instance, instance.available_at_the_branch)
         if total_quantity is not None:
             representation["total_quantity"] = (
                 round(total_quantity / 1000, 2)
@@ -435,7 +456,7 @@ class IngredientDetailSerializer(serializers.ModelSerializer):
 
     def get_available_at_branches(self, obj):
         return AvailableAtTheBranchForIngredientSerializer(
-            AvailableAtTheBranch.objects.filter(ingredient=obj), many=True
+            obj.available_at_the_branch.all(), many=True
         ).data
 
     def to_representation(self, instance):
@@ -443,9 +464,7 @@ class IngredientDetailSerializer(serializers.ModelSerializer):
         Change quantity to kg or l if measurement unit is kg or l.
         """
         representation = super().to_representation(instance)
-        total_quantity = AvailableAtTheBranch.objects.filter(
-            ingredient=instance
-        ).aggregate(total_quantity=models.Sum("quantity"))["total_quantity"]
+        total_quantity = get_total_quantity(instance, instance.available_at_the_branch)
         if total_quantity is not None:
             representation["total_quantity"] = (
                 round(total_quantity / 1000, 2)
@@ -656,6 +675,30 @@ class ReadyMadeProductAvailableAtTheBranchSerializer(serializers.ModelSerializer
         fields = ["id", "branch", "ready_made_product", "quantity", "minimal_limit"]
 
 
+class AvailableAtTheBranchForReadyMadeProductSerializer(
+    ReadyMadeProductAvailableAtTheBranchSerializer
+):
+    """
+    ReadyMadeProductAvailableAtTheBranch serializer for ReadyMadeProductSerializer
+    with minimal limit.
+    """
+
+    minimal_limit = serializers.SerializerMethodField()
+
+    def get_minimal_limit(self, obj):
+        minimal_limit = getattr(obj, "minimal_limit", None)
+        if not hasattr(obj, "minimal_limit"):
+            minimal_limit = (
+                MinimalLimitReached.objects.filter(
+                    branch_id=obj.branch_id,
+                    ready_made_product_id=obj.ready_made_product_id,
+                )
+                .values_list("quantity", flat=True)
+                .first()
+            )
+        return minimal_limit if minimal_limit is not None else 0
+
+
 class CreateReadyMadeProductSerializer(serializers.ModelSerializer):
     """
     CreateReadyMadeProduct serializer.
@@ -677,6 +720,15 @@ class CreateReadyMadeProductSerializer(serializers.ModelSerializer):
             "category",
         ]
 
+    def validate_available_at_branches(self, value):
+        """
+        Validate that every branch is listed once.
+        """
+        branches = [data["branch"] for data in value if "branch" in data]
+        if len(branches) != len(set(branches)):
+            raise serializers.ValidationError("Every branch can be listed only once.")
+        return value
+
     def create(self, validated_data):
         """
         Create ready-made product and available at the branch.
@@ -709,6 +761,11 @@ class CreateReadyMadeProductSerializer(serializers.ModelSerializer):
                 ready_made_product_list
             )
             MinimalLimitReached.objects.bulk_create(minimal_limit_list)
+            bump_stock_version_on_commit()
+            for available in ready_made_product_list:
+                detect_low_ready_made_products(
+                    available.branch_id, {product.id: (None, available.quantity)}
+                )
         return product
 
 
@@ -717,8 +774,8 @@ class ReadyMadeProductSerializer(serializers.ModelSerializer):
     ReadyMadeProduct serializer.
     """
 
-    available_at_branches = ReadyMadeProductAvailableAtTheBranchSerializer(
-        source="minimal_limit_reached", many=True, read_only=True
+    available_at_branches = AvailableAtTheBranchForReadyMadeProductSerializer(
+        source="availables", many=True, read_only=True
     )
 
     class Meta:
@@ -740,10 +797,7 @@ class ReadyMadeProductSerializer(serializers.ModelSerializer):
         """
         representation = super().to_representation(instance)
         representation["total_quantity"] = (
-            ReadyMadeProductAvailableAtTheBranch.objects.filter(
-                ready_made_product=instance
-            ).aggregate(total_quantity=models.Sum("quantity"))["total_quantity"]
-            or 0
+            get_total_quantity(instance, instance.availables) or 0
         )
         representation["date_of_arrival"] = instance.date_of_arrival.strftime(
             "%Y-%m-%d"
@@ -13,6 +13,7 @@ from .models import (
     ReadyMadeProductAvailableAtTheBranch,
 )
 from .serializers import AvailableAtTheBranchSerializer, LowStockIngredientSerializer
+from utils.low_stock import get_limit
 
 
 def get_employees():
@@ -63,6 +64,38 @@ def get_ready_made_products():
     return ready_made_products
 
 
+def get_ingredients_with_stock():
+    """Get all ingredients with their total quantity and their stock at the
+    branches with minimal limits, in a constant number of queries"""
+    ingredients = Ingredient.objects.annotate(
+        total_quantity=models.Sum("available_at_the_branch__quantity")
+    ).prefetch_related(
+        models.Prefetch(
+            "available_at_the_branch",
+            queryset=AvailableAtTheBranch.objects.select_related("branch").annotate(
+                minimal_limit=get_limit("ingredient_id")
+            ),
+        )
+    )
+    return ingredients
+
+
+def get_ready_made_products_with_stock():
+    """Get all ready made products with their total quantity and their stock
+    at the branches with minimal limits, in a constant number of queries"""
+    ready_made_products = ReadyMadeProduct.objects.annotate(
+        total_quantity=models.Sum("availables__quantity")
+    ).prefetch_related(
+        models.Prefetch(
+            "availables",
+            queryset=ReadyMadeProductAvailableAtTheBranch.objects.annotate(
+                minimal_limit=get_limit("ready_made_product_id")
+            ),
+        )
+    )
+    return ready_made_products
+
+
 def delete_employee_schedule_by_employee(employee):
     """Delete employee schedule by employee"""
     title = f"{employee.first_name}'s schedule"
@@ -139,6 +172,7 @@ def get_ingredients_in_stock_more_than_minimal_limit_in_branches():
         .values(
             "branch_id_annotation",
             "name_of_shop",
+            "ingredient_id",
             "ingredient_name",
             "quantity",
             "min_limit",
@@ -168,6 +202,7 @@ def get_ready_made_products_in_stock_more_than_minimal_limit_in_branches():
         .values(
             "branch_id_annotation",
             "name_of_shop",
+            "ready_made_product_id",
             "ready_made_product_name",
             "quantity",
             "min_limit",
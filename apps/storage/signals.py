@@ -1,6 +1,6 @@
 from django.db.models.signals import post_save, post_delete
-from django.dispatch import receiver
 from apps.storage.models import (
+    Category,
     Item,
     Ingredient,
     Composition,
@@ -10,6 +10,10 @@ from apps.storage.models import (
     MinimalLimitReached,
 )
 from apps.storage.tasks import index_menu_task
+from utils.availability import invalidate_reverse_index, update_availability_on_commit
+from utils.dispatch import dispatch_on_commit
+from utils.menu_cache import bump_stock_version_on_commit
+from utils.search.local import record_changes_on_commit
 
 
 models_to_listen = [
@@ -22,21 +26,121 @@ models_to_listen = [
     MinimalLimitReached,
 ]
 
-for model in models_to_listen:
 
-    @receiver(post_save, sender=model)
-    def update_algolia(sender, instance, **kwargs):
-        """
-        Update Algolia index after saving an object.
-        """
-        index_menu_task.delay()
+branch_models = [
+    AvailableAtTheBranch,
+    ReadyMadeProductAvailableAtTheBranch,
+    MinimalLimitReached,
+]
+
+
+def update_algolia(sender, instance, **kwargs):
+    """
+    Request a coalesced Algolia sync after saving or deleting an object.
+    Stock rows only change the menu of their branch.
+    """
+    if sender in branch_models:
+        dispatch_on_commit(index_menu_task, [instance.branch_id])
+    else:
+        dispatch_on_commit(index_menu_task)
 
 
 for model in models_to_listen:
+    post_save.connect(update_algolia, sender=model)
+    post_delete.connect(update_algolia, sender=model)
+
+
+# Menu snapshots
+def invalidate_menu_snapshots(sender, instance, **kwargs):
+    """
+    Invalidate menu snapshots of every branch.
+    """
+    bump_stock_version_on_commit()
+
+
+def invalidate_branch_menu_snapshots(sender, instance, **kwargs):
+    """
+    Invalidate menu snapshots of the branch of the stock row.
+    """
+    bump_stock_version_on_commit(instance.branch_id)
+
+
+for model in [Category, Item, Composition, ReadyMadeProduct]:
+    post_save.connect(invalidate_menu_snapshots, sender=model)
+    post_delete.connect(invalidate_menu_snapshots, sender=model)
+
+for model in [AvailableAtTheBranch, ReadyMadeProductAvailableAtTheBranch]:
+    post_save.connect(invalidate_branch_menu_snapshots, sender=model)
+    post_delete.connect(invalidate_branch_menu_snapshots, sender=model)
+
+
+# Incremental availability
+def update_availability_of_stock(sender, instance, **kwargs):
+    """
+    Re-evaluate the items that use the ingredient of the stock row.
+    """
+    update_availability_on_commit(
+        [instance.branch_id], ingredient_ids=[instance.ingredient_id]
+    )
+
+
+def update_availability_of_composition(sender, instance, **kwargs):
+    """
+    Rebuild the reverse index and re-evaluate the item of the composition.
+    """
+    invalidate_reverse_index()
+    if instance.item_id is not None:
+        update_availability_on_commit(item_ids=[instance.item_id])
+
+
+def update_availability_of_item(sender, instance, **kwargs):
+    """
+    Re-evaluate the saved or deleted item.
+    """
+    update_availability_on_commit(item_ids=[instance.id])
+
+
+post_save.connect(update_availability_of_stock, sender=AvailableAtTheBranch)
+post_delete.connect(update_availability_of_stock, sender=AvailableAtTheBranch)
+post_save.connect(update_availability_of_composition, sender=Composition)
+post_delete.connect(update_availability_of_composition, sender=Composition)
+post_save.connect(update_availability_of_item, sender=Item)
+post_delete.connect(update_availability_of_item, sender=Item)
+
+
+# Local search index
+def update_search_documents(sender, instance, **kwargs):
+    """
+    Record the changed search documents of the menu object.
+    """
+    if sender is Item:
+        keys = [(instance.id, False)]
+    elif sender is ReadyMadeProduct:
+        keys = [(instance.id, True)]
+    elif sender is Composition:
+        keys = [(instance.item_id, False)] if instance.item_id else []
+    elif sender is Ingredient:
+        keys = [
+            (item_id, False)
+            for item_id in Composition.objects.filter(
+                ingredient_id=instance.id, item__isnull=False
+            ).values_list("item_id", flat=True)
+        ]
+    else:
+        keys = [
+            (item_id, False)
+            for item_id in Item.objects.filter(category_id=instance.id).values_list(
+                "id", flat=True
+            )
+        ] + [
+            (product_id, True)
+            for product_id in ReadyMadeProduct.objects.filter(
+                category_id=instance.id
+            ).values_list("id", flat=True)
+        ]
+    record_changes_on_commit(keys)
+
 
-    @receiver(post_delete, sender=model)
-    def update_algolia(sender, instance, **kwargs):
-        """
-        Update Algolia index after deleting an object.
-        """
-        index_menu_task.delay()
+for model in [Item, ReadyMadeProduct, Composition, Ingredient, Category]:
+    post_save.connect(update_search_documents, sender=model)
+    post_delete.connect(update_search_documents, sender=model)
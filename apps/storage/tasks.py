@@ -3,9 +3,9 @@ from .algolia_setup import index_menu
 
 
 @shared_task
-def index_menu_task():
+def index_menu_task(branch_ids=None):
     """
-    Task to index items.
+    Task to index items of branch_ids or of every branch.
     """
-    index_menu()
+    index_menu(branch_ids)
     return "Items indexed successfully."
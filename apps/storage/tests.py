@@ -1,21 +1,55 @@
 import json
-
-from django.test import TestCase
+import re
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.test import TestCase, override_settings
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from asgiref.testing import ApplicationCommunicator
+from channels.routing import URLRouter
+
 from apps.accounts.models import CustomUser as User
 from apps.accounts.models import EmployeeSchedule, EmployeeWorkdays
 from apps.branches.models import Branch, Schedule, Workdays
+from apps.ordering.models import Order
+from apps.storage.algolia_setup import sync_menu
+from apps.storage.tasks import index_menu_task
+from apps.web.routing import websocket_urlpatterns
 from apps.storage.models import (
+    AlgoliaRecord,
     AvailableAtTheBranch,
     Category,
+    Composition,
     Ingredient,
     Item,
     MinimalLimitReached,
     ReadyMadeProduct,
     ReadyMadeProductAvailableAtTheBranch,
 )
+from utils.dispatch import (
+    CLAIM_KEY,
+    claim_requests,
+    dispatch,
+    get_dispatch_stats,
+    reset_dispatch_stats,
+    run_coalesced_task,
+)
+from utils.endpoint_benchmark import SKIPPED, compare, get_routes, run_benchmark
+from utils.load_data import OPEN_WINDOW, muted_signals, seed_dataset
+from utils.profiling import (
+    Profile,
+    add_profile,
+    get_profiling_stats,
+    profiling,
+    reset_profiling_stats,
+)
+from utils.stock import decrement_ingredients
 
 
 # ==================== Category Tests ==================== #
@@ -737,6 +771,26 @@ class IngredientViewTest(TestCase):
         )
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_create_ingredient_with_repeated_branch(self):
+        """Test creating ingredient with a branch listed twice"""
+        token = self.get_token("+996700000001")
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer " + token)
+        data = {
+            "name": "New Ingredient",
+            "measurement_unit": "g",
+            "available_at_branches": [
+                {"branch": self.branch.id, "quantity": 100, "minimal_limit": 10},
+                {"branch": self.branch.id, "quantity": 500, "minimal_limit": 10},
+            ],
+        }
+        response = self.client.post(
+            path="/admin-panel/ingredients/create/",
+            data=json.dumps(data),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Ingredient.objects.filter(name="New Ingredient").exists())
+
     def test_update_ingredient_by_user(self):
         """Test updating ingredient by usual user"""
         token = self.get_token("+996700000000")
@@ -1233,3 +1287,563 @@ class ReadyMadeProductViewTest(TestCase):
             ).count(),
             1,
         )
+
+
+# ==================== Algolia Sync Tests ==================== #
+class StubIndex:
+    """Records the calls that would be sent to Algolia"""
+
+    def __init__(self):
+        self.updated = []
+        self.deleted = []
+        self.replaced = None
+
+    def partial_update_objects(self, objects, request_options=None):
+        self.updated.extend(obj["objectID"] for obj in objects)
+
+    def delete_objects(self, object_ids, request_options=None):
+        self.deleted.extend(object_ids)
+
+    def replace_all_objects(self, objects, request_options=None):
+        self.replaced = [obj["objectID"] for obj in objects]
+
+
+class AlgoliaSyncTest(TestCase):
+    """Test incremental Algolia sync"""
+
+    @classmethod
+    def setUpTestData(cls):
+        schedule = Schedule.objects.create(title="Test schedule")
+        cls.branch1 = Branch.objects.create(
+            schedule=schedule,
+            name_of_shop="Branch 1",
+            address="Test address 1",
+            phone_number="+996700000001",
+            link_to_map="https://2gis.kg",
+        )
+        cls.branch2 = Branch.objects.create(
+            schedule=schedule,
+            name_of_shop="Branch 2",
+            address="Test address 2",
+            phone_number="+996700000002",
+            link_to_map="https://2gis.kg",
+        )
+        category = Category.objects.create(name="Кофе")
+        cls.milk = Ingredient.objects.create(name="Молоко", measurement_unit="ml")
+        cls.item = Item.objects.create(
+            name="Латте", description="Test", category=category, price=100
+        )
+        Composition.objects.create(item=cls.item, ingredient=cls.milk, quantity=200)
+        cls.stock = AvailableAtTheBranch.objects.create(
+            branch=cls.branch1, ingredient=cls.milk, quantity=1000
+        )
+        cls.product = ReadyMadeProduct.objects.create(
+            name="Круассан", description="Test", category=category, price=40
+        )
+        ReadyMadeProductAvailableAtTheBranch.objects.create(
+            branch=cls.branch2, ready_made_product=cls.product, quantity=5
+        )
+
+    def setUp(self):
+        AlgoliaRecord.objects.all().delete()
+
+    def sync(self, **kwargs):
+        index = StubIndex()
+        sync_menu(index, **kwargs)
+        return index
+
+    def test_first_sync_pushes_available_records(self):
+        index = self.sync()
+        self.assertCountEqual(
+            index.updated,
+            [
+                f"{self.item.id}_{self.branch1.id}",
+                f"p{self.product.id}_{self.branch2.id}",
+            ],
+        )
+        self.assertEqual(index.deleted, [])
+        self.assertEqual(AlgoliaRecord.objects.count(), 2)
+
+    def test_unchanged_menu_sends_nothing(self):
+        self.sync()
+        index = self.sync()
+        self.assertEqual(index.updated, [])
+        self.assertEqual(index.deleted, [])
+
+    def test_only_edited_records_are_sent(self):
+        self.sync()
+        Item.objects.filter(id=self.item.id).update(price=120)
+        index = self.sync()
+        self.assertEqual(index.updated, [f"{self.item.id}_{self.branch1.id}"])
+        self.assertEqual(index.deleted, [])
+
+    def test_availability_flips(self):
+        self.sync()
+        AvailableAtTheBranch.objects.filter(id=self.stock.id).update(quantity=100)
+        AvailableAtTheBranch.objects.create(
+            branch=self.branch2, ingredient=self.milk, quantity=500
+        )
+        index = self.sync()
+        self.assertEqual(index.updated, [f"{self.item.id}_{self.branch2.id}"])
+        self.assertEqual(index.deleted, [f"{self.item.id}_{self.branch1.id}"])
+        self.assertFalse(
+            AlgoliaRecord.objects.filter(
+                object_id=f"{self.item.id}_{self.branch1.id}"
+            ).exists()
+        )
+
+    def test_deleted_objects_are_removed(self):
+        self.sync()
+        ReadyMadeProduct.objects.filter(id=self.product.id).delete()
+        index = self.sync()
+        self.assertEqual(index.updated, [])
+        self.assertEqual(index.deleted, [f"p{self.product.id}_{self.branch2.id}"])
+
+    def test_full_sync_replaces_the_index(self):
+        self.sync()
+        AlgoliaRecord.objects.create(object_id="stale", fingerprint="")
+        index = StubIndex()
+        self.assertEqual(sync_menu(index, full=True), (2, 1))
+        self.assertCountEqual(
+            index.replaced,
+            [
+                f"{self.item.id}_{self.branch1.id}",
+                f"p{self.product.id}_{self.branch2.id}",
+            ],
+        )
+        self.assertEqual(index.updated, [])
+        self.assertEqual(index.deleted, [])
+        self.assertFalse(AlgoliaRecord.objects.filter(object_id="stale").exists())
+        self.assertEqual(self.sync().updated, [])
+
+    def test_keyed_sync_touches_only_its_branches(self):
+        self.sync()
+        Item.objects.filter(id=self.item.id).update(price=120)
+        ReadyMadeProduct.objects.filter(id=self.product.id).update(price=50)
+        index = self.sync(branch_ids=[self.branch2.id])
+        self.assertEqual(index.updated, [f"p{self.product.id}_{self.branch2.id}"])
+        self.assertEqual(index.deleted, [])
+        index = self.sync(branch_ids=[self.branch1.id])
+        self.assertEqual(index.updated, [f"{self.item.id}_{self.branch1.id}"])
+        self.assertEqual(index.deleted, [])
+
+
+# ==================== Stock Listing Tests ==================== #
+class StockListingQueryTest(TestCase):
+    """Test that stock listings run a constant number of queries"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin_user = User.objects.create(
+            first_name="test",
+            last_name="admin",
+            phone_number="+996700000001",
+            username="testadmin",
+            is_active=True,
+            is_staff=True,
+            is_superuser=True,
+        )
+        schedule = Schedule.objects.create(title="Test Schedule")
+        cls.branches = [
+            Branch.objects.create(
+                schedule=schedule,
+                name_of_shop=f"Branch {i}",
+                address="Test Address",
+                phone_number=f"+99670000001{i}",
+                link_to_map="https://test.link",
+            )
+            for i in range(3)
+        ]
+        for i in range(10):
+            ingredient = Ingredient.objects.create(
+                name=f"Ingredient {i}", measurement_unit="kg"
+            )
+            product = ReadyMadeProduct.objects.create(name=f"Product {i}")
+            for branch in cls.branches:
+                AvailableAtTheBranch.objects.create(
+                    branch=branch, ingredient=ingredient, quantity=2000
+                )
+                MinimalLimitReached.objects.create(
+                    branch=branch, ingredient=ingredient, quantity=500
+                )
+                ReadyMadeProductAvailableAtTheBranch.objects.create(
+                    branch=branch, ready_made_product=product, quantity=5
+                )
+                MinimalLimitReached.objects.create(
+                    branch=branch, ready_made_product=product, quantity=2
+                )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin_user)
+
+    def test_ingredient_list(self):
+        with self.assertNumQueries(2):
+            response = self.client.get("/admin-panel/ingredients/")
+        self.assertEqual(len(response.data), 10)
+        ingredient = response.data[0]
+        self.assertEqual(ingredient["total_quantity"], 6)
+        self.assertEqual(len(ingredient["available_at_branches"]), 3)
+        self.assertEqual(ingredient["available_at_branches"][0]["quantity"], 2)
+        self.assertEqual(ingredient["available_at_branches"][0]["minimal_limit"], 500)
+
+    def test_ingredient_detail(self):
+        ingredient = Ingredient.objects.first()
+        with self.assertNumQueries(2):
+            response = self.client.get(f"/admin-panel/ingredients/{ingredient.id}/")
+        self.assertEqual(response.data["total_quantity"], 6)
+        self.assertEqual(len(response.data["available_at_branches"]), 3)
+
+    def test_ready_made_product_list(self):
+        with self.assertNumQueries(2):
+            response = self.client.get("/admin-panel/ready-made-products/")
+        self.assertEqual(len(response.data), 10)
+        product = response.data[0]
+        self.assertEqual(product["total_quantity"], 15)
+        self.assertEqual(len(product["available_at_branches"]), 3)
+        self.assertEqual(product["available_at_branches"][0]["minimal_limit"], 2)
+
+
+# ==================== Task Dispatch Tests ==================== #
+class TaskDispatchTest(TestCase):
+    """Test coalescing of background task requests"""
+
+    @classmethod
+    def setUpTestData(cls):
+        schedule = Schedule.objects.create(title="Test schedule")
+        cls.branch = Branch.objects.create(
+            schedule=schedule,
+            name_of_shop="Branch",
+            address="Test address",
+            phone_number="+996700000001",
+            link_to_map="https://2gis.kg",
+        )
+        cls.ingredients = [
+            Ingredient.objects.create(name=f"Ingredient {i}", measurement_unit="g")
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        reset_dispatch_stats(index_menu_task)
+        patcher = mock.patch.object(run_coalesced_task, "apply_async")
+        self.apply_async = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(index_menu_task, "run")
+        self.run = patcher.start()
+        self.addCleanup(patcher.stop)
+        # The first run after the sequence is created processes everything.
+        dispatch(index_menu_task)
+        self.run_scheduled()
+        reset_dispatch_stats(index_menu_task)
+        self.apply_async.reset_mock()
+        self.run.reset_mock()
+
+    def run_scheduled(self):
+        run_coalesced_task(index_menu_task.name)
+
+    def scheduled_runs(self):
+        return [
+            call
+            for call in self.apply_async.call_args_list
+            if call.kwargs["args"] == [index_menu_task.name]
+        ]
+
+    def test_first_run_processes_everything(self):
+        cache.clear()
+        dispatch(index_menu_task, [1])
+        self.run_scheduled()
+        self.run.assert_called_once_with()
+
+    def test_requests_are_coalesced_into_one_run(self):
+        for _ in range(3):
+            dispatch(index_menu_task, window=5)
+        self.apply_async.assert_called_once_with(
+            args=[index_menu_task.name], countdown=5
+        )
+        self.run_scheduled()
+        self.run.assert_called_once_with()
+        self.assertEqual(
+            get_dispatch_stats(index_menu_task),
+            {"triggers": 3, "runs": 1, "coalesced": 2, "coalesce_rate": 0.6667},
+        )
+
+    def test_run_receives_the_union_of_the_keys(self):
+        dispatch(index_menu_task, [3, 1])
+        dispatch(index_menu_task, [2, 1])
+        self.run_scheduled()
+        self.run.assert_called_once_with([1, 2, 3])
+
+    def test_request_without_keys_processes_everything(self):
+        dispatch(index_menu_task, [1])
+        dispatch(index_menu_task)
+        self.run_scheduled()
+        self.run.assert_called_once_with()
+
+    def test_claimed_requests_are_not_run_again(self):
+        dispatch(index_menu_task, [1])
+        self.run_scheduled()
+        self.run_scheduled()
+        self.run.assert_called_once_with([1])
+        dispatch(index_menu_task, [2])
+        self.run_scheduled()
+        self.run.assert_called_with([2])
+
+    def test_claim_without_the_lock_processes_everything(self):
+        dispatch(index_menu_task, [1])
+        cache.add(CLAIM_KEY.format(name=index_menu_task.name), "other")
+        with mock.patch("utils.locks.time.monotonic", side_effect=[0, 10]):
+            self.assertEqual(claim_requests(index_menu_task.name), (True, None))
+        cache.delete(CLAIM_KEY.format(name=index_menu_task.name))
+        self.assertEqual(claim_requests(index_menu_task.name), (True, [1]))
+
+    def test_request_after_run_schedules_again(self):
+        dispatch(index_menu_task, [1])
+        self.run_scheduled()
+        dispatch(index_menu_task, [1])
+        self.assertEqual(len(self.scheduled_runs()), 2)
+        self.run_scheduled()
+        self.assertEqual(self.run.call_count, 2)
+
+    def test_stock_import_schedules_one_run(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for ingredient in self.ingredients:
+                AvailableAtTheBranch.objects.create(
+                    branch=self.branch, ingredient=ingredient, quantity=10
+                )
+        self.assertEqual(len(self.scheduled_runs()), 1)
+        self.run_scheduled()
+        self.run.assert_called_once_with([self.branch.id])
+
+    def test_stock_write_off_schedules_a_sync(self):
+        AvailableAtTheBranch.objects.create(
+            branch=self.branch, ingredient=self.ingredients[0], quantity=10
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            decrement_ingredients(self.branch.id, {self.ingredients[0].id: 4})
+        self.apply_async.assert_called_once_with(
+            args=[index_menu_task.name], countdown=settings.TASK_COALESCE_WINDOW
+        )
+        self.run_scheduled()
+        self.run.assert_called_once_with([self.branch.id])
+
+
+# ==================== Endpoint Benchmark Tests ==================== #
+@override_settings(MENU_SEARCH_BACKEND="local")
+class EndpointBenchmarkTest(TestCase):
+    """Test the endpoint benchmark on a small dataset"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.samples = seed_dataset(
+            branches=2,
+            categories=2,
+            items=5,
+            ready_made_products=3,
+            ingredients=6,
+            customers=5,
+            orders=30,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_every_endpoint_is_measured(self):
+        results = run_benchmark(self.samples, repeat=1)
+        routes = {key.split(" ", 1)[1] for key in results}
+        self.assertEqual(routes | SKIPPED, set(get_routes()))
+        self.assertFalse(routes & SKIPPED)
+        self.assertEqual(results["GET branches/"]["status"], 200)
+        self.assertGreater(results["GET branches/"]["queries"], 0)
+
+    def test_requests_are_rolled_back(self):
+        run_benchmark(self.samples, repeat=1)
+        self.assertTrue(Branch.objects.filter(id=self.samples["branch"].id).exists())
+        self.assertFalse(Category.objects.filter(name="Benchmark").exists())
+
+    def test_compare_flags_regressions(self):
+        baseline = {
+            "GET branches/": {"status": 200, "queries": 3, "sql_ms": 1, "wall_ms": 10}
+        }
+        within = {
+            "GET branches/": {"status": 200, "queries": 3, "sql_ms": 2, "wall_ms": 24}
+        }
+        self.assertEqual(compare(within, baseline), [])
+        regressed = {
+            "GET branches/": {"status": 500, "queries": 4, "sql_ms": 8, "wall_ms": 26},
+            "GET branches/<int:id>/": within["GET branches/"],
+        }
+        self.assertEqual(len(compare(regressed, baseline)), 5)
+
+
+# ==================== Load Data Tests ==================== #
+class LoadDataTest(TestCase):
+    """Test the synthetic dataset"""
+
+    end = datetime(2024, 1, 15, 13, 0, tzinfo=timezone.utc)
+
+    def seed(self):
+        seed_dataset(
+            branches=2,
+            categories=2,
+            items=5,
+            ready_made_products=3,
+            ingredients=6,
+            customers=10,
+            orders=300,
+            days=7,
+            end=self.end,
+            batch_size=50,
+        )
+        return list(
+            Order.objects.order_by("created_at", "total_price").values_list(
+                "status", "table", "total_price", "created_at", "completed_at"
+            )
+        )
+
+    def test_same_seed_gives_same_rows(self):
+        with transaction.atomic():
+            first = self.seed()
+            transaction.set_rollback(True)
+        self.assertEqual(self.seed(), first)
+
+    def test_history_timestamps(self):
+        self.seed()
+        orders = Order.objects.exclude(created_at=self.end)
+        self.assertEqual(orders.count(), 300)
+        self.assertFalse(orders.filter(created_at__gt=self.end).exists())
+        self.assertFalse(
+            orders.filter(created_at__lt=self.end - timedelta(days=8)).exists()
+        )
+        self.assertFalse(
+            orders.filter(created_at__lt=self.end - OPEN_WINDOW)
+            .exclude(status__in=["completed", "canceled"])
+            .exists()
+        )
+        self.assertFalse(
+            orders.filter(status="completed", completed_at__isnull=True).exists()
+        )
+
+    def test_muted_signals(self):
+        receiver = mock.Mock()
+        post_save.connect(receiver, sender=Category, weak=False)
+        self.addCleanup(post_save.disconnect, receiver, sender=Category)
+        with muted_signals():
+            Category.objects.create(name="Muted")
+        receiver.assert_not_called()
+        Category.objects.create(name="Sent")
+        receiver.assert_called_once()
+
+
+# ==================== Profiling Tests ==================== #
+@override_settings(PROFILING_SAMPLE_RATE=1, PROFILING_WINDOW=600, PROFILING_SLOT=60)
+class ProfilingTest(TestCase):
+    """Test the profiling middleware, consumers and stats"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.samples = seed_dataset(
+            branches=1,
+            categories=2,
+            items=5,
+            ready_made_products=2,
+            ingredients=6,
+            customers=3,
+            orders=20,
+        )
+        cls.admin = cls.samples["admin"]
+
+    def setUp(self):
+        cache.clear()
+        reset_profiling_stats()
+        self.client = APIClient()
+
+    def test_server_timing_header(self):
+        self.client.force_authenticate(self.samples["client"])
+        response = self.client.get(
+            "/customers/menu", {"category_id": self.samples["category"].id}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(
+            response["Server-Timing"],
+            r'^sql;dur=[\d.]+;desc="[1-9]\d* queries", view;dur=[\d.]+$',
+        )
+
+    def test_nested_profile_counts_into_the_outer_one(self):
+        self.client.force_authenticate(self.samples["client"])
+        with profiling() as profile:
+            response = self.client.get(
+                "/customers/menu", {"category_id": self.samples["category"].id}
+            )
+        queries = re.search(r'"(\d+) queries"', response["Server-Timing"]).group(1)
+        self.assertEqual(profile.queries, int(queries))
+
+    def test_stats_endpoint(self):
+        self.client.force_authenticate(self.samples["client"])
+        for _ in range(3):
+            self.client.get(
+                "/customers/menu", {"category_id": self.samples["category"].id}
+            )
+        self.assertEqual(self.client.get("/admin-panel/profiling/").status_code, 403)
+
+        self.client.force_authenticate(self.admin)
+        response = self.client.get("/admin-panel/profiling/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["sample_rate"], 1)
+        stats = response.data["endpoints"]["GET customers/menu"]
+        self.assertEqual(stats["count"], 3)
+        self.assertGreater(stats["avg_queries"], 0)
+        self.assertEqual(sum(stats["histogram"].values()), 3)
+
+        self.assertEqual(self.client.delete("/admin-panel/profiling/").status_code, 204)
+        self.assertNotIn("GET customers/menu", get_profiling_stats())
+
+    @override_settings(PROFILING_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_not_profiled(self):
+        self.client.force_authenticate(self.samples["client"])
+        response = self.client.get(
+            "/customers/menu", {"category_id": self.samples["category"].id}
+        )
+        self.assertFalse(response.has_header("Server-Timing"))
+        self.assertEqual(get_profiling_stats(), {})
+
+    async def test_consumer_messages_are_profiled(self):
+        communicator = ApplicationCommunicator(
+            URLRouter(websocket_urlpatterns),
+            {
+                "type": "websocket",
+                "path": f"/ws/new-orders-takeaway/{self.samples['branch'].id}/",
+                "headers": [],
+                "subprotocols": [],
+            },
+        )
+        await communicator.send_input({"type": "websocket.connect"})
+        self.assertEqual(
+            (await communicator.receive_output())["type"], "websocket.accept"
+        )
+        await communicator.receive_output()
+        await communicator.send_input({"type": "websocket.disconnect", "code": 1000})
+        await communicator.wait()
+        stats = get_profiling_stats()["WS NewOrdersTakeawayConsumer websocket.connect"]
+        self.assertEqual(stats["count"], 1)
+        self.assertGreater(stats["avg_queries"], 0)
+
+    def test_histograms_roll_over(self):
+        fast, slow = Profile(), Profile()
+        fast.seconds, slow.seconds = 0.004, 0.3
+        slow.queries = 4
+        with mock.patch("utils.profiling.time.time", return_value=0):
+            add_profile("GET branches/", slow)
+        with mock.patch("utils.profiling.time.time", return_value=300):
+            for _ in range(9):
+                add_profile("GET branches/", fast)
+            stats = get_profiling_stats()["GET branches/"]
+        self.assertEqual(stats["count"], 10)
+        self.assertEqual(stats["max_queries"], 4)
+        self.assertEqual(stats["p50_view_ms"], 5)
+        self.assertEqual(stats["p99_view_ms"], 300)
+        self.assertEqual(stats["histogram"]["<=5"], 9)
+        self.assertEqual(stats["histogram"]["<=500"], 1)
+        with mock.patch("utils.profiling.time.time", return_value=600):
+            stats = get_profiling_stats()["GET branches/"]
+        self.assertEqual(stats["count"], 9)
@@ -33,6 +33,7 @@ from apps.storage.views import (
     UpdateCategoryView,
     UpdateIngredientView,
     PutImageToReadyMadeProductView,
+    ProfilingStatsView,
 )
 
 # Category URLs
@@ -106,3 +107,8 @@ urlpatterns += [
         PutImageToReadyMadeProductView.as_view(),
     ),
 ]
+
+# Profiling URLs
+urlpatterns += [
+    path("profiling/", ProfilingStatsView.as_view()),
+]
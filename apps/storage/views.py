@@ -1,6 +1,7 @@
 """
 Views for storage app
 """
+from django.conf import settings
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import generics, permissions
@@ -45,12 +46,15 @@ from apps.storage.services import (
     get_categories,
     get_employees,
     get_ingrediants,
+    get_ingredients_with_stock,
     get_items,
     get_low_stock_ingredients_in_branch,
     get_ready_made_products,
+    get_ready_made_products_with_stock,
     get_specific_category,
     get_specific_employee,
 )
+from utils.profiling import get_profiling_stats, reset_profiling_stats
 
 
 # =====================================================================
@@ -593,7 +597,7 @@ class IngredientListView(APIView):
         """
         Get ingredients method.
         """
-        ingredients = get_ingrediants()
+        ingredients = get_ingredients_with_stock()
         filtered_ingredients = self.filterset_class(request.GET, queryset=ingredients)
         serializer = IngredientSerializer(filtered_ingredients.qs, many=True)
         return Response(serializer.data)
@@ -639,7 +643,7 @@ class IngredientDetailView(generics.RetrieveAPIView):
     Ingredient detail view.
     """
 
-    queryset = get_ingrediants()
+    queryset = get_ingredients_with_stock()
     serializer_class = IngredientDetailSerializer
     lookup_field = "pk"
     permission_classes = [permissions.IsAdminUser]
@@ -1203,7 +1207,7 @@ class ReadyMadeProductListView(generics.ListAPIView):
     List ready made product view. You can filter ready made products by name. Example: /storage/ready-made-products/?name=Круассан
     """
 
-    queryset = get_ready_made_products()
+    queryset = get_ready_made_products_with_stock()
     serializer_class = ReadyMadeProductSerializer
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     filterset_class = ReadyMadeProductFilter
@@ -1234,7 +1238,7 @@ class ReadyMadeProductDetailView(generics.RetrieveAPIView):
     Ready made product detail view.
     """
 
-    queryset = get_ready_made_products()
+    queryset = get_ready_made_products_with_stock()
     serializer_class = ReadyMadeProductSerializer
     lookup_field = "pk"
 
@@ -1278,3 +1282,48 @@ class PutImageToReadyMadeProductView(generics.UpdateAPIView):
     )
     def put(self, request, *args, **kwargs):
         return super().put(request, *args, **kwargs)
+
+
+# =====================================================================
+# PROFILING VIEWS
+# =====================================================================
+class ProfilingStatsView(APIView):
+    """
+    Per-endpoint query and time histograms of the sampled requests and
+    websocket messages of this process.
+    """
+
+    permission_classes = [permissions.IsAdminUser]
+
+    @swagger_auto_schema(
+        operation_summary="Get profiling stats",
+        operation_description=(
+            "Use this method to get the query counts, SQL and view times and "
+            "view time histograms (ms) of every endpoint over the last "
+            "PROFILING_WINDOW seconds"
+        ),
+        responses={200: "Profiling stats"},
+    )
+    def get(self, request):
+        """
+        Get profiling stats method.
+        """
+        return Response(
+            {
+                "sample_rate": settings.PROFILING_SAMPLE_RATE,
+                "window": settings.PROFILING_WINDOW,
+                "endpoints": get_profiling_stats(),
+            }
+        )
+
+    @swagger_auto_schema(
+        operation_summary="Reset profiling stats",
+        operation_description="Use this method to clear the histograms",
+        responses={204: "Profiling stats reset"},
+    )
+    def delete(self, request):
+        """
+        Reset profiling stats method.
+        """
+        reset_profiling_stats()
+        return Response(status=204)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class WaiterConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.waiter"
+
+    def ready(self):
+        import apps.waiter.signals
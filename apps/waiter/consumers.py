@@ -0,0 +1,34 @@
+from channels.generic.websocket import AsyncWebsocketConsumer
+from asgiref.sync import sync_to_async
+import json
+from apps.branches.models import Branch
+from utils.profiling import ProfiledConsumerMixin
+from .services import get_tables_availability
+
+
+class TablesConsumer(ProfiledConsumerMixin, AsyncWebsocketConsumer):
+    """
+    Consumer for pushing the table states of the branch to waiters.
+    """
+
+    async def connect(self):
+        self.branch_id = self.scope["url_route"]["kwargs"]["branch_id"]
+        self.group_name = f"tables_{self.branch_id}"
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+
+        await self.accept()
+        await self.get_tables()
+
+    async def disconnect(self, close_code):
+        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def get_tables(self, event=None):
+        try:
+            tables = await sync_to_async(get_tables_availability)(self.branch_id)
+        except Branch.DoesNotExist:
+            await self.close()
+            return
+        await self.send(text_data=json.dumps({"tables": tables}))
+
+    async def receive(self, text_data):
+        await self.get_tables()
@@ -0,0 +1,6 @@
+from django.urls import re_path
+from .consumers import TablesConsumer
+
+websocket_urlpatterns = [
+    re_path(r"ws/tables/(?P<branch_id>\w+)/$", TablesConsumer.as_asgi()),
+]
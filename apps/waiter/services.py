@@ -1,31 +1,26 @@
 from apps.ordering.models import Order, OrderItem
 from apps.branches.models import Branch
 from apps.accounts.models import CustomUser
+from utils.pagination import PAGE_SIZE, paginate
+from utils.table_map import get_table_map
 
 
 def get_occupied_tables(branch_id):
     """
     Get occupied tables for branch.
     """
-    branch = Branch.objects.get(id=branch_id)
-    orders = Order.objects.filter(
-        branch=branch,
-        status__in=["new", "in_progress", "ready"],
-        table__gt=0,
-    )
-    return [order.table for order in orders]
+    return sorted(get_table_map(branch_id)["orders"])
 
 
 def get_free_tables(branch_id):
     """
     Get free tables for branch.
     """
-    branch = Branch.objects.get(id=branch_id)
-    occupied_tables = get_occupied_tables(branch_id)
+    table_map = get_table_map(branch_id)
     return [
         table
-        for table in range(1, branch.counts_of_tables + 1)
-        if table not in occupied_tables
+        for table in range(1, table_map["tables"] + 1)
+        if table not in table_map["orders"]
     ]
 
 
@@ -33,16 +28,12 @@ def get_tables_availability(branch_id):
     """
     Get structuctured tables availability.
     """
-    tables = {}
-    free_tables = get_free_tables(branch_id)
-    occupied_tables = get_occupied_tables(branch_id)
-    for table in free_tables:
-        tables[table] = "free"
-    for table in occupied_tables:
-        tables[table] = "occupied"
-    sorted_tables = sorted(tables.items(), key=lambda x: x[0])
-    sorted_tables = {x[0]: x[1] for x in sorted_tables}
-    return sorted_tables
+    table_map = get_table_map(branch_id)
+    tables = set(range(1, table_map["tables"] + 1)) | set(table_map["orders"])
+    return {
+        table: "occupied" if table in table_map["orders"] else "free"
+        for table in sorted(tables)
+    }
 
 
 def is_table_free(branch_id, table_number):
@@ -50,24 +41,27 @@ def is_table_free(branch_id, table_number):
     Check if table is free.
     """
     try:
-        if Branch.objects.get(id=branch_id).counts_of_tables > table_number > 0:
-            return table_number in get_free_tables(branch_id)
-        else:
-            return False
+        table_map = get_table_map(branch_id)
     except Branch.DoesNotExist:
         return False
+    return (
+        0 < table_number <= table_map["tables"]
+        and table_number not in table_map["orders"]
+    )
 
 
-def get_orders_in_institution(branch_id):
+def get_orders_in_institution(branch_id, position=None, limit=PAGE_SIZE):
     """
-    Get orders in institution.
+    Get the page of orders in institution after the position and the
+    cursor of the next page.
     """
     orders = Order.objects.filter(
         branch_id=branch_id,
         in_an_institution=True,
         status__in=["new", "in_progress", "ready", "canceled", "completed"],
         table__gt=0,
-    ).order_by("-created_at")
+    ).only("id", "table", "status", "created_at")
+    orders, next_cursor = paginate(orders, position, limit)
 
     orders_list = []
     for order in orders:
@@ -80,7 +74,7 @@ def get_orders_in_institution(branch_id):
             }
         )
 
-    return orders_list
+    return orders_list, next_cursor
 
 
 def get_table_order_details(branch_id, table_number):
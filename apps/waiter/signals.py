@@ -0,0 +1,50 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from apps.branches.models import Branch
+from apps.notices.outbox import publish_event
+from apps.ordering.models import Order
+from utils.table_map import update_table_count, update_table_map
+
+
+def publish_tables(branch_id):
+    """
+    Push the table states of the branch to waiters.
+    """
+    publish_event(f"tables_{branch_id}", "get_tables")
+
+
+def update_order_table(sender, instance, **kwargs):
+    """
+    Applies the order to the table map of its branch after the transaction
+    commits and pushes the map to waiters.
+    """
+    if not instance.table or instance.table < 0:
+        return
+    branch_id, order_id, table = instance.branch_id, instance.id, instance.table
+    status = instance.status if "created" in kwargs else None
+
+    def update_order_table_after_commit():
+        update_table_map(branch_id, order_id, table, status)
+        publish_tables(branch_id)
+
+    transaction.on_commit(update_order_table_after_commit, robust=True)
+
+
+def update_branch_tables(sender, instance, **kwargs):
+    """
+    Applies the number of tables of the branch to its table map after the
+    transaction commits and pushes the map to waiters.
+    """
+    branch_id, tables = instance.id, instance.counts_of_tables
+
+    def update_branch_tables_after_commit():
+        update_table_count(branch_id, tables)
+        publish_tables(branch_id)
+
+    transaction.on_commit(update_branch_tables_after_commit, robust=True)
+
+
+post_save.connect(update_order_table, sender=Order)
+post_delete.connect(update_order_table, sender=Order)
+post_save.connect(update_branch_tables, sender=Branch)
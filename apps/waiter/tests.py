@@ -1,3 +1,177 @@
+import itertools
+import json
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from channels.routing import URLRouter
+from django.core.cache import cache
+from django.db import transaction
 from django.test import TestCase
 
-# Create your tests here.
+from apps.accounts.models import CustomUser
+from apps.branches.models import Branch, Schedule
+from apps.notices.models import OutboxEvent
+from apps.notices.outbox import relay_outbox
+from apps.ordering.models import Order
+from apps.waiter.routing import websocket_urlpatterns
+from apps.waiter.services import (
+    get_free_tables,
+    get_occupied_tables,
+    get_tables_availability,
+    is_table_free,
+)
+from utils.table_map import LOCK_KEY, TABLE_MAP_KEY
+
+
+# ==============================================================================
+# Table map test
+# ==============================================================================
+class TableMapTest(TestCase):
+    """
+    Tests for the table occupancy map kept up to date by the order signals.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Set up test data.
+        """
+        cls.schedule = Schedule.objects.create(
+            title="Test schedule", description="Test description"
+        )
+        cls.branch = Branch.objects.create(
+            schedule=cls.schedule,
+            name_of_shop="Branch",
+            address="Test address",
+            phone_number="+375291234567",
+            link_to_map="https://www.google.com/",
+            counts_of_tables=4,
+        )
+        cls.waiter = CustomUser.objects.create(
+            phone_number="+996777777777",
+            username="waiter",
+            position="waiter",
+            branch=cls.branch,
+        )
+        cls.open_order = cls.create_order(2)
+        cls.create_order(3, status="completed")
+
+    @classmethod
+    def create_order(cls, table, status="new"):
+        return Order.objects.create(
+            customer=cls.waiter,
+            branch=cls.branch,
+            total_price=10,
+            in_an_institution=True,
+            table=table,
+            status=status,
+        )
+
+    def setUp(self):
+        cache.clear()
+        OutboxEvent.objects.all().delete()
+
+    def occupy(self, table):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.create_order(table)
+
+    def set_status(self, order, status):
+        with self.captureOnCommitCallbacks(execute=True):
+            order.status = status
+            order.save()
+
+    def test_map_is_read_from_the_cache(self):
+        with self.assertNumQueries(2):
+            self.assertEqual(
+                get_tables_availability(self.branch.id),
+                {1: "free", 2: "occupied", 3: "free", 4: "free"},
+            )
+        with self.assertNumQueries(0):
+            self.assertEqual(get_occupied_tables(self.branch.id), [2])
+            self.assertEqual(get_free_tables(self.branch.id), [1, 3, 4])
+            self.assertTrue(is_table_free(self.branch.id, 4))
+            self.assertFalse(is_table_free(self.branch.id, 2))
+            self.assertFalse(is_table_free(self.branch.id, 5))
+        self.assertFalse(is_table_free(0, 1))
+
+    def test_order_transitions_update_the_map(self):
+        get_tables_availability(self.branch.id)
+        order = self.occupy(3)
+        second_order = self.occupy(2)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_occupied_tables(self.branch.id), [2, 3])
+
+        self.set_status(order, "in_progress")
+        self.set_status(order, "completed")
+        self.set_status(self.open_order, "canceled")
+        with self.assertNumQueries(0):
+            self.assertEqual(get_occupied_tables(self.branch.id), [2])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second_order.delete()
+        self.assertEqual(get_free_tables(self.branch.id), [1, 2, 3, 4])
+        self.assertTrue(
+            OutboxEvent.objects.filter(
+                group=f"tables_{self.branch.id}", type="get_tables"
+            ).exists()
+        )
+
+    def test_rolled_back_order_leaves_the_map(self):
+        get_tables_availability(self.branch.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.create_order(1)
+                transaction.set_rollback(True)
+        self.assertEqual(get_occupied_tables(self.branch.id), [2])
+
+    def test_branch_table_count_updates_the_map(self):
+        get_tables_availability(self.branch.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.branch.counts_of_tables = 6
+            self.branch.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_free_tables(self.branch.id), [1, 3, 4, 5, 6])
+
+    def test_lock_held_elsewhere_is_left_alone(self):
+        lock_key = LOCK_KEY.format(branch_id=self.branch.id)
+        map_key = TABLE_MAP_KEY.format(branch_id=self.branch.id)
+        cache.add(lock_key, "other")
+        # The clock jumps past the deadline, so the lock is not waited for.
+        with mock.patch(
+            "utils.locks.time.monotonic", side_effect=itertools.count(0, 10)
+        ):
+            self.assertEqual(get_occupied_tables(self.branch.id), [2])
+            self.assertIsNone(cache.get(map_key))
+            cache.set(map_key, {"tables": 4, "orders": {}})
+            self.occupy(1)
+        self.assertIsNone(cache.get(map_key))
+        self.assertEqual(cache.get(lock_key), "other")
+        cache.delete(lock_key)
+        self.assertEqual(get_occupied_tables(self.branch.id), [1, 2])
+
+    async def test_tables_are_pushed_to_waiters(self):
+        communicator = ApplicationCommunicator(
+            URLRouter(websocket_urlpatterns),
+            {
+                "type": "websocket",
+                "path": f"/ws/tables/{self.branch.id}/",
+                "headers": [],
+                "subprotocols": [],
+            },
+        )
+        await communicator.send_input({"type": "websocket.connect"})
+        response = await communicator.receive_output()
+        self.assertEqual(response["type"], "websocket.accept")
+        response = await communicator.receive_output()
+        self.assertEqual(
+            json.loads(response["text"])["tables"],
+            {"1": "free", "2": "occupied", "3": "free", "4": "free"},
+        )
+
+        await sync_to_async(self.occupy)(1)
+        await sync_to_async(relay_outbox)(throttle=False)
+        response = await communicator.receive_output()
+        self.assertEqual(json.loads(response["text"])["tables"]["1"], "occupied")
+        await communicator.send_input({"type": "websocket.disconnect", "code": 1000})
+        await communicator.wait()
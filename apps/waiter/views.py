@@ -11,6 +11,7 @@ from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from apps.customers.serializers import OrderSerializer
 from apps.waiter.serializers import WaiterOpenedOrdersSerializer
+from utils.pagination import PAGE_PARAMETERS, get_page_params
 
 
 class GetTableAvailibilityView(APIView):
@@ -135,6 +136,7 @@ class WaiterOpenedOrdersView(APIView):
     @swagger_auto_schema(
         operation_summary="Gets waiter opened orders.",
         operation_description="User must be authenticated.",
+        manual_parameters=PAGE_PARAMETERS,
         responses={
             status.HTTP_200_OK: openapi.Schema(
                 type=openapi.TYPE_OBJECT,
@@ -144,6 +146,10 @@ class WaiterOpenedOrdersView(APIView):
                         items=openapi.Schema(type=openapi.TYPE_OBJECT),
                         description="List of orders",
                     ),
+                    "next_cursor": openapi.Schema(
+                        type=openapi.TYPE_STRING,
+                        description="Cursor of the next page or null",
+                    ),
                 },
             ),
         },
@@ -152,10 +158,19 @@ class WaiterOpenedOrdersView(APIView):
         """
         Gets waiter opened orders.
         """
+        try:
+            position, limit = get_page_params(request)
+        except ValueError:
+            return Response(
+                {"error": "Invalid cursor or limit"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        orders, next_cursor = get_orders_in_institution(
+            request.user.branch_id, position, limit
+        )
         return Response(
             {
-                "orders": WaiterOpenedOrdersSerializer(
-                    get_orders_in_institution(request.user.branch_id), many=True
-                ).data,
+                "orders": WaiterOpenedOrdersSerializer(orders, many=True).data,
+                "next_cursor": next_cursor,
             }
         )
@@ -1,11 +1,11 @@
 from channels.generic.websocket import AsyncWebsocketConsumer
 from asgiref.sync import sync_to_async
 import json
-from .services import get_orders, get_only_required_fields
-from apps.ordering.models import Order, OrderItem
+from utils.profiling import ProfiledConsumerMixin
+from .services import get_order_board
 
 
-class NewOrdersTakeawayConsumer(AsyncWebsocketConsumer):
+class NewOrdersTakeawayConsumer(ProfiledConsumerMixin, AsyncWebsocketConsumer):
     async def connect(self):
         self.branch_id = self.scope["url_route"]["kwargs"]["branch_id"]
         self.branch_group_name = f"new_orders_takeaway_{self.branch_id}"
@@ -22,17 +22,12 @@ class NewOrdersTakeawayConsumer(AsyncWebsocketConsumer):
         )
 
     async def get_new_orders(self, event=None):
-        orders = await sync_to_async(get_orders)(
+        orders_data = await sync_to_async(get_order_board)(
             branch_id=self.branch_id,
             in_an_institution=False,
             status="new",
         )
 
-        orders_data = []
-        for order in orders:
-            order_data = await sync_to_async(get_only_required_fields)(order)
-            orders_data.append(order_data)
-
         await self.send(text_data=json.dumps({"orders": orders_data}))
 
     async def get_new_orders_handler(self, event):
@@ -55,7 +50,7 @@ class NewOrdersTakeawayConsumer(AsyncWebsocketConsumer):
         await self.get_new_orders()
 
 
-class NewOrdersInstitutionConsumer(AsyncWebsocketConsumer):
+class NewOrdersInstitutionConsumer(ProfiledConsumerMixin, AsyncWebsocketConsumer):
     async def connect(self):
         self.branch_id = self.scope["url_route"]["kwargs"]["branch_id"]
         self.branch_group_name = f"new_orders_institution_{self.branch_id}"
@@ -72,17 +67,12 @@ class NewOrdersInstitutionConsumer(AsyncWebsocketConsumer):
         )
 
     async def get_new_orders(self, event=None):
-        orders = await sync_to_async(get_orders)(
+        orders_data = await sync_to_async(get_order_board)(
             branch_id=self.branch_id,
             in_an_institution=True,
             status="new",
         )
 
-        orders_data = []
-        for order in orders:
-            order_data = await sync_to_async(get_only_required_fields)(order)
-            orders_data.append(order_data)
-
         await self.send(text_data=json.dumps({"orders": orders_data}))
 
     async def get_new_orders_handler(self, event):
@@ -1,5 +1,7 @@
 from apps.ordering.models import Order, OrderItem
-from django.db.models import Sum
+from django.db import transaction
+from django.db.models import Prefetch, Sum
+from django.utils import timezone
 from apps.storage.models import (
     AvailableAtTheBranch,
     ReadyMadeProductAvailableAtTheBranch,
@@ -13,7 +15,9 @@ from apps.notices.tasks import (
 from apps.ordering.services import (
     get_order_items_names_and_quantities,
     return_to_storage,
+    update_popularity,
 )
+from utils.order_board import get_or_build_board
 
 
 # ============================================================
@@ -21,14 +25,21 @@ from apps.ordering.services import (
 # ============================================================
 def get_orders(branch_id, in_an_institution=True, status="new"):
     """
-    Get new orders for branch.
+    Get the orders of the branch with their customers, items and products.
     """
-    return list(
+    return (
         Order.objects.filter(
             branch_id=branch_id,
             in_an_institution=in_an_institution,
             status=status,
-        ).order_by("-created_at")
+        )
+        .select_related("customer")
+        .prefetch_related(
+            Prefetch(
+                "items",
+                queryset=OrderItem.objects.select_related("item", "ready_made_product"),
+            )
+        )
     )
 
 
@@ -50,8 +61,10 @@ def get_only_required_fields(order):
 def get_order_items(order):
     """
     Get order items for order.
+
+    Uses the prefetched items of the order when they were loaded.
     """
-    order_items = OrderItem.objects.filter(order=order)
+    order_items = order.items.all()
     items = []
     for order_item in order_items:
         items.append(
@@ -66,23 +79,39 @@ def get_order_items(order):
     return items
 
 
-def get_order_items(order):
+def build_order_board(branch_id, in_an_institution=True, status="new"):
     """
-    Get order items for order.
+    Builds the order board of the branch with two queries: the orders with
+    their customers and all of their items with the products.
     """
-    order_items = OrderItem.objects.filter(order=order)
-    items = []
-    for order_item in order_items:
-        items.append(
-            {
-                "id": order_item.id,
-                "name": order_item.item.name
-                if order_item.ready_made_product is None
-                else order_item.ready_made_product.name,
-                "quantity": order_item.quantity,
-            }
+    orders = (
+        Order.objects.filter(
+            branch_id=branch_id,
+            in_an_institution=in_an_institution,
+            status=status,
         )
-    return items
+        .select_related("customer")
+        .prefetch_related(
+            Prefetch(
+                "items",
+                queryset=OrderItem.objects.select_related("item", "ready_made_product"),
+            )
+        )
+        .order_by("-created_at")
+    )
+    return [get_only_required_fields(order) for order in orders]
+
+
+def get_order_board(branch_id, in_an_institution=True, status="new"):
+    """
+    Get the cached order board shared by all screens of the branch.
+    """
+    return get_or_build_board(
+        branch_id,
+        in_an_institution,
+        status,
+        lambda: build_order_board(branch_id, in_an_institution, status),
+    )
 
 
 def get_order_items_str(order_id):
@@ -161,8 +190,11 @@ def complete_order(order_id):
     if not order:
         return False
     order = order.first()
-    order.status = "completed"
-    order.save()
+    with transaction.atomic():
+        order.status = "completed"
+        order.completed_at = timezone.now()
+        order.save()
+        update_popularity(order)
     order_items = get_order_items_str(order.id)
     create_notification_for_client.delay(
         order.customer.id,
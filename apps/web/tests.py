@@ -1,4 +1,195 @@
 """
 Test cases for the web app.
 """
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.accounts.models import CustomUser
+from apps.branches.models import Branch, Schedule
+from apps.ordering.models import Order, OrderItem
+from apps.storage.models import Category, Item, ReadyMadeProduct
+from apps.web.services import accept_order, build_order_board, get_order_board
+
+
+# ==============================================================================
+# Order board test
+# ==============================================================================
+class OrderBoardTest(TestCase):
+    """
+    Tests for the cached order board of the barista screens.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Set up test data.
+        """
+        cls.schedeule = Schedule.objects.create(
+            title="Test schedule", description="Test description"
+        )
+        cls.branch = Branch.objects.create(
+            schedule=cls.schedeule,
+            name_of_shop="Test shop",
+            address="Test address",
+            phone_number="+375291234567",
+            link_to_map="https://www.google.com/",
+        )
+        cls.category = Category.objects.create(name="Кофе")
+        cls.latte = Item.objects.create(
+            name="Латте", description="Test", category=cls.category, price=100
+        )
+        cls.croissant = ReadyMadeProduct.objects.create(
+            name="Круассан", description="Test", category=cls.category, price=40
+        )
+        cls.orders = []
+        for number in range(5):
+            customer = CustomUser.objects.create(
+                phone_number=f"+99677777777{number}",
+                username=f"client{number}",
+                branch=cls.branch,
+            )
+            order = Order.objects.create(
+                customer=customer,
+                branch=cls.branch,
+                total_price=140,
+                in_an_institution=False,
+            )
+            OrderItem.objects.create(order=order, item=cls.latte, quantity=1)
+            OrderItem.objects.create(
+                order=order, ready_made_product=cls.croissant, quantity=2
+            )
+            cls.orders.append(order)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_board_is_built_with_two_queries(self):
+        with self.assertNumQueries(2):
+            board = build_order_board(self.branch.id, in_an_institution=False)
+        self.assertEqual(
+            [order["id"] for order in board],
+            [order.id for order in reversed(self.orders)],
+        )
+        self.assertCountEqual(
+            [(item["name"], item["quantity"]) for item in board[0]["items"]],
+            [("Латте", 1), ("Круассан", 2)],
+        )
+        self.assertEqual(board[0]["clientNumber"], "+996777777774")
+
+    def test_board_is_shared_until_invalidated(self):
+        board = get_order_board(self.branch.id, in_an_institution=False)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                get_order_board(self.branch.id, in_an_institution=False), board
+            )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            accept_order(self.orders[0].id)
+        board = get_order_board(self.branch.id, in_an_institution=False)
+        self.assertNotIn(self.orders[0].id, [order["id"] for order in board])
+
+    def test_boards_are_cached_per_kind_and_status(self):
+        get_order_board(self.branch.id, in_an_institution=False)
+        self.assertEqual(get_order_board(self.branch.id, in_an_institution=True), [])
+        self.assertEqual(
+            get_order_board(self.branch.id, in_an_institution=False, status="ready"),
+            [],
+        )
+
+
+# ==============================================================================
+# Order list pagination test
+# ==============================================================================
+class OrderListPaginationTest(TestCase):
+    """
+    Tests for the keyset pagination of the barista order lists.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Set up test data.
+        """
+        cls.schedeule = Schedule.objects.create(
+            title="Test schedule", description="Test description"
+        )
+        cls.branch = Branch.objects.create(
+            schedule=cls.schedeule,
+            name_of_shop="Test shop",
+            address="Test address",
+            phone_number="+375291234567",
+            link_to_map="https://www.google.com/",
+        )
+        cls.barista = CustomUser.objects.create(
+            phone_number="+996777777700",
+            username="barista",
+            position="barista",
+            branch=cls.branch,
+        )
+        cls.customer = CustomUser.objects.create(
+            phone_number="+996777777701", username="client", branch=cls.branch
+        )
+        category = Category.objects.create(name="Кофе")
+        latte = Item.objects.create(
+            name="Латте", description="Test", category=category, price=100
+        )
+        now = timezone.now()
+        for number in range(7):
+            order = Order.objects.create(
+                customer=cls.customer,
+                branch=cls.branch,
+                total_price=100,
+                in_an_institution=False,
+                status="completed",
+            )
+            OrderItem.objects.create(order=order, item=latte, quantity=number + 1)
+            # Pairs of orders share a time, so the id breaks the ties.
+            Order.objects.filter(id=order.id).update(
+                created_at=now - timedelta(minutes=number // 2)
+            )
+        cls.expected = list(
+            Order.objects.order_by("-created_at", "-id").values_list("id", flat=True)
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.barista)
+
+    def get_page(self, cursor=None):
+        params = {"limit": 3}
+        if cursor:
+            params["cursor"] = cursor
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/web/takeaway-orders/completed/", params)
+        self.assertEqual(response.status_code, 200)
+        return response.data, len(queries)
+
+    def test_pages_follow_the_cursor(self):
+        ids, counts, cursor = [], [], None
+        while True:
+            page, count = self.get_page(cursor)
+            ids += [order["id"] for order in page["orders"]]
+            counts.append(count)
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        self.assertEqual(ids, self.expected)
+        self.assertEqual(len(counts), 3)
+        self.assertEqual(len(set(counts)), 1)
+        self.assertEqual(len(page["orders"][0]["items"]), 1)
+
+    def test_invalid_cursor_is_rejected(self):
+        for params in ({"cursor": "invalid"}, {"limit": 0}, {"limit": "x"}):
+            response = self.client.get("/web/takeaway-orders/completed/", params)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.data, {"error": "Invalid cursor or limit"})
+
+    def test_other_lists_are_paged(self):
+        response = self.client.get("/web/takeaway-orders/in-process/")
+        self.assertEqual(response.data, {"orders": [], "next_cursor": None})
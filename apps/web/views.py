@@ -15,6 +15,7 @@ from .services import (
     make_order_ready,
 )
 from .permissions import IsBarista
+from utils.pagination import PAGE_PARAMETERS, paginate_request
 from apps.web.serializers import (
     OrderSerializer,
 )
@@ -225,6 +226,7 @@ class GetInProcessTakeawayOrdersView(APIView):
     @swagger_auto_schema(
         operation_summary="Get in process orders",
         operation_description="Use this endpoint to get in process orders.",
+        manual_parameters=PAGE_PARAMETERS,
         responses={
             200: openapi.Response("In process orders"),
         },
@@ -233,15 +235,19 @@ class GetInProcessTakeawayOrdersView(APIView):
         """
         Get in process orders.
         """
-        user = request.user
-        branch_id = user.branch.id
-        orders = get_orders(
-            branch_id=branch_id,
-            in_an_institution=False,
-            status="in_progress",
+        orders, next_cursor = paginate_request(
+            request,
+            get_orders(
+                branch_id=request.user.branch_id,
+                in_an_institution=False,
+                status="in_progress",
+            ),
         )
         serializer = OrderSerializer(orders, many=True)
-        return Response({"orders": serializer.data}, status=status.HTTP_200_OK)
+        return Response(
+            {"orders": serializer.data, "next_cursor": next_cursor},
+            status=status.HTTP_200_OK,
+        )
 
 
 class GetCanceledTakeawayOrdersView(APIView):
@@ -254,6 +260,7 @@ class GetCanceledTakeawayOrdersView(APIView):
     @swagger_auto_schema(
         operation_summary="Get canceled takeaway orders",
         operation_description="Use this endpoint to get canceled takeaway orders.",
+        manual_parameters=PAGE_PARAMETERS,
         responses={
             200: openapi.Response("Canceled takeaway orders"),
         },
@@ -262,15 +269,19 @@ class GetCanceledTakeawayOrdersView(APIView):
         """
         Get canceled takeaway orders.
         """
-        user = request.user
-        branch_id = user.branch.id
-        orders = get_orders(
-            branch_id=branch_id,
-            in_an_institution=False,
-            status="canceled",
+        orders, next_cursor = paginate_request(
+            request,
+            get_orders(
+                branch_id=request.user.branch_id,
+                in_an_institution=False,
+                status="canceled",
+            ),
         )
         serializer = OrderSerializer(orders, many=True)
-        return Response({"orders": serializer.data}, status=status.HTTP_200_OK)
+        return Response(
+            {"orders": serializer.data, "next_cursor": next_cursor},
+            status=status.HTTP_200_OK,
+        )
 
 
 class GetReadyTakeawayOrdersView(APIView):
@@ -283,6 +294,7 @@ class GetReadyTakeawayOrdersView(APIView):
     @swagger_auto_schema(
         operation_summary="Get ready takeaway orders",
         operation_description="Use this endpoint to get ready takeaway orders.",
+        manual_parameters=PAGE_PARAMETERS,
         responses={
             200: openapi.Response("Ready takeaway orders"),
         },
@@ -291,15 +303,19 @@ class GetReadyTakeawayOrdersView(APIView):
         """
         Get ready takeaway orders.
         """
-        user = request.user
-        branch_id = user.branch.id
-        orders = get_orders(
-            branch_id=branch_id,
-            in_an_institution=False,
-            status="ready",
+        orders, next_cursor = paginate_request(
+            request,
+            get_orders(
+                branch_id=request.user.branch_id,
+                in_an_institution=False,
+                status="ready",
+            ),
         )
         serializer = OrderSerializer(orders, many=True)
-        return Response({"orders": serializer.data}, status=status.HTTP_200_OK)
+        return Response(
+            {"orders": serializer.data, "next_cursor": next_cursor},
+            status=status.HTTP_200_OK,
+        )
 
 
 class GetCompletedTakeawayOrdersView(APIView):
@@ -312,6 +328,7 @@ class GetCompletedTakeawayOrdersView(APIView):
     @swagger_auto_schema(
         operation_summary="Get completed takeaway orders",
         operation_description="Use this endpoint to get completed takeaway orders.",
+        manual_parameters=PAGE_PARAMETERS,
         responses={
             200: openapi.Response("Completed takeaway orders"),
         },
@@ -320,15 +337,19 @@ class GetCompletedTakeawayOrdersView(APIView):
         """
         Get completed takeaway orders.
         """
-        user = request.user
-        branch_id = user.branch.id
-        orders = get_orders(
-            branch_id=branch_id,
-            in_an_institution=False,
-            status="completed",
+        orders, next_cursor = paginate_request(
+            request,
+            get_orders(
+                branch_id=request.user.branch_id,
+                in_an_institution=False,
+                status="completed",
+            ),
         )
         serializer = OrderSerializer(orders, many=True)
-        return Response({"orders": serializer.data}, status=status.HTTP_200_OK)
+        return Response(
+            {"orders": serializer.data, "next_cursor": next_cursor},
+            status=status.HTTP_200_OK,
+        )
 
 
 class GetInProcessInstitutionOrdersView(APIView):
@@ -341,6 +362,7 @@ class GetInProcessInstitutionOrdersView(APIView):
     @swagger_auto_schema(
         operation_summary="Get in process institution orders",
         operation_description="Use this endpoint to get in process institution orders.",
+        manual_parameters=PAGE_PARAMETERS,
         responses={
             200: openapi.Response("In process institution orders"),
         },
@@ -349,15 +371,19 @@ class GetInProcessInstitutionOrdersView(APIView):
         """
         Get in process institution orders.
         """
-        user = request.user
-        branch_id = user.branch.id
-        orders = get_orders(
-            branch_id=branch_id,
-            in_an_institution=True,
-            status="in_progress",
+        orders, next_cursor = paginate_request(
+            request,
+            get_orders(
+                branch_id=request.user.branch_id,
+                in_an_institution=True,
+                status="in_progress",
+            ),
         )
         serializer = OrderSerializer(orders, many=True)
-        return Response({"orders": serializer.data}, status=status.HTTP_200_OK)
+        return Response(
+            {"orders": serializer.data, "next_cursor": next_cursor},
+            status=status.HTTP_200_OK,
+        )
 
 
 class GetCanceledInstitutionOrdersView(APIView):
@@ -370,6 +396,7 @@ class GetCanceledInstitutionOrdersView(APIView):
     @swagger_auto_schema(
         operation_summary="Get canceled institution orders",
         operation_description="Use this endpoint to get canceled institution orders.",
+        manual_parameters=PAGE_PARAMETERS,
         responses={
             200: openapi.Response("Canceled institution orders"),
         },
@@ -378,15 +405,19 @@ class GetCanceledInstitutionOrdersView(APIView):
         """
         Get canceled institution orders.
         """
-        user = request.user
-        branch_id = user.branch.id
-        orders = get_orders(
-            branch_id=branch_id,
-            in_an_institution=True,
-            status="canceled",
+        orders, next_cursor = paginate_request(
+            request,
+            get_orders(
+                branch_id=request.user.branch_id,
+                in_an_institution=True,
+                status="canceled",
+            ),
         )
         serializer = OrderSerializer(orders, many=True)
-        return Response({"orders": serializer.data}, status=status.HTTP_200_OK)
+        return Response(
+            {"orders": serializer.data, "next_cursor": next_cursor},
+            status=status.HTTP_200_OK,
+        )
 
 
 class GetReadyInstitutionOrdersView(APIView):
@@ -399,6 +430,7 @@ class GetReadyInstitutionOrdersView(APIView):
     @swagger_auto_schema(
         operation_summary="Get ready institution orders",
         operation_description="Use this endpoint to get ready institution orders.",
+        manual_parameters=PAGE_PARAMETERS,
         responses={
             200: openapi.Response("Ready institution orders"),
         },
@@ -407,15 +439,19 @@ class GetReadyInstitutionOrdersView(APIView):
         """
         Get ready institution orders.
         """
-        user = request.user
-        branch_id = user.branch.id
-        orders = get_orders(
-            branch_id=branch_id,
-            in_an_institution=True,
-            status="ready",
+        orders, next_cursor = paginate_request(
+            request,
+            get_orders(
+                branch_id=request.user.branch_id,
+                in_an_institution=True,
+                status="ready",
+            ),
         )
         serializer = OrderSerializer(orders, many=True)
-        return Response({"orders": serializer.data}, status=status.HTTP_200_OK)
+        return Response(
+            {"orders": serializer.data, "next_cursor": next_cursor},
+            status=status.HTTP_200_OK,
+        )
 
 
 class GetCompletedInstitutionOrdersView(APIView):
@@ -428,6 +464,7 @@ class GetCompletedInstitutionOrdersView(APIView):
     @swagger_auto_schema(
         operation_summary="Get completed institution orders",
         operation_description="Use this endpoint to get completed institution orders.",
+        manual_parameters=PAGE_PARAMETERS,
         responses={
             200: openapi.Response("Completed institution orders"),
         },
@@ -436,12 +473,16 @@ class GetCompletedInstitutionOrdersView(APIView):
         """
         Get completed institution orders.
         """
-        user = request.user
-        branch_id = user.branch.id
-        orders = get_orders(
-            branch_id=branch_id,
-            in_an_institution=True,
-            status="completed",
+        orders, next_cursor = paginate_request(
+            request,
+            get_orders(
+                branch_id=request.user.branch_id,
+                in_an_institution=True,
+                status="completed",
+            ),
         )
         serializer = OrderSerializer(orders, many=True)
-        return Response({"orders": serializer.data}, status=status.HTTP_200_OK)
+        return Response(
+            {"orders": serializer.data, "next_cursor": next_cursor},
+            status=status.HTTP_200_OK,
+        )
@@ -8,7 +8,9 @@ from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
+import apps.customers.routing
 import apps.notices.routing
+import apps.waiter.routing
 import apps.web.routing
 
 application = ProtocolTypeRouter(
@@ -18,6 +20,8 @@ application = ProtocolTypeRouter(
             URLRouter(
                 apps.notices.routing.websocket_urlpatterns
                 + apps.web.routing.websocket_urlpatterns
+                + apps.waiter.routing.websocket_urlpatterns
+                + apps.customers.routing.websocket_urlpatterns
             )
         ),
     }
@@ -72,6 +72,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",  # Whitenoise
+    "utils.profiling.ProfilingMiddleware",  # Server-Timing and histograms
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",  # CORS
     "django.middleware.common.CommonMiddleware",
@@ -137,6 +138,55 @@ CHANNEL_LAYERS = {
 
 # Celery settings.
 CELERY_BROKER_URL = f"redis://{REDIS_HOST}:{REDIS_PORT}/0"
+CELERY_BEAT_SCHEDULE = {
+    "archive-orders": {
+        "task": "apps.ordering.tasks.archive_orders_task",
+        "schedule": 60 * 60,
+    },
+    "reconcile-low-stock-alerts": {
+        "task": "apps.notices.tasks.create_notification_for_admin_task",
+        "schedule": 60 * 15,
+    },
+    "sweep-outbox": {
+        "task": "apps.notices.outbox.sweep_outbox_task",
+        "schedule": 60,
+    },
+}
+
+# Days after which completed and canceled orders are moved into the archive
+# tables, and the orders moved per transaction (see apps/ordering/archive.py).
+ORDER_ARCHIVE_AGE = config("ORDER_ARCHIVE_AGE", default=30, cast=int)
+ORDER_ARCHIVE_BATCH_SIZE = config("ORDER_ARCHIVE_BATCH_SIZE", default=1000, cast=int)
+
+# Seconds during which repeated requests of a background task are coalesced
+# into one run (see utils/dispatch.py).
+TASK_COALESCE_WINDOW = config("TASK_COALESCE_WINDOW", default=5, cast=int)
+
+# Seconds during which repeated refresh broadcasts to one channel group are
+# merged into one group_send (see apps/notices/outbox.py).
+BROADCAST_COALESCE_WINDOW = config("BROADCAST_COALESCE_WINDOW", default=1, cast=int)
+
+# Seconds published outbox events are kept before the sweep deletes them.
+OUTBOX_RETENTION = config("OUTBOX_RETENTION", default=60 * 60 * 24, cast=int)
+
+# Share of the requests and websocket messages that are profiled, and the
+# seconds the profiling histograms cover in slots of PROFILING_SLOT seconds
+# (see utils/profiling.py).
+PROFILING_SAMPLE_RATE = config("PROFILING_SAMPLE_RATE", default=0.1, cast=float)
+PROFILING_WINDOW = config("PROFILING_WINDOW", default=60 * 60, cast=int)
+PROFILING_SLOT = config("PROFILING_SLOT", default=60, cast=int)
+
+# Cache settings. The cache is shared by the uvicorn workers and the
+# Celery worker, so it lives in Redis next to the channel layer.
+CACHES = {
+    "default": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": f"redis://{REDIS_HOST}:{REDIS_PORT}/1",
+        "OPTIONS": {
+            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+        },
+    }
+}
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -255,3 +305,6 @@ ALGOLIA = {
     "APPLICATION_ID": ALGOLIA_APPLICATION_ID,
     "API_KEY": ALGOLIA_API_KEY,
 }
+
+# Menu search backend: "algolia" or "local" (in-process index).
+MENU_SEARCH_BACKEND = config("MENU_SEARCH_BACKEND", default="algolia")
@@ -0,0 +1,27 @@
+"""
+Django settings for the test suite.
+
+manage.py test uses these settings, so the tests run without Redis:
+websocket events go through the in-memory channel layer, Celery tasks run
+in the calling process, the cache is local to the process and the menu is
+searched locally instead of on Algolia.
+"""
+from config.settings import *  # noqa: F401,F403
+
+
+CHANNEL_LAYERS = {
+    "default": {
+        "BACKEND": "channels.layers.InMemoryChannelLayer",
+    },
+}
+
+CELERY_TASK_ALWAYS_EAGER = True
+
+MENU_SEARCH_BACKEND = "local"
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "neocafe",
+    }
+}
@@ -0,0 +1,371 @@
+"""
+Module for the item availability matrix.
+"""
+from contextlib import ExitStack
+from operator import itemgetter
+
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+
+from apps.branches.models import Branch
+from apps.notices.outbox import publish_event
+from apps.storage.models import AvailableAtTheBranch, Composition, Item
+from utils.locks import cache_lock
+
+
+# Quantities are stored with two decimal places, so the matrix keeps them as
+# integer hundredths and every comparison stays exact.
+QUANTITY_SCALE = 100
+UNLIMITED = np.iinfo(np.int64).max
+
+REVERSE_INDEX_KEY = "availability:reverse_index"
+REVERSE_INDEX_LOCK_KEY = "availability:reverse_index:lock"
+BRANCH_STATE_KEY = "availability:branch:{branch_id}"
+BRANCH_LOCK_KEY = "availability:branch:{branch_id}:lock"
+# The states are kept up to date by the stock and composition signals; the
+# timeout only bounds how long a missed update can be served.
+AVAILABILITY_TIMEOUT = 60 * 10
+
+
+def to_units(quantities):
+    """
+    Converts decimal quantities to integer hundredths.
+
+    Two decimal places with at most ten digits fit well within float64
+    precision, so rounding after scaling gives the exact value.
+    """
+    quantities = np.fromiter(map(float, quantities), dtype=np.float64)
+    return np.rint(quantities * QUANTITY_SCALE).astype(np.int64)
+
+
+class AvailabilityMatrix:
+    """
+    Availability of every item at every branch.
+
+    Compositions are kept as the non-zero cells of the items x ingredients
+    requirements matrix and stock as a dense branches x ingredients matrix,
+    both in integer hundredths. `max_quantities` is the branches x items
+    matrix of how many portions of an item can be made at a branch.
+    """
+
+    def __init__(self, item_ids, branch_ids, ingredient_ids, compositions, stock):
+        self.item_ids = item_ids
+        self.branch_ids = branch_ids
+        self.ingredient_ids = ingredient_ids
+        self.compositions = compositions
+        self.stock = stock
+        self._item_index = {
+            item_id: index for index, item_id in enumerate(item_ids.tolist())
+        }
+        self._branch_index = {
+            branch_id: index for index, branch_id in enumerate(branch_ids.tolist())
+        }
+        self.max_quantities = self._compute_max_quantities()
+        self.can_be_made_matrix = self.max_quantities >= 1
+
+    @classmethod
+    def from_rows(cls, item_ids, branch_ids, composition_rows, stock_rows):
+        """
+        Builds the matrix from (item_id, ingredient_id, quantity) and
+        (branch_id, ingredient_id, quantity) rows.
+        """
+        item_ids = np.unique(np.fromiter(item_ids, dtype=np.int64))
+        branch_ids = np.unique(np.fromiter(branch_ids, dtype=np.int64))
+
+        (
+            composition_items,
+            composition_ingredients,
+            composition_quantities,
+        ) = _split_rows(composition_rows, item_ids)
+        stock_branches, stock_ingredients, stock_quantities = _split_rows(
+            stock_rows, branch_ids
+        )
+        ingredient_ids = np.union1d(composition_ingredients, stock_ingredients)
+
+        compositions = _sum_cells(
+            np.searchsorted(item_ids, composition_items),
+            np.searchsorted(ingredient_ids, composition_ingredients),
+            composition_quantities,
+            ingredient_ids.size,
+        )
+        stock_cells = _sum_cells(
+            np.searchsorted(branch_ids, stock_branches),
+            np.searchsorted(ingredient_ids, stock_ingredients),
+            stock_quantities,
+            ingredient_ids.size,
+        )
+        stock = np.zeros((branch_ids.size, ingredient_ids.size), dtype=np.int64)
+        stock[stock_cells[0], stock_cells[1]] = stock_cells[2]
+
+        return cls(item_ids, branch_ids, ingredient_ids, compositions, stock)
+
+    @property
+    def requirements(self):
+        """
+        Dense items x ingredients requirements matrix.
+        """
+        item_index, ingredient_index, quantities = self.compositions
+        requirements = np.zeros(
+            (self.item_ids.size, self.ingredient_ids.size), dtype=np.int64
+        )
+        requirements[item_index, ingredient_index] = quantities
+        return requirements
+
+    def _compute_max_quantities(self):
+        """
+        Computes the branches x items matrix of makeable quantities.
+
+        Every composition cell is divided into the stock of all branches at
+        once and the per-item minimum is taken with a single reduceat, so
+        the whole grid is evaluated in one vectorized pass.
+        """
+        max_quantities = np.full(
+            (self.item_ids.size, self.branch_ids.size), UNLIMITED, dtype=np.int64
+        )
+        item_index, ingredient_index, required = self.compositions
+        if item_index.size:
+            stock = np.maximum(self.stock.T[ingredient_index], 0)
+            # An ingredient with a zero quantity does not limit the item.
+            needed = required[:, np.newaxis]
+            portions = np.where(needed > 0, stock // np.maximum(needed, 1), UNLIMITED)
+            starts = np.flatnonzero(np.r_[True, item_index[1:] != item_index[:-1]])
+            max_quantities[item_index[starts]] = np.minimum.reduceat(
+                portions, starts, axis=0
+            )
+        return max_quantities.T
+
+    def max_quantity(self, item_id, branch_id):
+        """
+        Returns how many portions of the item can be made at the branch.
+        """
+        item_index = self._item_index.get(_to_id(item_id))
+        branch_index = self._branch_index.get(_to_id(branch_id))
+        if item_index is None or branch_index is None:
+            return 0
+        return int(self.max_quantities[branch_index, item_index])
+
+    def can_be_made(self, item_id, branch_id, quantity=1):
+        """
+        Checks if the item can be made at the branch in the given quantity.
+        """
+        return self.max_quantity(item_id, branch_id) >= quantity
+
+    def available_item_ids(self, branch_id):
+        """
+        Returns ids of the items that can be made at the branch.
+        """
+        branch_index = self._branch_index.get(_to_id(branch_id))
+        if branch_index is None:
+            return []
+        return self.item_ids[self.can_be_made_matrix[branch_index]].tolist()
+
+
+def _to_id(value):
+    """
+    Accepts both model instances and raw ids.
+    """
+    value = getattr(value, "pk", value)
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _split_rows(rows, known_ids):
+    """
+    Splits (id, ingredient_id, quantity) rows into three arrays, dropping
+    rows whose id is not in known_ids.
+    """
+    rows = list(rows)
+    ids = np.fromiter(map(itemgetter(0), rows), dtype=np.int64, count=len(rows))
+    ingredient_ids = np.fromiter(
+        map(itemgetter(1), rows), dtype=np.int64, count=len(rows)
+    )
+    quantities = to_units(map(itemgetter(2), rows))
+    known = np.isin(ids, known_ids)
+    return ids[known], ingredient_ids[known], quantities[known]
+
+
+def _sum_cells(row_index, column_index, values, columns):
+    """
+    Sums values that land in the same cell and returns the cells sorted by
+    row and column.
+    """
+    cells, inverse = np.unique(row_index * columns + column_index, return_inverse=True)
+    sums = np.bincount(inverse, weights=values, minlength=cells.size)
+    return cells // columns, cells % columns, sums.astype(np.int64)
+
+
+def build_availability_matrix(branch_ids=None, item_ids=None):
+    """
+    Loads compositions and branch stock and builds the availability matrix.
+
+    Pass branch_ids to restrict the stock that is loaded to those branches
+    and item_ids to evaluate only those items.
+    """
+    if branch_ids is None:
+        branch_ids = Branch.objects.values_list("id", flat=True)
+    branch_ids = [
+        branch_id for branch_id in map(_to_id, branch_ids) if branch_id is not None
+    ]
+    items = Item.objects.all()
+    compositions = Composition.objects.filter(
+        item__isnull=False, ingredient__isnull=False
+    )
+    stock = AvailableAtTheBranch.objects.filter(
+        branch_id__in=branch_ids, ingredient__isnull=False
+    )
+    if item_ids is not None:
+        items = items.filter(id__in=item_ids)
+        compositions = compositions.filter(item_id__in=item_ids)
+        stock = stock.filter(ingredient_id__in=compositions.values("ingredient_id"))
+    return AvailabilityMatrix.from_rows(
+        items.values_list("id", flat=True),
+        branch_ids,
+        compositions.values_list("item_id", "ingredient_id", "quantity"),
+        stock.values_list("branch_id", "ingredient_id", "quantity"),
+    )
+
+
+# ============================================================
+# Incremental updates
+# ============================================================
+def get_reverse_index():
+    """
+    Returns the ingredient_id -> item ids index built from compositions.
+
+    The index is built under its lock, so an invalidation after a commit
+    waits for a build that may have read the compositions before it.
+    """
+    index = cache.get(REVERSE_INDEX_KEY)
+    if index is not None:
+        return index
+    with cache_lock(REVERSE_INDEX_LOCK_KEY) as locked:
+        index = cache.get(REVERSE_INDEX_KEY)
+        if index is None:
+            index = {}
+            for item_id, ingredient_id in Composition.objects.filter(
+                item__isnull=False, ingredient__isnull=False
+            ).values_list("item_id", "ingredient_id"):
+                index.setdefault(ingredient_id, set()).add(item_id)
+            if locked:
+                cache.set(REVERSE_INDEX_KEY, index, AVAILABILITY_TIMEOUT)
+    return index
+
+
+def invalidate_reverse_index():
+    """
+    Drops the reverse index now and once more after the transaction commits,
+    so it is not rebuilt from compositions that are about to change.
+    """
+    cache.delete(REVERSE_INDEX_KEY)
+
+    def invalidate_reverse_index_after_commit():
+        with cache_lock(REVERSE_INDEX_LOCK_KEY):
+            cache.delete(REVERSE_INDEX_KEY)
+
+    transaction.on_commit(invalidate_reverse_index_after_commit, robust=True)
+
+
+def get_available_item_ids(branch_id):
+    """
+    Returns the maintained set of ids of the items available at the branch.
+    """
+    key = BRANCH_STATE_KEY.format(branch_id=branch_id)
+    available = cache.get(key)
+    if available is not None:
+        return available
+    with cache_lock(BRANCH_LOCK_KEY.format(branch_id=branch_id)) as locked:
+        available = cache.get(key)
+        if available is None:
+            availability = build_availability_matrix([branch_id])
+            available = set(availability.available_item_ids(branch_id))
+            if locked:
+                cache.set(key, available, AVAILABILITY_TIMEOUT)
+    return available
+
+
+def update_availability(branch_ids=None, ingredient_ids=(), item_ids=()):
+    """
+    Re-evaluates only the items affected by a change and flips their state.
+
+    The affected items are item_ids plus the items that use any of
+    ingredient_ids. Returns {branch_id: (became_available, became_unavailable)}
+    for the branches whose state changed and publishes both sets to the
+    menu_{branch_id} group. Branches without a maintained state are skipped,
+    their state is built from scratch on the next read.
+
+    The states are read, re-evaluated and written under the locks of their
+    branches, taken in id order, so concurrent updates do not lose each
+    other's flips. A branch whose lock is not acquired loses its state.
+    """
+    if branch_ids is None:
+        branch_ids = Branch.objects.values_list("id", flat=True)
+    keys = {
+        branch_id: BRANCH_STATE_KEY.format(branch_id=branch_id)
+        for branch_id in sorted(set(map(_to_id, branch_ids)))
+    }
+    maintained = cache.get_many(list(keys.values()))
+    keys = {branch_id: key for branch_id, key in keys.items() if key in maintained}
+    if not keys:
+        return {}
+
+    affected = set(item_ids)
+    if ingredient_ids:
+        index = get_reverse_index()
+        for ingredient_id in ingredient_ids:
+            affected |= index.get(ingredient_id, set())
+    if not affected:
+        return {}
+
+    changes = {}
+    with ExitStack() as stack:
+        for branch_id, key in list(keys.items()):
+            lock = cache_lock(BRANCH_LOCK_KEY.format(branch_id=branch_id))
+            if not stack.enter_context(lock):
+                cache.delete(key)
+                del keys[branch_id]
+        states = cache.get_many(list(keys.values()))
+        branch_ids = [branch_id for branch_id, key in keys.items() if key in states]
+        if not branch_ids:
+            return {}
+        availability = build_availability_matrix(branch_ids, affected)
+        for branch_id in branch_ids:
+            state = states[keys[branch_id]]
+            available = set(availability.available_item_ids(branch_id))
+            became_available = available - state
+            became_unavailable = (affected - available) & state
+            if not became_available and not became_unavailable:
+                continue
+            cache.set(
+                keys[branch_id],
+                (state - became_unavailable) | became_available,
+                AVAILABILITY_TIMEOUT,
+            )
+            changes[branch_id] = (became_available, became_unavailable)
+
+    for branch_id, (became_available, became_unavailable) in changes.items():
+        publish_event(
+            f"menu_{branch_id}",
+            "get_availability",
+            available=sorted(became_available),
+            unavailable=sorted(became_unavailable),
+        )
+    return changes
+
+
+def update_availability_on_commit(branch_ids=None, ingredient_ids=(), item_ids=()):
+    """
+    Runs update_availability once the current transaction commits.
+
+    The callback is robust: the transaction is already committed, so a
+    failure is logged instead of being raised to the caller.
+    """
+    ingredient_ids = tuple(ingredient_ids)
+    item_ids = tuple(item_ids)
+
+    def update_availability_after_commit():
+        update_availability(branch_ids, ingredient_ids, item_ids)
+
+    transaction.on_commit(update_availability_after_commit, robust=True)
@@ -0,0 +1,156 @@
+"""
+Module for batched cart feasibility checks.
+"""
+from collections import defaultdict
+
+from apps.storage.models import (
+    AvailableAtTheBranch,
+    Composition,
+    Item,
+    ReadyMadeProduct,
+    ReadyMadeProductAvailableAtTheBranch,
+)
+from utils.stock import decrement_ingredients, decrement_ready_made_products
+
+
+class CartCheck:
+    """
+    Result of checking a cart against branch stock.
+
+    Lines are allocated greedily in cart order, so a line is short when
+    the stock left after the lines before it does not cover it. Every line
+    is a dict with index, item_id, is_ready_made_product, quantity and the
+    instance of the item or ready made product (None if it does not exist).
+    """
+
+    def __init__(self, branch_id, lines, ingredient_stock, product_stock):
+        self.branch_id = branch_id
+        self.available_lines = []
+        self.short_lines = []
+        self._ingredient_stock = ingredient_stock
+        self._product_stock = product_stock
+        self._ingredient_demand = defaultdict(int)
+        self._product_demand = defaultdict(int)
+        for line in lines:
+            if self._allocate(line):
+                self.available_lines.append(line)
+            else:
+                self.short_lines.append(line)
+
+    @property
+    def is_feasible(self):
+        """
+        Checks if every line of the cart can be made.
+        """
+        return not self.short_lines
+
+    def _allocate(self, line):
+        """
+        Reserves the demand of the line if the remaining stock covers it.
+        """
+        if line["instance"] is None or line["quantity"] <= 0:
+            return False
+        if line["is_ready_made_product"]:
+            product_id = line["item_id"]
+            demand = self._product_demand[product_id] + line["quantity"]
+            if demand > _total(self._product_stock.get(product_id, [])):
+                return False
+            self._product_demand[product_id] = demand
+            return True
+
+        demand = {}
+        for ingredient_id, quantity in line["compositions"]:
+            demand[ingredient_id] = (
+                demand.get(ingredient_id, self._ingredient_demand[ingredient_id])
+                + quantity * line["quantity"]
+            )
+        for ingredient_id, quantity in demand.items():
+            if quantity > _total(self._ingredient_stock.get(ingredient_id, [])):
+                return False
+        self._ingredient_demand.update(demand)
+        return True
+
+    def reserve(self):
+        """
+        Writes off the stock of the available lines with one conditional
+        update per stock table.
+        """
+        decrement_ingredients(self.branch_id, self._ingredient_demand)
+        decrement_ready_made_products(self.branch_id, self._product_demand)
+
+
+def check_cart(items, branch_id, lock=False):
+    """
+    Checks which lines of the cart can be made at the branch.
+
+    items is the list of {"item_id", "is_ready_made_product", "quantity"}
+    dicts that create_order receives. The check runs a fixed number of
+    queries regardless of the size of the cart. Pass lock=True inside a
+    transaction to lock the stock rows, in key order, until it is committed.
+    """
+    lines = [
+        {
+            "index": index,
+            "item_id": int(item["item_id"]),
+            "is_ready_made_product": bool(item["is_ready_made_product"]),
+            "quantity": int(item["quantity"]),
+            "instance": None,
+            "compositions": [],
+        }
+        for index, item in enumerate(items)
+    ]
+    item_ids = {line["item_id"] for line in lines if not line["is_ready_made_product"]}
+    product_ids = {line["item_id"] for line in lines if line["is_ready_made_product"]}
+
+    items_by_id = Item.objects.in_bulk(item_ids) if item_ids else {}
+    products_by_id = (
+        ReadyMadeProduct.objects.in_bulk(product_ids) if product_ids else {}
+    )
+
+    compositions = defaultdict(list)
+    if items_by_id:
+        for item_id, ingredient_id, quantity in Composition.objects.filter(
+            item_id__in=items_by_id, ingredient__isnull=False
+        ).values_list("item_id", "ingredient_id", "quantity"):
+            compositions[item_id].append((ingredient_id, quantity))
+
+    ingredient_stock = defaultdict(list)
+    ingredient_ids = {
+        ingredient_id
+        for item_compositions in compositions.values()
+        for ingredient_id, _ in item_compositions
+    }
+    if ingredient_ids:
+        stock = AvailableAtTheBranch.objects.filter(
+            branch_id=branch_id, ingredient_id__in=ingredient_ids
+        ).order_by("ingredient_id")
+        if lock:
+            stock = stock.select_for_update()
+        for available in stock:
+            ingredient_stock[available.ingredient_id].append(available)
+
+    product_stock = defaultdict(list)
+    if products_by_id:
+        stock = ReadyMadeProductAvailableAtTheBranch.objects.filter(
+            branch_id=branch_id, ready_made_product_id__in=products_by_id
+        ).order_by("ready_made_product_id")
+        if lock:
+            stock = stock.select_for_update()
+        for available in stock:
+            product_stock[available.ready_made_product_id].append(available)
+
+    for line in lines:
+        if line["is_ready_made_product"]:
+            line["instance"] = products_by_id.get(line["item_id"])
+        else:
+            line["instance"] = items_by_id.get(line["item_id"])
+            line["compositions"] = compositions[line["item_id"]]
+
+    return CartCheck(branch_id, lines, ingredient_stock, product_stock)
+
+
+def _total(rows):
+    """
+    Returns the total quantity of the stock rows.
+    """
+    return sum(row.quantity for row in rows)
@@ -0,0 +1,192 @@
+"""
+Module for coalescing background task requests.
+
+Signals request a task with the keys it has to process. The first request
+schedules one run after the coalescing window, and every request that
+comes while the run is pending only adds its keys. The run receives the
+union of the keys of all the requests it replaces. Requests and keys are
+kept in the shared cache, so every web and worker process shares them.
+
+Every request gets a number from an atomic counter and stores its keys
+under that number, so concurrent requests never overwrite each other. A
+run claims the requests up to the counter under the claim lock of the
+task, so two runs never take the same requests; a request that is
+missing when it is claimed makes the run process everything.
+"""
+import time
+
+from celery import current_app, shared_task
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from utils.locks import cache_lock
+
+
+SEQUENCE_KEY = "dispatch:{name}:sequence"
+DONE_KEY = "dispatch:{name}:done"
+REQUEST_KEY = "dispatch:{name}:request:{number}"
+SCHEDULED_KEY = "dispatch:{name}:scheduled"
+CLAIM_KEY = "dispatch:{name}:claim"
+STATS_KEY = "dispatch:{name}:{counter}"
+STATS_COUNTERS = ("triggers", "runs", "coalesced")
+REQUEST_TIMEOUT = 60 * 60
+MAX_REQUESTS = 10000
+
+
+def dispatch(task, keys=None, window=None):
+    """
+    Requests a coalesced run of the task.
+
+    keys are the ids the run has to process. A request without keys makes
+    the run process everything, and the task is then called without
+    arguments; otherwise it is called with the sorted union of the keys.
+    """
+    name = task.name
+    if window is None:
+        window = settings.TASK_COALESCE_WINDOW
+    number = _next_request(name)
+    cache.set(
+        REQUEST_KEY.format(name=name, number=number),
+        None if keys is None else list(keys),
+        REQUEST_TIMEOUT,
+    )
+    _count(name, "triggers")
+    # The flag outlives the window a little, so a lost run is rescheduled
+    # by the next request instead of blocking the task for good.
+    if cache.add(SCHEDULED_KEY.format(name=name), 1, timeout=window + 60):
+        run_coalesced_task.apply_async(args=[name], countdown=window)
+    else:
+        _count(name, "coalesced")
+
+
+def dispatch_on_commit(task, keys=None, window=None):
+    """
+    Requests a coalesced run of the task once the transaction commits.
+    """
+    keys = None if keys is None else list(keys)
+
+    def dispatch_after_commit():
+        dispatch(task, keys, window)
+
+    transaction.on_commit(dispatch_after_commit, robust=True)
+
+
+def claim_requests(name):
+    """
+    Takes the requests that were made since the previous run.
+
+    Returns (pending, keys): keys is None if any request asked to process
+    everything, some requests were evicted from the cache or the claim lock
+    was not acquired.
+    """
+    cache.delete(SCHEDULED_KEY.format(name=name))
+    with cache_lock(CLAIM_KEY.format(name=name)) as locked:
+        if not locked:
+            return True, None
+        return _claim(name)
+
+
+def _claim(name):
+    """
+    Advances the done mark to the counter and takes the requests up to it.
+    """
+    sequence_key = SEQUENCE_KEY.format(name=name)
+    done_key = DONE_KEY.format(name=name)
+    counters = cache.get_many([sequence_key, done_key])
+    sequence = counters.get(sequence_key)
+    done = counters.get(done_key)
+    if sequence is None:
+        return True, None
+    if done is not None and done >= sequence:
+        return False, []
+    cache.set(done_key, sequence, timeout=None)
+    if done is None or sequence - done > MAX_REQUESTS:
+        return True, None
+
+    request_keys = [
+        REQUEST_KEY.format(name=name, number=number)
+        for number in range(done + 1, sequence + 1)
+    ]
+    requests = cache.get_many(request_keys)
+    cache.delete_many(request_keys)
+    if len(requests) != len(request_keys):
+        return True, None
+    keys = set()
+    for request in requests.values():
+        if request is None:
+            return True, None
+        keys.update(request)
+    return True, sorted(keys)
+
+
+@shared_task
+def run_coalesced_task(name):
+    """
+    Runs the task once for all the requests made since the previous run.
+    """
+    pending, keys = claim_requests(name)
+    if not pending:
+        return
+    _count(name, "runs")
+    task = current_app.tasks[name]
+    if keys is None:
+        return task()
+    return task(keys)
+
+
+def _next_request(name):
+    """
+    Returns the number of a new request.
+
+    A missing sequence starts from the current time in milliseconds. The
+    requests made before it was evicted are lost, so the done mark is
+    dropped as well and the next run processes everything.
+    """
+    key = SEQUENCE_KEY.format(name=name)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        if cache.add(key, int(time.time() * 1000), timeout=None):
+            cache.delete(DONE_KEY.format(name=name))
+        return cache.incr(key)
+
+
+def _count(name, counter):
+    """
+    Increments a dispatch counter.
+    """
+    key = STATS_KEY.format(name=name, counter=counter)
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 1, timeout=None)
+
+
+def get_dispatch_stats(task):
+    """
+    Returns request, run and coalesced request counters of the task.
+    """
+    keys = {
+        counter: STATS_KEY.format(name=task.name, counter=counter)
+        for counter in STATS_COUNTERS
+    }
+    values = cache.get_many(list(keys.values()))
+    stats = {counter: values.get(key, 0) for counter, key in keys.items()}
+    stats["coalesce_rate"] = (
+        round(stats["coalesced"] / stats["triggers"], 4) if stats["triggers"] else 0.0
+    )
+    return stats
+
+
+def reset_dispatch_stats(task):
+    """
+    Resets dispatch counters of the task.
+    """
+    cache.delete_many(
+        [
+            STATS_KEY.format(name=task.name, counter=counter)
+            for counter in STATS_COUNTERS
+        ]
+    )
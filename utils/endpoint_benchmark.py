@@ -0,0 +1,447 @@
+"""
+Module for the endpoint benchmark.
+
+run_benchmark requests every url of the apps on a seeded dataset (see
+utils/load_data.py) and measures the query count, the SQL time and the wall
+time of each request. Every request runs in a transaction that is rolled
+back, so the endpoints that change data are measured on the same rows as the
+rest. compare checks the results against the baseline file: a request that
+makes more queries than its baseline or answers with another status is a
+regression, and so is a request that takes longer than its baseline times
+by more than the tolerance.
+"""
+import json
+import statistics
+from pathlib import Path
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.db import transaction
+from django.urls import get_resolver
+from django.urls.resolvers import URLResolver
+from rest_framework.test import APIClient
+
+from utils.load_data import PASSWORD
+from utils.profiling import profiling
+
+
+BASELINE_PATH = Path(__file__).with_name("endpoint_baseline.json")
+METHODS = ("get", "post", "put", "patch", "delete")
+# Urls that send SMS through Infobip.
+SKIPPED = {
+    "accounts/register/",
+    "accounts/resend-code/",
+    "accounts/resend-code-with-pre-token/",
+    "accounts/login/",
+    "accounts/login-for-client/",
+    "accounts/login-waiter/",
+}
+# User of the urls by prefix; the rest are requested by the client.
+USERS = {
+    "admin-panel/": "admin",
+    "branches/": "admin",
+    "notices/": "admin",
+    "web/": "barista",
+    "waiter/": "waiter",
+}
+
+
+def get_routes():
+    """
+    Returns {route: view} of the urls of the apps.
+    """
+
+    def walk(patterns, prefix):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                yield from walk(pattern.url_patterns, prefix + str(pattern.pattern))
+            else:
+                yield prefix + str(pattern.pattern), pattern.callback
+
+    routes = {}
+    for route, view in walk(get_resolver().url_patterns, ""):
+        if view.__module__.startswith("apps."):
+            routes.setdefault(route, view)
+    return routes
+
+
+def get_cases(samples):
+    """
+    Returns {route: case} of the requests that need a user, url arguments,
+    query parameters or data other than the defaults.
+    """
+    admin, barista, waiter = samples["admin"], samples["barista"], samples["waiter"]
+    client, branch = samples["client"], samples["branch"]
+    category, item = samples["category"], samples["item"]
+    ingredient = samples["ingredient"]
+    product = samples["ready_made_product"]
+    order = samples["order"]
+    workdays = [{"workday": 1, "start_time": "08:00", "end_time": "17:00"}]
+    return {
+        # Accounts
+        "accounts/confirm-phone-number/": {"data": {"code": "0000"}},
+        "accounts/birth-date/": {"data": {"birth_date": "2000-01-01"}},
+        "accounts/edit-profile/": {
+            "data": {
+                "first_name": client.first_name,
+                "phone_number": str(client.phone_number),
+                "birth_date": "2000-01-01",
+            }
+        },
+        "accounts/confirm-login/": {"user": None, "data": {"code": "0000"}},
+        "accounts/admin-login/": {
+            "user": None,
+            "data": {"username": admin.username, "password": PASSWORD},
+        },
+        "accounts/temporary-login/": {
+            "user": None,
+            "data": {"phone_number": str(client.phone_number)},
+        },
+        "accounts/temporary-login-waiter/": {
+            "user": None,
+            "data": {"username": waiter.username, "password": PASSWORD},
+        },
+        "accounts/my-schedule/": {"user": "waiter"},
+        "accounts/update-waiter-profile/": {
+            "user": "waiter",
+            "data": {"first_name": waiter.first_name},
+        },
+        # Admin panel
+        "admin-panel/categories/create/": {"data": {"name": "Benchmark"}},
+        "admin-panel/categories/destroy/<int:pk>/": {"kwargs": {"pk": category.id}},
+        "admin-panel/categories/update/<int:pk>/": {
+            "kwargs": {"pk": category.id},
+            "data": {"name": category.name},
+        },
+        "admin-panel/employees/create/": {
+            "data": {
+                "username": "benchmark",
+                "password": PASSWORD,
+                "first_name": "Benchmark",
+                "position": "barista",
+                "phone_number": "+996700999999",
+                "branch": branch.id,
+                "workdays": workdays,
+            }
+        },
+        "admin-panel/employees/<int:pk>/": {"kwargs": {"pk": barista.id}},
+        "admin-panel/employees/update/<int:pk>/": {
+            "kwargs": {"pk": barista.id},
+            "data": {
+                "username": barista.username,
+                "first_name": barista.first_name,
+                "position": barista.position,
+                "phone_number": str(barista.phone_number),
+                "branch": branch.id,
+            },
+        },
+        "admin-panel/employees/schedule/update/<int:pk>/": {
+            "kwargs": {"pk": barista.id},
+            "data": {"workdays": workdays},
+        },
+        "admin-panel/employees/destroy/<int:pk>/": {"kwargs": {"pk": waiter.id}},
+        "admin-panel/ingredients/create/": {
+            "data": {
+                "name": "Benchmark",
+                "measurement_unit": "g",
+                "available_at_branches": [
+                    {"branch": branch.id, "quantity": 1000, "minimal_limit": 100}
+                ],
+            }
+        },
+        "admin-panel/ingredients/update/<int:pk>/": {
+            "kwargs": {"pk": ingredient.id},
+            "data": {
+                "name": ingredient.name,
+                "measurement_unit": ingredient.measurement_unit,
+            },
+        },
+        "admin-panel/ingredients/<int:pk>/": {"kwargs": {"pk": ingredient.id}},
+        "admin-panel/ingredients/destroy/<int:pk>/": {"kwargs": {"pk": ingredient.id}},
+        "admin-panel/ingredient-quantity-update/<int:id>/": {
+            "kwargs": {"id": samples["available_at_the_branch"].id},
+            "data": {"quantity": 5000},
+        },
+        "admin-panel/ingredient-destroy-from-branch/<int:pk>/": {
+            "kwargs": {"pk": samples["available_at_the_branch"].id}
+        },
+        "admin-panel/ingredient-quantity-in-branch/<int:pk>/": {
+            "kwargs": {"pk": branch.id}
+        },
+        "admin-panel/low-stock-ingredient-branch/<int:pk>/": {
+            "kwargs": {"pk": branch.id}
+        },
+        "admin-panel/items/create/": {
+            "data": {
+                "category": category.id,
+                "name": "Benchmark",
+                "description": "Benchmark",
+                "price": "100.00",
+                "composition": [{"ingredient": ingredient.id, "quantity": 10}],
+            }
+        },
+        "admin-panel/items/<int:pk>/": {"kwargs": {"pk": item.id}},
+        "admin-panel/items/update/<int:pk>/": {
+            "kwargs": {"pk": item.id},
+            "data": {
+                "name": item.name,
+                "description": item.description,
+                "price": str(item.price),
+                "compositions": [{"ingredient": ingredient.id, "quantity": 10}],
+                "category_id": item.category_id,
+            },
+        },
+        "admin-panel/put-image-to-item/<int:pk>/": {"kwargs": {"pk": item.id}},
+        "admin-panel/items/destroy/<int:pk>/": {"kwargs": {"pk": item.id}},
+        "admin-panel/ready-made-products/create/": {
+            "data": {
+                "name": "Benchmark",
+                "description": "Benchmark",
+                "price": "100.00",
+                "category": category.id,
+                "available_at_branches": [
+                    {"branch": branch.id, "quantity": 10, "minimal_limit": 5}
+                ],
+            }
+        },
+        "admin-panel/ready-made-products/<int:pk>/": {"kwargs": {"pk": product.id}},
+        "admin-panel/ready-made-products/destroy/<int:pk>/": {
+            "kwargs": {"pk": product.id}
+        },
+        "admin-panel/ready-made-products/update/<int:pk>/": {
+            "kwargs": {"pk": product.id},
+            "data": {
+                "name": product.name,
+                "description": product.description,
+                "price": str(product.price),
+                "category": product.category_id,
+            },
+        },
+        "admin-panel/ready-made-products/quantity-update/<int:id>/": {
+            "kwargs": {"id": product.id},
+            "data": {"quantity": 10, "minimal_limit": 5},
+        },
+        "admin-panel/ready-made-products/put-image-to-item/<int:pk>/": {
+            "kwargs": {"pk": product.id}
+        },
+        # Branches
+        "branches/create/": {
+            "data": {
+                "name_of_shop": "Benchmark",
+                "address": "Benchmark",
+                "counts_of_tables": 10,
+                "phone_number": "+996312999999",
+                "link_to_map": "https://2gis.kg",
+                "workdays": workdays,
+            }
+        },
+        "branches/update/<int:id>/": {
+            "kwargs": {"id": branch.id},
+            "data": {
+                "name_of_shop": branch.name_of_shop,
+                "address": branch.address,
+                "phone_number": str(branch.phone_number),
+                "link_to_map": branch.link_to_map,
+                "counts_of_tables": branch.counts_of_tables,
+                "workdays": workdays,
+            },
+        },
+        "branches/delete/<int:id>/": {"kwargs": {"id": branch.id}},
+        "branches/image/<int:id>/": {"kwargs": {"id": branch.id}},
+        "branches/<int:id>/": {"kwargs": {"id": branch.id}},
+        "branches/schedule/update/<int:id>/": {
+            "kwargs": {"id": branch.id},
+            "data": {"workdays": workdays},
+        },
+        # Customers
+        "customers/menu": {"params": {"category_id": category.id}},
+        "customers/menu/<int:item_id>/": {
+            "kwargs": {"item_id": item.id},
+            "params": {"is_ready_made_product": "false"},
+        },
+        "customers/compatible-items/<int:item_id>/": {"kwargs": {"item_id": item.id}},
+        "customers/change-branch/": {"data": {"branch_id": branch.id}},
+        "customers/search/": {"params": {"query": "Item"}},
+        "customers/check-if-item-can-be-made/": {
+            "data": {"is_ready_made_product": False, "item_id": item.id, "quantity": 1}
+        },
+        "customers/my-orders/<int:pk>/": {"kwargs": {"pk": order.id}},
+        # Ordering
+        "ordering/create-order/": {
+            "data": {
+                "items": [
+                    {"item_id": item.id, "is_ready_made_product": False, "quantity": 1}
+                ],
+                "total_price": str(item.price),
+                "in_an_institution": False,
+                "spent_bonus_points": 0,
+                "table_number": 0,
+            }
+        },
+        "ordering/reorder/": {"params": {"order_id": order.id}},
+        "ordering/reorder-information/": {"params": {"order_id": order.id}},
+        "ordering/add-item-to-order/": {
+            "params": {
+                "order_id": order.id,
+                "item_id": item.id,
+                "is_ready_made_product": "false",
+            }
+        },
+        "ordering/remove-order-item/": {
+            "params": {"order_item_id": samples["order_item"].id}
+        },
+        # Notices
+        "notices/delete-barista-notification/": {
+            "user": "barista",
+            "params": {"id": samples["barista_notification"].id},
+        },
+        "notices/delete-client-notification/": {
+            "user": "client",
+            "params": {"id": samples["client_notification"].id},
+        },
+        "notices/clear-waiter-notifications/": {
+            "user": "waiter",
+            "params": {"waiter_id": waiter.id},
+        },
+        "notices/delete-admin-notification/": {
+            "params": {"id": samples["admin_notification"].id}
+        },
+        "notices/delete-reminder/": {
+            "user": "barista",
+            "params": {"id": samples["reminder"].id},
+        },
+        # Web
+        "web/accept-order/": {"params": {"order_id": order.id}},
+        "web/complete-order/": {"params": {"order_id": order.id}},
+        "web/cancel-order/": {"params": {"order_id": order.id}},
+        "web/make-order-ready/": {"params": {"order_id": order.id}},
+        # Waiter
+        "waiter/get-table-detail/": {"params": {"table_number": samples["table"]}},
+    }
+
+
+def get_default_user(route):
+    """
+    Returns the user role of the url by its prefix.
+    """
+    for prefix, user in USERS.items():
+        if route.startswith(prefix):
+            return user
+    return "client"
+
+
+def get_path(route, kwargs):
+    """
+    Fills the url arguments of the route.
+    """
+    path = route
+    for name, value in kwargs.items():
+        path = path.replace(f"<int:{name}>", str(value))
+    return "/" + path
+
+
+def measure(client, method, path, params, data, repeat):
+    """
+    Requests the path repeat times, each in a rolled back transaction with an
+    empty cache, and returns the status, the largest query count and the
+    median SQL and wall times in milliseconds.
+    """
+    if method != "get" and params:
+        path = f"{path}?{urlencode(params)}"
+    statuses, counts, sql_times, wall_times = set(), [], [], []
+    for _ in range(repeat):
+        cache.clear()
+        with transaction.atomic():
+            with profiling() as profile:
+                if method == "get":
+                    response = client.get(path, params)
+                else:
+                    response = getattr(client, method)(path, data, format="json")
+            transaction.set_rollback(True)
+        statuses.add(response.status_code)
+        counts.append(profile.queries)
+        sql_times.append(profile.sql_ms)
+        wall_times.append(profile.view_ms)
+    return {
+        "status": max(statuses),
+        "queries": max(counts),
+        "sql_ms": round(statistics.median(sql_times), 2),
+        "wall_ms": round(statistics.median(wall_times), 2),
+    }
+
+
+def run_benchmark(samples, repeat=3):
+    """
+    Measures every url of the apps except SKIPPED and returns
+    {"METHOD route": measurement}.
+    """
+    cases = get_cases(samples)
+    clients = {None: APIClient(raise_request_exception=False)}
+    for user in ("admin", "barista", "waiter", "client"):
+        clients[user] = APIClient(raise_request_exception=False)
+        clients[user].force_authenticate(samples[user])
+
+    results = {}
+    for route, view in sorted(get_routes().items()):
+        if route in SKIPPED:
+            continue
+        case = cases.get(route, {})
+        method = case.get("method") or next(
+            method for method in METHODS if hasattr(view.cls, method)
+        )
+        results[f"{method.upper()} {route}"] = measure(
+            clients[case.get("user", get_default_user(route))],
+            method,
+            get_path(route, case.get("kwargs", {})),
+            case.get("params", {}),
+            case.get("data", {}),
+            repeat,
+        )
+    return results
+
+
+def compare(results, baseline, time_tolerance=1.0, slack_ms=5.0):
+    """
+    Returns the regressions of the results against the baseline endpoints.
+
+    A time regresses when it exceeds its baseline times 1 + time_tolerance
+    plus slack_ms, which absorbs the noise of fast requests.
+    """
+    regressions = []
+    for key, result in results.items():
+        expected = baseline.get(key)
+        if expected is None:
+            regressions.append(f"{key}: not in the baseline")
+            continue
+        if result["status"] != expected["status"]:
+            regressions.append(
+                f"{key}: status {result['status']}, baseline {expected['status']}"
+            )
+        if result["queries"] > expected["queries"]:
+            regressions.append(
+                f"{key}: {result['queries']} queries, budget {expected['queries']}"
+            )
+        for name in ("sql_ms", "wall_ms"):
+            budget = expected[name] * (1 + time_tolerance) + slack_ms
+            if result[name] > budget:
+                regressions.append(
+                    f"{key}: {name} {result[name]:.2f}, budget {budget:.2f}"
+                )
+    return regressions
+
+
+def load_baseline(path=BASELINE_PATH):
+    """
+    Reads the baseline file.
+    """
+    with open(path) as file:
+        return json.load(file)
+
+
+def save_baseline(results, dataset, path=BASELINE_PATH):
+    """
+    Writes the results and the dataset arguments they were measured on.
+    """
+    with open(path, "w") as file:
+        json.dump({"dataset": dataset, "endpoints": results}, file, indent=2)
+        file.write("\n")
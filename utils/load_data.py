@@ -0,0 +1,531 @@
+"""
+Module for synthetic datasets.
+
+seed_dataset fills an empty database with branches, a menu with stock,
+staff, customers and an order history drawn from a seeded random
+generator, so the same arguments give the same rows. Orders are spread
+over the days before the end time by weekday and hour of the day, and
+only the orders of the last OPEN_WINDOW are still open. Rows are written
+with bulk_create in batches, with the model signals muted and the
+automatic timestamps of orders turned off, so the history keeps its
+dates and millions of orders take minutes.
+
+offline_environment runs the benchmarks on a throwaway test database with
+tasks run eagerly, in-memory cache and channel layer and local menu search,
+so they need no worker, redis or Algolia.
+"""
+import random
+from contextlib import contextmanager
+from datetime import time, timedelta
+from decimal import Decimal
+
+from celery import current_app
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.db.models import signals
+from django.test.utils import (
+    override_settings,
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+from django.utils import timezone
+
+from apps.accounts.models import CustomUser, EmployeeSchedule, EmployeeWorkdays
+from apps.branches.models import Branch, Schedule, Workdays
+from apps.notices.models import (
+    AdminNotification,
+    BaristaNotification,
+    ClentNotification,
+    Reminder,
+)
+from apps.ordering.models import Order, OrderItem
+from apps.storage.models import (
+    AvailableAtTheBranch,
+    Category,
+    Composition,
+    Ingredient,
+    Item,
+    MinimalLimitReached,
+    ReadyMadeProduct,
+    ReadyMadeProductAvailableAtTheBranch,
+)
+
+
+# Share of orders by status: before OPEN_WINDOW orders are closed, within
+# it they are still served.
+CLOSED_STATUS_WEIGHTS = {"completed": 93, "canceled": 7}
+OPEN_STATUS_WEIGHTS = {"new": 40, "in_progress": 35, "ready": 25}
+OPEN_WINDOW = timedelta(minutes=90)
+# Share of orders by hour of the day and by weekday, Monday first.
+HOUR_WEIGHTS = {
+    8: 7,
+    9: 10,
+    10: 8,
+    11: 6,
+    12: 11,
+    13: 12,
+    14: 8,
+    15: 5,
+    16: 5,
+    17: 7,
+    18: 8,
+    19: 7,
+    20: 4,
+    21: 2,
+}
+WEEKDAY_WEIGHTS = [13, 13, 13, 14, 16, 17, 14]
+HOURS = list(HOUR_WEIGHTS)
+HOUR_WEIGHT_VALUES = list(HOUR_WEIGHTS.values())
+OPEN_STATUSES = list(OPEN_STATUS_WEIGHTS)
+OPEN_STATUS_WEIGHT_VALUES = list(OPEN_STATUS_WEIGHTS.values())
+CLOSED_STATUSES = list(CLOSED_STATUS_WEIGHTS)
+CLOSED_STATUS_WEIGHT_VALUES = list(CLOSED_STATUS_WEIGHTS.values())
+MEASUREMENT_UNITS = [unit for unit, _ in Ingredient.MEASUREMENT_CHOICES]
+# Password of the admin and the staff.
+PASSWORD = "neocafe-password"
+MUTED_SIGNALS = (
+    signals.pre_save,
+    signals.post_save,
+    signals.pre_delete,
+    signals.post_delete,
+    signals.m2m_changed,
+)
+
+
+@contextmanager
+def muted_signals():
+    """
+    Disconnects every receiver of the model signals until the block exits.
+    """
+    receivers = {signal: signal.receivers for signal in MUTED_SIGNALS}
+    try:
+        for signal in MUTED_SIGNALS:
+            signal.receivers = []
+            signal.sender_receivers_cache.clear()
+        yield
+    finally:
+        for signal, saved in receivers.items():
+            signal.receivers = saved
+            signal.sender_receivers_cache.clear()
+
+
+@contextmanager
+def offline_environment(database_name=None):
+    """
+    Creates a test database, named database_name instead of the default
+    one, and replaces the services that need redis, a worker or Algolia
+    until the block exits.
+    """
+    if database_name is not None:
+        connection.settings_dict["TEST"]["NAME"] = database_name
+    always_eager = current_app.conf.task_always_eager
+    current_app.conf.task_always_eager = True
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        with override_settings(
+            CACHES={
+                "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+            },
+            CHANNEL_LAYERS={
+                "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}
+            },
+            MENU_SEARCH_BACKEND="local",
+        ):
+            yield
+    finally:
+        teardown_databases(old_config, verbosity=0)
+        teardown_test_environment()
+        current_app.conf.task_always_eager = always_eager
+
+
+@contextmanager
+def raw_timestamps(model):
+    """
+    Turns off auto_now and auto_now_add of the model until the block exits,
+    so the timestamps of the created rows are saved as they are.
+    """
+    fields = [
+        (field, field.auto_now, field.auto_now_add)
+        for field in model._meta.concrete_fields
+        if getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False)
+    ]
+    try:
+        for field, _, _ in fields:
+            field.auto_now = field.auto_now_add = False
+        yield
+    finally:
+        for field, auto_now, auto_now_add in fields:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def seed_dataset(
+    branches=3,
+    categories=6,
+    items=60,
+    ready_made_products=15,
+    ingredients=40,
+    customers=200,
+    orders=3000,
+    days=90,
+    end=None,
+    seed=42,
+    batch_size=1000,
+    progress=None,
+):
+    """
+    Seeds the dataset and returns a dict of sample objects: the admin,
+    barista, waiter and client users, and a branch, category, ingredient,
+    item, ready made product, new order, table with an open order and
+    notifications of that branch.
+
+    Orders are created within days before end, the current time by default.
+    progress is called with the number of created orders after each batch.
+    """
+    rng = random.Random(seed)
+    end = end or timezone.now()
+    with transaction.atomic(), muted_signals(), raw_timestamps(Order):
+        # Branches
+        schedules = Schedule.objects.bulk_create(
+            Schedule(title=f"Branch schedule {n}") for n in range(branches)
+        )
+        Workdays.objects.bulk_create(
+            Workdays(
+                schedule=schedule,
+                workday=workday,
+                start_time=time(8),
+                end_time=time(22),
+            )
+            for schedule in schedules
+            for workday in range(1, 8)
+        )
+        branch_list = Branch.objects.bulk_create(
+            Branch(
+                schedule=schedule,
+                name_of_shop=f"NeoCafe {n}",
+                address=f"Address {n}",
+                phone_number=f"+99631200{n:04d}",
+                link_to_map="https://2gis.kg",
+                counts_of_tables=rng.randint(5, 20),
+            )
+            for n, schedule in enumerate(schedules)
+        )
+
+        # Menu
+        category_list = Category.objects.bulk_create(
+            Category(name=f"Category {n}") for n in range(categories)
+        )
+        ingredient_list = Ingredient.objects.bulk_create(
+            Ingredient(
+                name=f"Ingredient {n}", measurement_unit=rng.choice(MEASUREMENT_UNITS)
+            )
+            for n in range(ingredients)
+        )
+        item_list = Item.objects.bulk_create(
+            Item(
+                name=f"Item {n}",
+                category=rng.choice(category_list),
+                description=f"Description of item {n}",
+                price=Decimal(rng.randint(100, 450)),
+            )
+            for n in range(items)
+        )
+        Composition.objects.bulk_create(
+            (
+                Composition(
+                    item=item,
+                    ingredient=ingredient,
+                    quantity=Decimal(rng.randint(5, 200)),
+                )
+                for item in item_list
+                for ingredient in rng.sample(ingredient_list, rng.randint(2, 5))
+            ),
+            batch_size=batch_size,
+        )
+        product_list = ReadyMadeProduct.objects.bulk_create(
+            ReadyMadeProduct(
+                name=f"Product {n}",
+                category=rng.choice(category_list),
+                description=f"Description of product {n}",
+                price=Decimal(rng.randint(80, 300)),
+            )
+            for n in range(ready_made_products)
+        )
+
+        # Stock
+        AvailableAtTheBranch.objects.bulk_create(
+            (
+                AvailableAtTheBranch(
+                    branch=branch,
+                    ingredient=ingredient,
+                    quantity=Decimal(rng.randint(1000, 100000)),
+                )
+                for branch in branch_list
+                for ingredient in ingredient_list
+            ),
+            batch_size=batch_size,
+        )
+        ReadyMadeProductAvailableAtTheBranch.objects.bulk_create(
+            (
+                ReadyMadeProductAvailableAtTheBranch(
+                    branch=branch,
+                    ready_made_product=product,
+                    quantity=Decimal(rng.randint(0, 100)),
+                )
+                for branch in branch_list
+                for product in product_list
+            ),
+            batch_size=batch_size,
+        )
+        MinimalLimitReached.objects.bulk_create(
+            (
+                MinimalLimitReached(
+                    branch=branch, quantity=Decimal(500), **{key: value}
+                )
+                for branch in branch_list
+                for key, values in (
+                    ("ingredient", ingredient_list),
+                    ("ready_made_product", product_list),
+                )
+                for value in values
+            ),
+            batch_size=batch_size,
+        )
+
+        # Users
+        password = make_password(PASSWORD)
+        (employee_schedule,) = EmployeeSchedule.objects.bulk_create(
+            [EmployeeSchedule(title="Staff schedule")]
+        )
+        EmployeeWorkdays.objects.bulk_create(
+            EmployeeWorkdays(
+                schedule=employee_schedule,
+                workday=workday,
+                start_time=time(8),
+                end_time=time(17),
+            )
+            for workday in range(1, 6)
+        )
+        (admin,) = CustomUser.objects.bulk_create(
+            [
+                CustomUser(
+                    phone_number="+996700000000",
+                    username="admin",
+                    password=password,
+                    first_name="Admin",
+                    is_staff=True,
+                    is_superuser=True,
+                )
+            ]
+        )
+        staff = CustomUser.objects.bulk_create(
+            CustomUser(
+                phone_number=f"+9967001{n:05d}",
+                username=f"{position}{branch.id}",
+                password=password,
+                first_name=position.title(),
+                position=position,
+                branch=branch,
+                schedule=employee_schedule,
+            )
+            for n, (branch, position) in enumerate(
+                (branch, position)
+                for branch in branch_list
+                for position in ("barista", "waiter")
+            )
+        )
+        clients = []
+        for start in range(0, customers, batch_size):
+            clients.extend(
+                (client.id, client.branch_id)
+                for client in CustomUser.objects.bulk_create(
+                    CustomUser(
+                        phone_number=f"+996{500000000 + n}",
+                        first_name=f"Client {n}",
+                        branch=rng.choice(branch_list),
+                        bonus=rng.randint(0, 500),
+                        is_verified=True,
+                    )
+                    for n in range(start, min(start + batch_size, customers))
+                )
+            )
+
+        # Orders
+        day_list = _get_days(end, days)
+        day_weights = [WEEKDAY_WEIGHTS[day.weekday()] for day in day_list]
+        open_tables = set()
+        for start in range(0, orders, batch_size):
+            order_list, lines = [], []
+            for _ in range(start, min(start + batch_size, orders)):
+                order, order_lines = _get_order(
+                    rng,
+                    rng.choice(branch_list),
+                    rng.choice(clients)[0],
+                    _get_created_at(rng, day_list, day_weights, end),
+                    end,
+                    open_tables,
+                    item_list,
+                    product_list,
+                )
+                order_list.append(order)
+                lines.append(order_lines)
+            Order.objects.bulk_create(order_list)
+            OrderItem.objects.bulk_create(
+                OrderItem(
+                    order_id=order.id,
+                    item_id=item_id,
+                    ready_made_product_id=product_id,
+                    quantity=quantity,
+                    created_at=order.created_at,
+                )
+                for order, order_lines in zip(order_list, lines)
+                for item_id, product_id, quantity in order_lines
+            )
+            if progress is not None:
+                progress(start + len(order_list))
+
+        # Samples
+        branch = branch_list[0]
+        client = CustomUser.objects.get(
+            id=next(
+                client_id for client_id, branch_id in clients if branch_id == branch.id
+            )
+        )
+        (order,) = Order.objects.bulk_create(
+            [
+                Order(
+                    branch=branch,
+                    customer=client,
+                    status="new",
+                    total_price=item_list[0].price,
+                    created_at=end,
+                    updated_at=end,
+                )
+            ]
+        )
+        (order_item,) = OrderItem.objects.bulk_create(
+            [OrderItem(order=order, item=item_list[0], quantity=1)]
+        )
+        samples = {
+            "admin": admin,
+            "barista": staff[0],
+            "waiter": staff[1],
+            "client": client,
+            "branch": branch,
+            "category": category_list[0],
+            "ingredient": ingredient_list[0],
+            "item": item_list[0],
+            "ready_made_product": product_list[0],
+            "available_at_the_branch": AvailableAtTheBranch.objects.get(
+                branch=branch, ingredient=ingredient_list[0]
+            ),
+            "order": order,
+            "table": min(
+                (table for branch_id, table in open_tables if branch_id == branch.id),
+                default=1,
+            ),
+            "order_item": order_item,
+        }
+        for name, notification in [
+            (
+                "barista_notification",
+                BaristaNotification(
+                    branch=branch,
+                    order_id=str(order.id),
+                    title="Новый заказ",
+                    body="Test",
+                ),
+            ),
+            (
+                "client_notification",
+                ClentNotification(
+                    client_id=str(client.id), title="Заказ готов", body="Test"
+                ),
+            ),
+            (
+                "admin_notification",
+                AdminNotification(branch=branch, title="Running out of", text="Test"),
+            ),
+            ("reminder", Reminder(branch=branch, content="Test")),
+        ]:
+            (samples[name],) = type(notification).objects.bulk_create([notification])
+        return samples
+
+
+def _get_days(end, days):
+    """
+    Returns the midnights of the day of end and of the days before it.
+    """
+    midnight = timezone.localtime(end).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+    return [midnight - timedelta(days=number) for number in range(days)]
+
+
+def _get_created_at(rng, days, day_weights, end):
+    """
+    Draws a creation time by weekday and hour of the day. A time after end
+    is moved to the day before.
+    """
+    created_at = rng.choices(days, day_weights)[0] + timedelta(
+        hours=rng.choices(HOURS, HOUR_WEIGHT_VALUES)[0],
+        seconds=rng.randrange(3600),
+    )
+    if created_at > end:
+        created_at -= timedelta(days=1)
+    return created_at
+
+
+def _get_order(
+    rng, branch, customer_id, created_at, end, open_tables, item_list, product_list
+):
+    """
+    Returns an unsaved order and its (item_id, ready_made_product_id,
+    quantity) lines. A table has at most one open order.
+    """
+    if created_at > end - OPEN_WINDOW:
+        status = rng.choices(OPEN_STATUSES, OPEN_STATUS_WEIGHT_VALUES)[0]
+    else:
+        status = rng.choices(CLOSED_STATUSES, CLOSED_STATUS_WEIGHT_VALUES)[0]
+    in_an_institution = rng.random() < 0.4
+    table = None
+    if in_an_institution:
+        table = rng.randint(1, branch.counts_of_tables)
+        if status in OPEN_STATUSES:
+            if (branch.id, table) in open_tables:
+                status = "completed"
+            open_tables.add((branch.id, table))
+
+    lines = []
+    total_price = Decimal(0)
+    for _ in range(rng.randint(1, 4)):
+        quantity = rng.randint(1, 2)
+        if rng.random() < 0.8:
+            item = rng.choice(item_list)
+            lines.append((item.id, None, quantity))
+            total_price += item.price * quantity
+        else:
+            product = rng.choice(product_list)
+            lines.append((None, product.id, quantity))
+            total_price += product.price * quantity
+
+    completed_at = cancelled_at = None
+    if status == "completed":
+        completed_at = min(end, created_at + timedelta(minutes=rng.randint(5, 30)))
+    elif status == "canceled":
+        cancelled_at = min(end, created_at + timedelta(minutes=rng.randint(1, 10)))
+    order = Order(
+        branch_id=branch.id,
+        customer_id=customer_id,
+        status=status,
+        table=table,
+        in_an_institution=in_an_institution,
+        total_price=total_price,
+        created_at=created_at,
+        updated_at=completed_at or cancelled_at or created_at,
+        completed_at=completed_at,
+        cancelled_at=cancelled_at,
+    )
+    return order, lines
@@ -0,0 +1,525 @@
+"""
+Module for the load test of the ASGI application.
+
+run_load_test drives config.asgi:application with simulated users of a
+seeded dataset (see utils/load_data.py) during a lunch rush. Customers
+browse the menu, search and create orders; baristas watch the new order
+boards over websockets and accept, ready and complete the orders; waiters
+poll the tables. Requests go straight to the application in this process,
+or over HTTP and websockets to a uvicorn server started in the same event
+loop. Every request is recorded by endpoint, so the report has the
+throughput, latency percentiles and error rates of each one.
+"""
+import asyncio
+import json
+import math
+import random
+import time
+from collections import deque
+from urllib.parse import urlencode
+
+import aiohttp
+import uvicorn
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.accounts.models import CustomUser
+from apps.storage.models import Item
+
+
+BOARDS = ("new-orders-takeaway", "new-orders-institution")
+SEARCH_QUERIES = ("Item", "Product", "Item 1", "Itme", "Prod")
+# Label of the time from creating an order to seeing it on a board.
+ORDER_TO_BOARD = "WS order on the board"
+
+
+class ASGIClient:
+    """
+    Client that calls the ASGI application in this process.
+    """
+
+    def __init__(self, application):
+        self.application = application
+
+    async def request(self, method, path, params=None, data=None, token=None):
+        """
+        Sends a request and returns the status and the decoded JSON body.
+        """
+        body = json.dumps(data).encode() if data is not None else b""
+        headers = [
+            (b"host", b"testserver"),
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ]
+        if token:
+            headers.append((b"authorization", f"Bearer {token}".encode()))
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": urlencode(params or {}).encode(),
+            "root_path": "",
+            "headers": headers,
+            "client": ("127.0.0.1", 0),
+            "server": ("testserver", 80),
+        }
+        sent = asyncio.Event()
+        messages = [{"type": "http.request", "body": body, "more_body": False}]
+        response = {"status": None, "body": b""}
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            await sent.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["body"] += message.get("body", b"")
+                if not message.get("more_body"):
+                    sent.set()
+
+        await self.application(scope, receive, send)
+        return response["status"], _decode(response["body"])
+
+    async def connect(self, path):
+        """
+        Opens a websocket.
+        """
+        websocket = ASGIWebsocket(self.application, path)
+        await websocket.connect()
+        return websocket
+
+    async def close(self):
+        pass
+
+
+class ASGIWebsocket:
+    """
+    Websocket of the ASGI application in this process.
+    """
+
+    def __init__(self, application, path):
+        self.incoming = asyncio.Queue()
+        self.outgoing = asyncio.Queue()
+        scope = {
+            "type": "websocket",
+            "asgi": {"version": "3.0"},
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": b"",
+            "root_path": "",
+            "headers": [(b"host", b"testserver")],
+            "client": ("127.0.0.1", 0),
+            "server": ("testserver", 80),
+            "subprotocols": [],
+        }
+        self.task = asyncio.ensure_future(
+            application(scope, self.incoming.get, self.outgoing.put)
+        )
+
+    async def connect(self):
+        await self.incoming.put({"type": "websocket.connect"})
+        message = await self.outgoing.get()
+        if message["type"] != "websocket.accept":
+            raise ConnectionError(f"Websocket refused: {message}")
+
+    async def receive_json(self):
+        """
+        Waits for the next message.
+        """
+        while True:
+            message = await self.outgoing.get()
+            if message["type"] == "websocket.close":
+                raise ConnectionError("Websocket closed")
+            if message.get("text") is not None:
+                return json.loads(message["text"])
+
+    async def close(self):
+        await self.incoming.put({"type": "websocket.disconnect", "code": 1000})
+        try:
+            await asyncio.wait_for(self.task, 5)
+        except asyncio.TimeoutError:
+            self.task.cancel()
+
+
+class HTTPClient:
+    """
+    Client that talks to a server over HTTP and websockets.
+    """
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.session = aiohttp.ClientSession()
+
+    async def request(self, method, path, params=None, data=None, token=None):
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        async with self.session.request(
+            method,
+            self.base_url + path,
+            params=params,
+            json=data,
+            headers=headers,
+        ) as response:
+            return response.status, _decode(await response.read())
+
+    async def connect(self, path):
+        websocket = await self.session.ws_connect(
+            self.base_url.replace("http", "ws", 1) + path
+        )
+        return HTTPWebsocket(websocket)
+
+    async def close(self):
+        await self.session.close()
+
+
+class HTTPWebsocket:
+    """
+    Websocket of a server.
+    """
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+
+    async def receive_json(self):
+        message = await self.websocket.receive()
+        if message.type != aiohttp.WSMsgType.TEXT:
+            raise ConnectionError("Websocket closed")
+        return json.loads(message.data)
+
+    async def close(self):
+        await self.websocket.close()
+
+
+class Recorder:
+    """
+    Collects the latency and the status of every request by endpoint.
+    """
+
+    def __init__(self):
+        self.latencies = {}
+        self.statuses = {}
+        # Creation times of the orders not yet on a board by phone number.
+        self.created = {}
+
+    def record(self, label, latency, status):
+        """
+        Records a request; status is None for a failed connection.
+        """
+        self.latencies.setdefault(label, []).append(latency)
+        counts = self.statuses.setdefault(label, {})
+        counts[status] = counts.get(status, 0) + 1
+
+    async def request(self, client, label, method, path, **kwargs):
+        """
+        Sends and records a request. Returns the status and the body, or
+        None and None if the request failed.
+        """
+        started = time.perf_counter()
+        try:
+            status, body = await client.request(method, path, **kwargs)
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError):
+            status, body = None, None
+        self.record(label, time.perf_counter() - started, status)
+        return status, body
+
+    def report(self, duration):
+        """
+        Returns {label: stats} with the requests per second, the latency
+        percentiles in milliseconds and the shares of 4xx and failed
+        requests; failed are 5xx and requests without a response.
+        """
+        report = {}
+        for label, latencies in sorted(self.latencies.items()):
+            latencies = sorted(latencies)
+            counts = self.statuses[label]
+            requests = len(latencies)
+            rejected = sum(
+                number
+                for status, number in counts.items()
+                if status is not None and 400 <= status < 500
+            )
+            failed = sum(
+                number
+                for status, number in counts.items()
+                if status is None or status >= 500
+            )
+
+            def percentile(value):
+                index = min(requests - 1, math.ceil(requests * value) - 1)
+                return round(latencies[index] * 1000, 2)
+
+            report[label] = {
+                "requests": requests,
+                "rps": round(requests / duration, 2),
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "p99": percentile(0.99),
+                "max": round(latencies[-1] * 1000, 2),
+                "rejected": round(rejected / requests, 4),
+                "errors": round(failed / requests, 4),
+            }
+        return report
+
+
+def get_actors(customers, waiters):
+    """
+    Returns the JWT and the phone number of the first customers clients, the
+    JWT and the branch of the baristas and of the first waiters, and the
+    items with their categories and prices, so the simulated users need no
+    database access of their own.
+    """
+    clients = list(
+        CustomUser.objects.filter(position="client", is_staff=False).order_by("id")[
+            :customers
+        ]
+    )
+    baristas = CustomUser.objects.filter(position="barista").order_by("id")
+    waiter_list = CustomUser.objects.filter(position="waiter").order_by("id")
+    return {
+        "customers": [
+            (str(AccessToken.for_user(client)), str(client.phone_number))
+            for client in clients
+        ],
+        "baristas": [
+            (str(AccessToken.for_user(barista)), barista.branch_id)
+            for barista in baristas
+        ],
+        "waiters": [
+            (str(AccessToken.for_user(waiter)), waiter.branch_id)
+            for waiter in waiter_list[:waiters]
+        ],
+        "items": list(
+            Item.objects.order_by("id").values_list("id", "category_id", "price")
+        ),
+    }
+
+
+async def run_customer(
+    client, recorder, rng, token, phone_number, items, think_time, deadline
+):
+    """
+    Browses the menu, searches and orders until the deadline.
+    """
+    while time.perf_counter() < deadline:
+        item_id, category_id, price = rng.choice(items)
+        await recorder.request(
+            client,
+            "GET customers/menu",
+            "GET",
+            "/customers/menu",
+            params={"category_id": category_id},
+            token=token,
+        )
+        await recorder.request(
+            client,
+            "GET customers/search/",
+            "GET",
+            "/customers/search/",
+            params={"query": rng.choice(SEARCH_QUERIES)},
+            token=token,
+        )
+        await recorder.request(
+            client,
+            "GET customers/menu/<int:item_id>/",
+            "GET",
+            f"/customers/menu/{item_id}/",
+            params={"is_ready_made_product": "false"},
+            token=token,
+        )
+        in_an_institution = rng.random() < 0.4
+        status, body = await recorder.request(
+            client,
+            "POST ordering/create-order/",
+            "POST",
+            "/ordering/create-order/",
+            data={
+                "items": [
+                    {"item_id": item_id, "is_ready_made_product": False, "quantity": 1}
+                ],
+                "total_price": str(price),
+                "in_an_institution": in_an_institution,
+                "spent_bonus_points": 0,
+                "table_number": rng.randint(1, 5) if in_an_institution else 0,
+            },
+            token=token,
+        )
+        if status == 201:
+            recorder.created.setdefault(phone_number, deque()).append(
+                time.perf_counter()
+            )
+        await asyncio.sleep(rng.uniform(0, 2 * think_time))
+
+
+async def run_barista(client, recorder, token, branch_id, deadline):
+    """
+    Accepts, readies and completes the orders of the new order boards of
+    the branch until the deadline.
+    """
+    queue = asyncio.Queue()
+    seen = set()
+
+    async def watch(board):
+        try:
+            websocket = await client.connect(f"/ws/{board}/{branch_id}/")
+        except (aiohttp.ClientError, ConnectionError, OSError):
+            recorder.record(f"WS {board}", 0.0, None)
+            return
+        try:
+            while True:
+                message = await websocket.receive_json()
+                for order in message.get("orders", []):
+                    if order["id"] in seen:
+                        continue
+                    seen.add(order["id"])
+                    created = recorder.created.get(order["clientNumber"])
+                    if created:
+                        recorder.record(
+                            ORDER_TO_BOARD, time.perf_counter() - created.popleft(), 200
+                        )
+                    queue.put_nowait(order["id"])
+        except (asyncio.CancelledError, ConnectionError):
+            pass
+        finally:
+            await websocket.close()
+
+    watchers = [asyncio.ensure_future(watch(board)) for board in BOARDS]
+    try:
+        while True:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                order_id = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            for label, path in (
+                ("GET web/accept-order/", "/web/accept-order/"),
+                ("GET web/make-order-ready/", "/web/make-order-ready/"),
+                ("GET web/complete-order/", "/web/complete-order/"),
+            ):
+                await recorder.request(
+                    client,
+                    label,
+                    "GET",
+                    path,
+                    params={"order_id": order_id},
+                    token=token,
+                )
+    finally:
+        for watcher in watchers:
+            watcher.cancel()
+        await asyncio.gather(*watchers, return_exceptions=True)
+
+
+async def run_waiter(client, recorder, rng, token, think_time, deadline):
+    """
+    Polls the tables and the orders in the institution until the deadline.
+    """
+    while time.perf_counter() < deadline:
+        for label, path in (
+            ("GET waiter/get-table-availibility/", "/waiter/get-table-availibility/"),
+            (
+                "GET waiter/get-orders-in-institution/",
+                "/waiter/get-orders-in-institution/",
+            ),
+        ):
+            await recorder.request(client, label, "GET", path, token=token)
+        await asyncio.sleep(rng.uniform(0, 2 * think_time))
+
+
+async def run_load_test(
+    application,
+    actors,
+    duration=30.0,
+    ramp_up=5.0,
+    think_time=1.0,
+    transport="asgi",
+    port=8765,
+    seed=42,
+):
+    """
+    Runs the lunch rush against the application and returns the recorder
+    and the measured duration in seconds.
+
+    Customers start evenly over ramp_up seconds. With the "uvicorn"
+    transport the requests go through a uvicorn server on the port.
+    """
+    server = None
+    if transport == "uvicorn":
+        server = uvicorn.Server(
+            uvicorn.Config(
+                application,
+                host="127.0.0.1",
+                port=port,
+                lifespan="off",
+                log_level="warning",
+            )
+        )
+        serving = asyncio.ensure_future(server.serve())
+        while not server.started:
+            if serving.done():
+                serving.result()
+            await asyncio.sleep(0.05)
+        client = HTTPClient(f"http://127.0.0.1:{port}")
+    else:
+        client = ASGIClient(application)
+
+    recorder = Recorder()
+    started = time.perf_counter()
+    deadline = started + duration
+    customers = actors["customers"]
+
+    async def delayed(delay, coroutine):
+        await asyncio.sleep(delay)
+        await coroutine
+
+    tasks = [
+        run_barista(client, recorder, token, branch_id, deadline)
+        for token, branch_id in actors["baristas"]
+    ]
+    tasks += [
+        run_waiter(
+            client, recorder, random.Random(seed + n), token, think_time, deadline
+        )
+        for n, (token, _) in enumerate(actors["waiters"])
+    ]
+    tasks += [
+        delayed(
+            ramp_up * n / max(len(customers), 1),
+            run_customer(
+                client,
+                recorder,
+                random.Random(seed + len(tasks) + n),
+                token,
+                phone_number,
+                actors["items"],
+                think_time,
+                deadline,
+            ),
+        )
+        for n, (token, phone_number) in enumerate(customers)
+    ]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        await client.close()
+        if server is not None:
+            server.should_exit = True
+            await serving
+    return recorder, time.perf_counter() - started
+
+
+def _decode(body):
+    """
+    Decodes a JSON body, or returns None.
+    """
+    try:
+        return json.loads(body)
+    except ValueError:
+        return None
@@ -0,0 +1,33 @@
+"""
+Module for short locks kept in the shared cache.
+
+A lock is a cache key added with a token unique to its holder. It expires
+after its timeout, so a crashed holder does not block the key for good,
+and it is released only while it still holds the token of the block that
+took it, so a block that outlived its lock does not release another one.
+"""
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.core.cache import cache
+
+
+@contextmanager
+def cache_lock(key, timeout=5, wait=None):
+    """
+    Holds the lock of the key until the block exits and yields whether it
+    was acquired. Waits for the lock up to wait seconds, the timeout by
+    default.
+    """
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + (timeout if wait is None else wait)
+    acquired = cache.add(key, token, timeout=timeout)
+    while not acquired and time.monotonic() < deadline:
+        time.sleep(0.01)
+        acquired = cache.add(key, token, timeout=timeout)
+    try:
+        yield acquired
+    finally:
+        if acquired and cache.get(key) == token:
+            cache.delete(key)
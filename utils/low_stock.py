@@ -0,0 +1,190 @@
+"""
+Module for low stock alerts.
+
+A stock row is low when its quantity is below the minimal limit of its
+branch. Every stock change reports the old and the new quantity of the
+changed rows, so only their limits are read: an admin notification is
+created when a row becomes low and deleted when it is restocked up to the
+limit, and no other row of any branch is checked. Alerts are keyed by
+kind, branch and ingredient or ready made product, so they are inserted
+and cleared by the unique key instead of their text.
+"""
+from django.db.models import OuterRef, Subquery
+
+from apps.branches.models import Branch
+from apps.notices.models import AdminNotification
+from apps.notices.outbox import publish_event
+from apps.storage.models import (
+    AvailableAtTheBranch,
+    Ingredient,
+    MinimalLimitReached,
+    ReadyMadeProduct,
+    ReadyMadeProductAvailableAtTheBranch,
+)
+
+
+TITLE = "Running out of"
+INGREDIENT_TEXT = "Ингредиент {name} в филиале {shop} заканчивается"
+READY_MADE_PRODUCT_TEXT = "Готовый продукт {name} в филиале {shop} заканчивается"
+
+
+def is_low(quantity, limit):
+    """
+    Checks if the quantity is below the limit. A missing stock row or limit
+    is never low.
+    """
+    return quantity is not None and limit is not None and quantity < limit
+
+
+def get_limit(key):
+    """
+    Returns a subquery of the minimal limit of a stock row, so the limits
+    can be read together with the quantities.
+    """
+    return Subquery(
+        MinimalLimitReached.objects.filter(
+            branch_id=OuterRef("branch_id"), **{key: OuterRef(key)}
+        ).values("quantity")[:1]
+    )
+
+
+def detect_low_ingredients(branch_id, changes, limits=None):
+    """
+    Updates alerts of the branch for {ingredient_id: (old, new)} stock
+    quantities, where None stands for a missing row.
+
+    limits are {ingredient_id: limit} if they were already read.
+    """
+    _detect(branch_id, changes, limits, "ingredient_id", Ingredient, INGREDIENT_TEXT)
+
+
+def detect_low_ready_made_products(branch_id, changes, limits=None):
+    """
+    Updates alerts of the branch for {ready_made_product_id: (old, new)}
+    stock quantities.
+    """
+    _detect(
+        branch_id,
+        changes,
+        limits,
+        "ready_made_product_id",
+        ReadyMadeProduct,
+        READY_MADE_PRODUCT_TEXT,
+    )
+
+
+def detect_limit_change(limit, old_limit, new_limit):
+    """
+    Updates the alert of the stock row of a minimal limit that changed from
+    old_limit to new_limit, where None stands for a missing limit.
+    """
+    if old_limit == new_limit:
+        return
+    if limit.ingredient_id is not None:
+        key, object_id = "ingredient_id", limit.ingredient_id
+        stock, model, text = AvailableAtTheBranch, Ingredient, INGREDIENT_TEXT
+    else:
+        key, object_id = "ready_made_product_id", limit.ready_made_product_id
+        stock, model = ReadyMadeProductAvailableAtTheBranch, ReadyMadeProduct
+        text = READY_MADE_PRODUCT_TEXT
+    quantity = (
+        stock.objects.filter(branch_id=limit.branch_id, **{key: object_id})
+        .values_list("quantity", flat=True)
+        .first()
+    )
+    _update_alerts(
+        limit.branch_id,
+        {object_id: (is_low(quantity, old_limit), is_low(quantity, new_limit))},
+        key,
+        model,
+        text,
+    )
+
+
+def _detect(branch_id, changes, limits, key, model, text):
+    """
+    Compares the old and the new quantities with the limits of the branch.
+    """
+    changes = {
+        object_id: quantities
+        for object_id, quantities in changes.items()
+        if quantities[0] != quantities[1]
+    }
+    if not changes:
+        return
+    if limits is None:
+        limits = dict(
+            MinimalLimitReached.objects.filter(
+                branch_id=branch_id, **{f"{key}__in": changes}
+            ).values_list(key, "quantity")
+        )
+    _update_alerts(
+        branch_id,
+        {
+            object_id: (
+                is_low(old, limits.get(object_id)),
+                is_low(new, limits.get(object_id)),
+            )
+            for object_id, (old, new) in changes.items()
+        },
+        key,
+        model,
+        text,
+    )
+
+
+def _update_alerts(branch_id, states, key, model, text):
+    """
+    Creates alerts for the objects that became low and deletes alerts of
+    the objects that are no longer low. states maps object ids to
+    (was_low, is_low).
+    """
+    crossed = [object_id for object_id, (was, now) in states.items() if now and not was]
+    restocked = [
+        object_id for object_id, (was, now) in states.items() if was and not now
+    ]
+    if not crossed and not restocked:
+        return
+    if restocked:
+        AdminNotification.objects.filter(
+            kind=AdminNotification.LOW_STOCK,
+            branch_id=branch_id,
+            **{f"{key}__in": restocked},
+        ).delete()
+    if crossed:
+        shop = (
+            Branch.objects.filter(id=branch_id)
+            .values_list("name_of_shop", flat=True)
+            .first()
+        )
+        if shop is None:
+            return
+        create_alerts(
+            get_alert(branch_id, key, object_id, text.format(name=name, shop=shop))
+            for object_id, name in model.objects.filter(id__in=crossed).values_list(
+                "id", "name"
+            )
+        )
+    publish_event("admin", "get_admin_notification")
+
+
+def get_alert(branch_id, key, object_id, text):
+    """
+    Returns an unsaved low stock alert of the ingredient_id or the
+    ready_made_product_id key.
+    """
+    return AdminNotification(
+        title=TITLE,
+        text=text,
+        branch_id=branch_id,
+        kind=AdminNotification.LOW_STOCK,
+        **{key: object_id},
+    )
+
+
+def create_alerts(alerts):
+    """
+    Inserts the alerts whose key is missing in one statement. The unique
+    keys make existing alerts conflicts that are skipped.
+    """
+    AdminNotification.objects.bulk_create(alerts, ignore_conflicts=True)
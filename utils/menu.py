@@ -1,9 +1,6 @@
-from django.db import transaction
-from django.db.models import Prefetch, Sum, Count
+from django.db.models import Sum
 
 from django.forms.models import model_to_dict
-from algoliasearch.search_client import SearchClient
-from django.conf import settings
 
 from apps.storage.models import (
     AvailableAtTheBranch,
@@ -14,42 +11,28 @@ from apps.storage.models import (
     MinimalLimitReached,
     ReadyMadeProductAvailableAtTheBranch,
 )
-from apps.ordering.models import OrderItem
+from apps.ordering.models import ItemCooccurrence, ItemPopularity
+from utils.availability import build_availability_matrix, get_available_item_ids
+from utils.search import search_menu
+from utils.stock import decrement_ingredients, decrement_ready_made_products
 
 
-client = SearchClient.create(settings.ALGOLIA_APPLICATION_ID, settings.ALGOLIA_API_KEY)
-index = client.init_index("menu")
-
-
-def get_available_items(branch_id):
-    available_ingredients = AvailableAtTheBranch.objects.filter(branch_id=branch_id)
-    ingredient_quantities = {
-        ingredient.ingredient_id: ingredient.quantity
-        for ingredient in available_ingredients
-    }
-
-    compositions_prefetch = Prefetch("compositions", queryset=Composition.objects.all())
-    all_items = Item.objects.prefetch_related(compositions_prefetch).all()
+def get_available_items(branch_id, availability=None):
+    """
+    Returns list of items that can be made at the branch.
+    """
+    if availability is None:
+        availability = build_availability_matrix([branch_id])
+    available_item_ids = availability.available_item_ids(branch_id)
 
     available_items = []
-    for item in all_items:
-        can_make = True
-        for composition in item.compositions.all():
-            required_ingredient_id = composition.ingredient_id
-            required_quantity = composition.quantity
-
-            if (
-                required_ingredient_id not in ingredient_quantities
-                or ingredient_quantities[required_ingredient_id] < required_quantity
-            ):
-                can_make = False
-                break
-
-        if can_make:
-            item_dict = model_to_dict(item)
-            item_dict["is_ready_made_product"] = False
-            item_dict["category"] = item.category
-            available_items.append(item_dict)
+    for item in Item.objects.filter(id__in=available_item_ids).select_related(
+        "category"
+    ):
+        item_dict = model_to_dict(item)
+        item_dict["is_ready_made_product"] = False
+        item_dict["category"] = item.category
+        available_items.append(item_dict)
 
     return available_items
 
@@ -98,11 +81,13 @@ def check_if_ready_made_product_can_be_made(ready_made_product, branch_id, quant
     ).exists()
 
 
-def combine_items_and_ready_made_products(branch_id, category_id=None):
+def combine_items_and_ready_made_products(
+    branch_id, category_id=None, availability=None
+):
     """
     Combines items and ready made products into one list.
     """
-    available_items = get_available_items(branch_id)
+    available_items = get_available_items(branch_id, availability)
     available_ready_made_products = get_available_ready_made_products(branch_id)
     if category_id:
         available_items = [
@@ -119,146 +104,129 @@ def combine_items_and_ready_made_products(branch_id, category_id=None):
     return combined_list
 
 
-def get_popular_items(branch_id):
-    item_sales = (
-        OrderItem.objects.values("item_id")
-        .annotate(total_quantity=Sum("quantity"))
-        .order_by("-total_quantity")
-    )
-    product_sales = (
-        OrderItem.objects.values("ready_made_product_id")
-        .annotate(total_quantity=Sum("quantity"))
-        .order_by("-total_quantity")
-    )
-
-    best_selling_items = [
-        (item["item_id"], item["total_quantity"]) for item in item_sales
-    ]
-    best_selling_products = [
-        (product["ready_made_product_id"], product["total_quantity"])
-        for product in product_sales
-    ]
-
-    available_items = []
-    for item_id, total_quantity in best_selling_items:
-        if check_if_items_can_be_made(item_id, branch_id, 1):
-            available_items.append((item_id, total_quantity))
-            if len(available_items) >= 3:
-                break
-
-    available_products = []
-    for product_id, total_quantity in best_selling_products:
-        if check_if_ready_made_product_can_be_made(product_id, branch_id, 1):
-            available_products.append((product_id, total_quantity))
-            if len(available_products) >= 3:
-                break
-
-    all_available = sorted(
-        available_items + available_products, key=lambda x: x[1], reverse=True
-    )
-
-    top_selling_available = all_available[:4]
+def get_popular_items(branch_id, limit=4, per_kind=3, page_size=20):
+    """
+    Returns the most popular items and ready made products that are
+    available at the branch.
 
-    top_selling_available_items = Item.objects.filter(
-        id__in=[item[0] for item in top_selling_available if item in available_items]
-    )
-    top_selling_available_products = ReadyMadeProduct.objects.filter(
-        id__in=[item[0] for item in top_selling_available if item in available_products]
+    Reads the branch popularity rollup from the top score down in pages
+    and stops as soon as enough available objects are found.
+    """
+    branch_id = getattr(branch_id, "pk", branch_id)
+    available_item_ids = get_available_item_ids(branch_id)
+    popularities = (
+        ItemPopularity.objects.filter(branch_id=branch_id)
+        .select_related("item", "ready_made_product")
+        .order_by("-score", "id")
     )
 
-    return list(top_selling_available_items) + list(top_selling_available_products)
+    items = []
+    products = []
+    offset = 0
+    while len(items) < per_kind or len(products) < per_kind:
+        page = list(popularities[offset : offset + page_size])
+        if not page:
+            break
+        offset += page_size
+        product_ids = [
+            popularity.ready_made_product_id
+            for popularity in page
+            if popularity.ready_made_product_id is not None
+        ]
+        available_product_ids = set(
+            ReadyMadeProductAvailableAtTheBranch.objects.filter(
+                branch_id=branch_id,
+                ready_made_product_id__in=product_ids,
+                quantity__gte=1,
+            ).values_list("ready_made_product_id", flat=True)
+        )
+        for popularity in page:
+            if popularity.item_id is not None:
+                if len(items) < per_kind and popularity.item_id in available_item_ids:
+                    items.append(popularity)
+            elif popularity.ready_made_product_id in available_product_ids:
+                if len(products) < per_kind:
+                    products.append(popularity)
 
+    top = sorted(items + products, key=lambda x: x.score, reverse=True)[:limit]
+    return [popularity.item or popularity.ready_made_product for popularity in top]
 
-def get_complementary_objects(model, exclude_field, item_id, order_ids):
-    return (
-        model.objects.filter(order__id__in=order_ids)
-        .exclude(**{exclude_field: item_id})
-        .values(exclude_field)
-        .annotate(count=Count(exclude_field))
-        .order_by("-count")[:3]
-    )
 
-
-def get_compatibles(item_id, is_ready_made_product=False, branch_id=None):
+def get_compatibles(
+    item_id, is_ready_made_product=False, branch_id=None, limit=3, candidates=20
+):
     """
     Function to get items that are often ordered with the given item.
-    """
-    order_ids = OrderItem.objects.filter(
-        **{"item_id" if not is_ready_made_product else "ready_made_product_id": item_id}
-    ).values_list("order_id", flat=True)
 
-    complementary_items = get_complementary_objects(
-        OrderItem, "item_id", item_id, order_ids
+    Reads the most frequent partners from the branch co-occurrence store
+    and keeps the ones that are available at the branch.
+    """
+    branch_id = getattr(branch_id, "pk", branch_id)
+    partners = list(
+        ItemCooccurrence.objects.filter(
+            branch_id=branch_id,
+            source_id=item_id,
+            source_is_ready_made_product=is_ready_made_product,
+        )
+        .order_by("-count", "target_id")
+        .values_list("target_id", "target_is_ready_made_product")[:candidates]
     )
-    complementary_ready_made_products = get_complementary_objects(
-        OrderItem, "ready_made_product_id", item_id, order_ids
+    if not partners:
+        return []
+
+    item_ids = [target_id for target_id, is_product in partners if not is_product]
+    product_ids = [target_id for target_id, is_product in partners if is_product]
+    available_item_ids = get_available_item_ids(branch_id) if item_ids else set()
+    available_product_ids = set(
+        ReadyMadeProductAvailableAtTheBranch.objects.filter(
+            branch_id=branch_id,
+            ready_made_product_id__in=product_ids,
+            quantity__gte=1,
+        ).values_list("ready_made_product_id", flat=True)
     )
-
-    complementary_items_ids = [item["item_id"] for item in complementary_items]
-    complementary_ready_made_products_ids = [
-        product["ready_made_product_id"]
-        for product in complementary_ready_made_products
-    ]
-
-    complementary_items = Item.objects.filter(id__in=complementary_items_ids)
-    complementary_ready_made_products = ReadyMadeProduct.objects.filter(
-        id__in=complementary_ready_made_products_ids
+    partners = [
+        (target_id, is_product)
+        for target_id, is_product in partners
+        if target_id in (available_product_ids if is_product else available_item_ids)
+    ][:limit]
+
+    items = Item.objects.in_bulk(
+        [target_id for target_id, is_product in partners if not is_product]
     )
-
-    if_items_can_be_made = [
-        item
-        for item in complementary_items
-        if check_if_items_can_be_made(item.id, branch_id, 1)
-    ]
-    if_ready_made_products_can_be_made = [
-        product
-        for product in complementary_ready_made_products
-        if check_if_ready_made_product_can_be_made(product.id, branch_id, 1)
+    products = ReadyMadeProduct.objects.in_bulk(
+        [target_id for target_id, is_product in partners if is_product]
+    )
+    return [
+        (products if is_product else items)[target_id]
+        for target_id, is_product in partners
+        if target_id in (products if is_product else items)
     ]
 
-    return (if_items_can_be_made + if_ready_made_products_can_be_made)[:3]
-
 
 def update_ingredient_stock_on_cooking(item_id, branch_id, quantity):
     """
     Updates ingredient stock on cooking.
     """
-    try:
-        with transaction.atomic():
-            compositions = Composition.objects.filter(item_id=item_id).select_related(
-                "ingredient"
-            )
-            ingredients_to_update = []
-
-            for composition in compositions:
-                available_ingredient = AvailableAtTheBranch.objects.get(
-                    branch_id=branch_id, ingredient_id=composition.ingredient_id
-                )
-                available_ingredient.quantity -= composition.quantity * quantity
-                ingredients_to_update.append(available_ingredient)
-
-            AvailableAtTheBranch.objects.bulk_update(
-                ingredients_to_update, ["quantity"]
-            )
-            return "Updated successfully."
-    except Exception as e:
-        raise e
+    demand = {}
+    for ingredient_id, ingredient_quantity in Composition.objects.filter(
+        item_id=item_id, ingredient__isnull=False
+    ).values_list("ingredient_id", "quantity"):
+        demand[ingredient_id] = (
+            demand.get(ingredient_id, 0) + ingredient_quantity * quantity
+        )
+    decrement_ingredients(getattr(branch_id, "pk", branch_id), demand)
+    return "Updated successfully."
 
 
 def update_ready_made_product_stock_on_cooking(ready_made_product, branch_id, quantity):
     """
     Updates ready made product stock on cooking.
     """
-    try:
-        with transaction.atomic():
-            available_product = ReadyMadeProductAvailableAtTheBranch.objects.get(
-                branch_id=branch_id, ready_made_product=ready_made_product
-            )
-            available_product.quantity -= quantity
-            available_product.save()
-            return "Updated successfully."
-    except Exception as e:
-        raise e
+    decrement_ready_made_products(
+        getattr(branch_id, "pk", branch_id),
+        {getattr(ready_made_product, "pk", ready_made_product): quantity},
+    )
+    return "Updated successfully."
 
 
 def check_if_items_can_be_made(item_id, branch_id, quantity):
@@ -278,6 +246,4 @@ def item_search(query, branch_id):
     """
     Returns list of items that match the query.
     """
-    items = index.search(query, {"filters": f"branch_id:{branch_id}"})["hits"]
-
-    return items
+    return search_menu(query, branch_id)
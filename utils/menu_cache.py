@@ -0,0 +1,121 @@
+"""
+Module for menu snapshot caching.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+MENU_SNAPSHOT_TIMEOUT = 60 * 60
+STOCK_VERSION_KEY = "menu:stock_version"
+BRANCH_STOCK_VERSION_KEY = "menu:stock_version:{branch_id}"
+SNAPSHOT_KEY = "menu:snapshot:{branch_id}:{category_id}:{version}:{branch_version}"
+HITS_KEY = "menu:hits"
+MISSES_KEY = "menu:misses"
+
+
+def _increment(key):
+    """
+    Increments a counter, creating it if it was evicted.
+
+    A new counter starts from the current time in milliseconds, so a
+    version never repeats after eviction and stale snapshots stay unused.
+    """
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        return cache.incr(key)
+
+
+def bump_stock_version(branch_id=None):
+    """
+    Invalidates menu snapshots of the branch, or of every branch if
+    branch_id is None.
+    """
+    if branch_id is None:
+        return _increment(STOCK_VERSION_KEY)
+    return _increment(BRANCH_STOCK_VERSION_KEY.format(branch_id=branch_id))
+
+
+def bump_stock_version_on_commit(branch_id=None):
+    """
+    Bumps the stock version now and once more after the transaction commits.
+
+    The second bump drops a snapshot that another request may have built
+    from the data that was committed before this transaction.
+    """
+    bump_stock_version(branch_id)
+
+    def bump_stock_version_after_commit():
+        bump_stock_version(branch_id)
+
+    transaction.on_commit(bump_stock_version_after_commit, robust=True)
+
+
+def get_snapshot_key(branch_id, category_id=None):
+    """
+    Returns the cache key of the current menu snapshot of the branch.
+    """
+    branch_version_key = BRANCH_STOCK_VERSION_KEY.format(branch_id=branch_id)
+    keys = [STOCK_VERSION_KEY, branch_version_key]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, int(time.time() * 1000), timeout=None)
+            versions[key] = cache.get(key)
+    return SNAPSHOT_KEY.format(
+        branch_id=branch_id,
+        category_id=category_id or "all",
+        version=versions[STOCK_VERSION_KEY],
+        branch_version=versions[branch_version_key],
+    )
+
+
+def get_or_build_snapshot(branch_id, category_id, build):
+    """
+    Returns the cached menu snapshot, building it with build() on a miss.
+    """
+    key = get_snapshot_key(branch_id, category_id)
+    snapshot = cache.get(key)
+    if snapshot is not None:
+        _count(HITS_KEY)
+        return snapshot
+    _count(MISSES_KEY)
+    snapshot = build()
+    cache.set(key, snapshot, MENU_SNAPSHOT_TIMEOUT)
+    return snapshot
+
+
+def _count(key):
+    """
+    Increments a hit/miss counter.
+    """
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 1, timeout=None)
+
+
+def get_menu_cache_stats():
+    """
+    Returns menu snapshot hit/miss counters.
+    """
+    counters = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits = counters.get(HITS_KEY, 0)
+    misses = counters.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / total, 4) if total else 0.0,
+    }
+
+
+def reset_menu_cache_stats():
+    """
+    Resets menu snapshot hit/miss counters.
+    """
+    cache.delete_many([HITS_KEY, MISSES_KEY])
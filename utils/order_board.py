@@ -0,0 +1,66 @@
+"""
+Module for order board snapshot caching.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+BOARD_TIMEOUT = 60 * 60
+BOARD_VERSION_KEY = "order_board:version:{branch_id}"
+BOARD_KEY = "order_board:{branch_id}:{in_an_institution}:{status}:{version}"
+
+
+def bump_order_board(branch_id):
+    """
+    Invalidates order board snapshots of the branch.
+    """
+    key = BOARD_VERSION_KEY.format(branch_id=branch_id)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        return cache.incr(key)
+
+
+def bump_order_board_on_commit(branch_id):
+    """
+    Bumps the board version now and once more after the transaction
+    commits, so a board built from the data before the commit is dropped.
+    """
+    bump_order_board(branch_id)
+
+    def bump_order_board_after_commit():
+        bump_order_board(branch_id)
+
+    transaction.on_commit(bump_order_board_after_commit, robust=True)
+
+
+def get_board_key(branch_id, in_an_institution, status):
+    """
+    Returns the cache key of the current order board of the branch.
+    """
+    version_key = BOARD_VERSION_KEY.format(branch_id=branch_id)
+    version = cache.get(version_key)
+    if version is None:
+        cache.add(version_key, int(time.time() * 1000), timeout=None)
+        version = cache.get(version_key)
+    return BOARD_KEY.format(
+        branch_id=branch_id,
+        in_an_institution=int(bool(in_an_institution)),
+        status=status,
+        version=version,
+    )
+
+
+def get_or_build_board(branch_id, in_an_institution, status, build):
+    """
+    Returns the cached order board, building it with build() on a miss.
+    """
+    key = get_board_key(branch_id, in_an_institution, status)
+    board = cache.get(key)
+    if board is None:
+        board = build()
+        cache.set(key, board, BOARD_TIMEOUT)
+    return board
@@ -0,0 +1,123 @@
+"""
+Module for keyset pagination of order lists.
+
+Orders are listed newest first by (created_at, id). A page ends with a
+cursor of its last order, and the next page is read with the orders after
+that position, so every page costs the same query however long the
+history is. paginate_many reads a page across several tables, such as the
+hot and the archived orders. The cursor is opaque to the clients: they
+pass the next_cursor of a response back as the cursor query parameter,
+which paginate_request reads in the views.
+"""
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+from drf_yasg import openapi
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+PAGE_PARAMETERS = [
+    openapi.Parameter(
+        "cursor",
+        openapi.IN_QUERY,
+        description="next_cursor of the previous page",
+        type=openapi.TYPE_STRING,
+    ),
+    openapi.Parameter(
+        "limit",
+        openapi.IN_QUERY,
+        description=f"Page size, {PAGE_SIZE} by default and {MAX_PAGE_SIZE} at most",
+        type=openapi.TYPE_INTEGER,
+    ),
+]
+
+
+class InvalidPage(APIException):
+    """
+    Raised for an invalid cursor or limit query parameter.
+    """
+
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_detail = {"error": "Invalid cursor or limit"}
+
+
+def encode_cursor(order):
+    """
+    Returns the cursor of the position after the order.
+    """
+    value = f"{order.created_at.isoformat()}|{order.id}"
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Returns the created_at and the id of a cursor. Raises ValueError for an
+    invalid cursor.
+    """
+    try:
+        value = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, order_id = value.split("|")
+        return datetime.fromisoformat(created_at), int(order_id)
+    except (ValueError, UnicodeError):
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+def get_page_params(request):
+    """
+    Returns the decoded cursor, or None for the first page, and the page
+    size of the request. Raises ValueError for invalid parameters.
+    """
+    cursor = request.GET.get("cursor")
+    limit = int(request.GET.get("limit", PAGE_SIZE))
+    if limit < 1:
+        raise ValueError(f"Invalid limit: {limit}")
+    return (
+        decode_cursor(cursor) if cursor else None,
+        min(limit, MAX_PAGE_SIZE),
+    )
+
+
+def paginate_request(request, queryset):
+    """
+    Returns the page of the queryset that the cursor and limit query
+    parameters of the request ask for and the cursor of the next page.
+    Raises InvalidPage for invalid parameters.
+    """
+    try:
+        position, limit = get_page_params(request)
+    except ValueError:
+        raise InvalidPage()
+    return paginate(queryset, position, limit)
+
+
+def paginate(queryset, position=None, limit=PAGE_SIZE):
+    """
+    Returns the page of the orders after the position, newest first, and
+    the cursor of the next page or None on the last page.
+    """
+    return paginate_many([queryset], position, limit)
+
+
+def paginate_many(querysets, position=None, limit=PAGE_SIZE):
+    """
+    Returns the page of the orders of all the querysets after the position,
+    newest first, and the cursor of the next page. The querysets must not
+    share ids, as the hot and the archived orders do not.
+    """
+    orders = []
+    for queryset in querysets:
+        if position is not None:
+            created_at, order_id = position
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=order_id)
+            )
+        orders += queryset.order_by("-created_at", "-id")[: limit + 1]
+    if len(querysets) > 1:
+        orders.sort(key=lambda order: (order.created_at, order.id), reverse=True)
+    if len(orders) > limit:
+        return orders[:limit], encode_cursor(orders[limit - 1])
+    return orders, None
@@ -0,0 +1,264 @@
+"""
+Module for request profiling.
+
+ProfilingMiddleware and ProfiledConsumerMixin profile a sampled share of
+the HTTP requests and of the messages of the websocket consumers. A
+profile counts the queries and sums their time, and the time of the whole
+view or handler. HTTP responses get a Server-Timing header with both
+times. Every profile is added to a histogram of its endpoint in this
+process; the histograms cover the last PROFILING_WINDOW seconds in slots
+of PROFILING_SLOT seconds, so old traffic drops out of the report.
+
+Queries are counted by an execute wrapper installed on every database
+connection. It finds the running profile through a context variable, which
+sync_to_async copies into its thread, so the queries of a consumer are
+counted as well. Without a profile the wrapper only reads the variable.
+A profile nested in another one adds its queries to the outer one, so the
+endpoint benchmark counts the queries of sampled requests too.
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+# Upper bounds of the histogram buckets in milliseconds; the last bucket
+# has no bound.
+BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_profile = ContextVar("profile", default=None)
+_lock = threading.Lock()
+# {slot: {label: stats}}
+_slots = {}
+
+
+class Profile:
+    """
+    Queries and times of one request or message.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.seconds = 0.0
+
+    @property
+    def sql_ms(self):
+        return self.sql_seconds * 1000
+
+    @property
+    def view_ms(self):
+        return self.seconds * 1000
+
+    def server_timing(self):
+        """
+        Returns the value of the Server-Timing header.
+        """
+        return (
+            f'sql;dur={self.sql_ms:.2f};desc="{self.queries} queries", '
+            f"view;dur={self.view_ms:.2f}"
+        )
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Execute wrapper that adds the query to the running profile.
+    """
+    profile = _profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.sql_seconds += time.perf_counter() - started
+        profile.queries += 1
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    """
+    Installs the execute wrapper on a new database connection.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def is_sampled():
+    """
+    Returns whether to profile the next request.
+    """
+    rate = settings.PROFILING_SAMPLE_RATE
+    return rate >= 1 or (rate > 0 and random.random() < rate)
+
+
+@contextmanager
+def profiling():
+    """
+    Profiles the block and yields the profile.
+    """
+    install_query_recorder(None, connection)
+    parent = _profile.get()
+    profile = Profile()
+    token = _profile.set(profile)
+    started = time.perf_counter()
+    try:
+        yield profile
+    finally:
+        profile.seconds = time.perf_counter() - started
+        _profile.reset(token)
+        if parent is not None:
+            parent.queries += profile.queries
+            parent.sql_seconds += profile.sql_seconds
+
+
+def add_profile(label, profile):
+    """
+    Adds the profile to the histogram of the endpoint.
+    """
+    now = time.time()
+    slot = int(now // settings.PROFILING_SLOT)
+    index = len(BUCKETS)
+    for number, bound in enumerate(BUCKETS):
+        if profile.view_ms <= bound:
+            index = number
+            break
+    with _lock:
+        for old in [old for old in _slots if old <= slot - _get_slot_count()]:
+            del _slots[old]
+        stats = _slots.setdefault(slot, {}).setdefault(label, _get_empty_stats())
+        stats["count"] += 1
+        stats["queries"] += profile.queries
+        stats["max_queries"] = max(stats["max_queries"], profile.queries)
+        stats["sql_ms"] += profile.sql_ms
+        stats["view_ms"] += profile.view_ms
+        stats["max_view_ms"] = max(stats["max_view_ms"], profile.view_ms)
+        stats["buckets"][index] += 1
+
+
+def get_profiling_stats():
+    """
+    Returns {label: stats} of the profiles of the window with the average
+    queries and times, the view time percentiles estimated from the
+    histogram and the histogram itself.
+    """
+    first = int(time.time() // settings.PROFILING_SLOT) - _get_slot_count() + 1
+    merged = {}
+    with _lock:
+        for slot, labels in _slots.items():
+            if slot < first:
+                continue
+            for label, stats in labels.items():
+                total = merged.setdefault(label, _get_empty_stats())
+                for name in ("count", "queries", "sql_ms", "view_ms"):
+                    total[name] += stats[name]
+                for name in ("max_queries", "max_view_ms"):
+                    total[name] = max(total[name], stats[name])
+                for index, number in enumerate(stats["buckets"]):
+                    total["buckets"][index] += number
+
+    report = {}
+    for label, total in sorted(merged.items()):
+        count = total["count"]
+        histogram = {
+            f"<={bound}": number for bound, number in zip(BUCKETS, total["buckets"])
+        }
+        histogram[f">{BUCKETS[-1]}"] = total["buckets"][-1]
+
+        def percentile(value):
+            # Upper bound of the bucket of the percentile, or the maximum
+            # when it is in the last bucket.
+            seen = 0
+            for index, number in enumerate(total["buckets"]):
+                seen += number
+                if seen >= count * value:
+                    break
+            if index < len(BUCKETS):
+                return min(BUCKETS[index], round(total["max_view_ms"], 2))
+            return round(total["max_view_ms"], 2)
+
+        report[label] = {
+            "count": count,
+            "avg_queries": round(total["queries"] / count, 2),
+            "max_queries": total["max_queries"],
+            "avg_sql_ms": round(total["sql_ms"] / count, 2),
+            "avg_view_ms": round(total["view_ms"] / count, 2),
+            "p50_view_ms": percentile(0.50),
+            "p95_view_ms": percentile(0.95),
+            "p99_view_ms": percentile(0.99),
+            "max_view_ms": round(total["max_view_ms"], 2),
+            "histogram": histogram,
+        }
+    return report
+
+
+def reset_profiling_stats():
+    """
+    Resets the histograms.
+    """
+    with _lock:
+        _slots.clear()
+
+
+def _get_empty_stats():
+    """
+    Returns the stats of an endpoint without profiles.
+    """
+    return {
+        "count": 0,
+        "queries": 0,
+        "max_queries": 0,
+        "sql_ms": 0.0,
+        "view_ms": 0.0,
+        "max_view_ms": 0.0,
+        "buckets": [0] * (len(BUCKETS) + 1),
+    }
+
+
+def _get_slot_count():
+    """
+    Returns the number of slots of the window.
+    """
+    return max(1, settings.PROFILING_WINDOW // settings.PROFILING_SLOT)
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a sampled share of the requests, adds the Server-Timing header
+    to their responses and records them by method and url route.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not is_sampled():
+            return self.get_response(request)
+        with profiling() as profile:
+            response = self.get_response(request)
+        response["Server-Timing"] = profile.server_timing()
+        match = request.resolver_match
+        if match is not None:
+            add_profile(f"{request.method} {match.route}", profile)
+        return response
+
+
+class ProfiledConsumerMixin:
+    """
+    Consumer mixin that profiles a sampled share of the messages and
+    records them by consumer and message type.
+    """
+
+    async def dispatch(self, message):
+        if not is_sampled():
+            return await super().dispatch(message)
+        with profiling() as profile:
+            result = await super().dispatch(message)
+        add_profile(f"WS {type(self).__name__} {message['type']}", profile)
+        return result
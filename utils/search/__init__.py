@@ -0,0 +1,33 @@
+"""
+Package for menu search backends.
+
+The backend is chosen by the MENU_SEARCH_BACKEND setting: "algolia" sends
+queries to the hosted index, "local" searches an in-process index.
+"""
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+BACKENDS = {
+    "algolia": "utils.search.algolia.AlgoliaSearchBackend",
+    "local": "utils.search.local.LocalSearchBackend",
+}
+
+_backends = {}
+
+
+def get_search_backend(name=None):
+    """
+    Returns the search backend instance for the name or the setting.
+    """
+    name = name or getattr(settings, "MENU_SEARCH_BACKEND", "algolia")
+    if name not in _backends:
+        _backends[name] = import_string(BACKENDS[name])()
+    return _backends[name]
+
+
+def search_menu(query, branch_id):
+    """
+    Returns menu hits that match the query at the branch.
+    """
+    return get_search_backend().search(query, branch_id)
@@ -0,0 +1,40 @@
+"""
+Module for the Algolia search backend.
+"""
+from algoliasearch.search_client import SearchClient
+from django.conf import settings
+
+
+INDEX_NAME = "menu"
+
+_index = None
+
+
+def get_menu_index():
+    """
+    Returns the hosted "menu" index, configuring it on first use.
+    """
+    global _index
+    if _index is None:
+        client = SearchClient.create(
+            settings.ALGOLIA_APPLICATION_ID, settings.ALGOLIA_API_KEY
+        )
+        index = client.init_index(INDEX_NAME)
+        index.set_settings({"attributesForFaceting": ["branch_id"]})
+        _index = index
+    return _index
+
+
+class AlgoliaSearchBackend:
+    """
+    Searches the hosted Algolia "menu" index.
+    """
+
+    def __init__(self):
+        self.index = get_menu_index()
+
+    def search(self, query, branch_id):
+        """
+        Returns hits of the branch that match the query.
+        """
+        return self.index.search(query, {"filters": f"branch_id:{branch_id}"})["hits"]
@@ -0,0 +1,366 @@
+"""
+Module for the in-process menu search backend.
+
+Documents are indexed once per process in an inverted index of tokens,
+with a sorted token list for prefix matching and a trigram index for
+typos. Storage signals record the changed documents in the cache under a
+version counter, and every process applies the changes it has not seen
+before answering the next query.
+"""
+import heapq
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from django.core.cache import cache
+from django.db import transaction
+
+from apps.storage.models import (
+    Item,
+    ReadyMadeProduct,
+    ReadyMadeProductAvailableAtTheBranch,
+)
+from utils.availability import get_available_item_ids
+
+
+VERSION_KEY = "search:version"
+CHANGE_KEY = "search:change:{version}"
+CHANGE_TIMEOUT = 60 * 60 * 24
+MAX_CHANGES = 1000
+
+# Weight of a token by the field it comes from.
+FIELD_WEIGHTS = {
+    "name": 4.0,
+    "category_name": 2.0,
+    "ingredients": 1.0,
+    "description": 1.0,
+}
+EXACT_MATCH = 3.0
+PREFIX_MATCH = 2.0
+MAX_PREFIX_TOKENS = 200
+MIN_SIMILARITY = 0.4
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """
+    Splits text into lowercase word tokens.
+    """
+    return TOKEN_RE.findall(text.lower()) if text else []
+
+
+def trigrams(token):
+    """
+    Returns the trigrams of the token padded with boundary marks.
+    """
+    padded = f"${token}$"
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    """
+    Inverted index of menu documents.
+
+    Documents are keyed by (id, is_ready_made_product). postings maps a
+    token to {key: weight}, where weight is the best field weight of the
+    token in the document.
+    """
+
+    def __init__(self):
+        self.documents = {}
+        self.postings = {}
+        self.tokens = []
+        self.trigram_tokens = {}
+        self.trigram_counts = {}
+        self._document_tokens = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.documents)
+
+    def add(self, document):
+        """
+        Adds or replaces a document.
+        """
+        key = (document["id"], document["is_ready_made_product"])
+        weights = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            value = document.get(field)
+            if field == "ingredients":
+                value = " ".join(ingredient["name"] for ingredient in value or [])
+            for token in tokenize(value):
+                weights[token] = max(weights.get(token, 0), weight)
+
+        with self._lock:
+            self.remove(key)
+            self.documents[key] = document
+            self._document_tokens[key] = set(weights)
+            for token, weight in weights.items():
+                postings = self.postings.get(token)
+                if postings is None:
+                    postings = self.postings[token] = {}
+                    self.tokens.insert(bisect_left(self.tokens, token), token)
+                    token_trigrams = trigrams(token)
+                    self.trigram_counts[token] = len(token_trigrams)
+                    for trigram in token_trigrams:
+                        self.trigram_tokens.setdefault(trigram, set()).add(token)
+                postings[key] = weight
+
+    def remove(self, key):
+        """
+        Removes the document if it is indexed.
+        """
+        with self._lock:
+            self.documents.pop(key, None)
+            for token in self._document_tokens.pop(key, ()):
+                postings = self.postings[token]
+                postings.pop(key, None)
+                if postings:
+                    continue
+                del self.postings[token]
+                del self.trigram_counts[token]
+                del self.tokens[bisect_left(self.tokens, token)]
+                for trigram in trigrams(token):
+                    self.trigram_tokens[trigram].discard(token)
+                    if not self.trigram_tokens[trigram]:
+                        del self.trigram_tokens[trigram]
+
+    def _match(self, query_token):
+        """
+        Returns {key: score} of the documents that match one query token
+        exactly, by prefix or by trigram similarity.
+        """
+        matches = {}
+
+        def collect(token, factor):
+            for key, weight in self.postings[token].items():
+                score = weight * factor
+                if score > matches.get(key, 0):
+                    matches[key] = score
+
+        start = bisect_left(self.tokens, query_token)
+        for token in self.tokens[start : start + MAX_PREFIX_TOKENS]:
+            if not token.startswith(query_token):
+                break
+            collect(token, EXACT_MATCH if token == query_token else PREFIX_MATCH)
+
+        if len(query_token) >= 3:
+            query_trigrams = trigrams(query_token)
+            shared = {}
+            for trigram in query_trigrams:
+                for token in self.trigram_tokens.get(trigram, ()):
+                    shared[token] = shared.get(token, 0) + 1
+            for token, count in shared.items():
+                similarity = count / (
+                    len(query_trigrams) + self.trigram_counts[token] - count
+                )
+                if similarity >= MIN_SIMILARITY:
+                    collect(token, similarity)
+        return matches
+
+    def search(self, query, allowed=None, limit=20):
+        """
+        Returns documents that match every token of the query, best first.
+
+        allowed is an optional predicate on document keys.
+        """
+        query_tokens = list(dict.fromkeys(tokenize(query)))
+        if not query_tokens:
+            return []
+        with self._lock:
+            scores = None
+            for query_token in query_tokens:
+                matches = self._match(query_token)
+                if scores is None:
+                    scores = matches
+                else:
+                    scores = {
+                        key: score + matches[key]
+                        for key, score in scores.items()
+                        if key in matches
+                    }
+                if not scores:
+                    return []
+            ranked = heapq.nsmallest(
+                limit,
+                (
+                    (-score, self.documents[key]["name"], key)
+                    for key, score in scores.items()
+                    if allowed is None or allowed(key)
+                ),
+            )
+            return [self.documents[key] for _, _, key in ranked]
+
+
+# ============================================================
+# Documents
+# ============================================================
+def load_documents(keys=None):
+    """
+    Loads search documents of all menu objects, or only of the given
+    (id, is_ready_made_product) keys.
+    """
+    items = Item.objects.select_related("category").prefetch_related(
+        "compositions__ingredient"
+    )
+    products = ReadyMadeProduct.objects.select_related("category")
+    if keys is not None:
+        items = items.filter(id__in=[key for key, is_product in keys if not is_product])
+        products = products.filter(
+            id__in=[key for key, is_product in keys if is_product]
+        )
+
+    documents = []
+    for item in items:
+        documents.append(
+            {
+                "id": item.id,
+                "name": item.name,
+                "price": float(item.price),
+                "image": item.image.url if item.image else None,
+                "category_name": item.category.name,
+                "description": item.description,
+                "ingredients": [
+                    {"name": composition.ingredient.name}
+                    for composition in item.compositions.all()
+                    if composition.ingredient is not None
+                ],
+                "is_ready_made_product": False,
+            }
+        )
+    for product in products:
+        documents.append(
+            {
+                "id": product.id,
+                "name": product.name,
+                "price": float(product.price) if product.price is not None else None,
+                "image": product.image.url if product.image else None,
+                "category_name": product.category.name if product.category else None,
+                "description": product.description,
+                "ingredients": [],
+                "is_ready_made_product": True,
+            }
+        )
+    return documents
+
+
+# ============================================================
+# Synchronization
+# ============================================================
+_index = None
+_version = None
+_sync_lock = threading.Lock()
+
+
+def _current_version():
+    """
+    Returns the change counter, creating it from the current time in
+    milliseconds if it was evicted so that versions never repeat.
+    """
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def _rebuild(version):
+    """
+    Indexes every menu object from scratch.
+    """
+    global _index, _version
+    index = SearchIndex()
+    for document in load_documents():
+        index.add(document)
+    _index, _version = index, version
+    return _index
+
+
+def get_local_index():
+    """
+    Returns the process index with all recorded changes applied.
+    """
+    global _version
+    with _sync_lock:
+        version = _current_version()
+        if _index is not None and version == _version:
+            return _index
+        if _index is None or not 0 < version - _version <= MAX_CHANGES:
+            return _rebuild(version)
+
+        change_keys = [
+            CHANGE_KEY.format(version=number)
+            for number in range(_version + 1, version + 1)
+        ]
+        changes = cache.get_many(change_keys)
+        if len(changes) != len(change_keys):
+            return _rebuild(version)
+        keys = {tuple(key) for change in changes.values() for key in change}
+        for document in load_documents(keys):
+            keys.discard((document["id"], document["is_ready_made_product"]))
+            _index.add(document)
+        for key in keys:
+            _index.remove(key)
+        _version = version
+        return _index
+
+
+def record_changes(keys):
+    """
+    Records changed (id, is_ready_made_product) document keys for every
+    process.
+    """
+    keys = [tuple(key) for key in keys]
+    if not keys:
+        return
+    _current_version()
+    version = cache.incr(VERSION_KEY)
+    cache.set(CHANGE_KEY.format(version=version), keys, CHANGE_TIMEOUT)
+
+
+def record_changes_on_commit(keys):
+    """
+    Records changed document keys once the current transaction commits.
+    """
+    keys = list(keys)
+
+    def record_changes_after_commit():
+        record_changes(keys)
+
+    transaction.on_commit(record_changes_after_commit, robust=True)
+
+
+class LocalSearchBackend:
+    """
+    Searches the in-process index and keeps only the objects available at
+    the branch.
+    """
+
+    def search(self, query, branch_id):
+        """
+        Returns hits of the branch that match the query.
+        """
+        index = get_local_index()
+        available_item_ids = get_available_item_ids(branch_id)
+        available_product_ids = set(
+            ReadyMadeProductAvailableAtTheBranch.objects.filter(
+                branch_id=branch_id, quantity__gte=1
+            ).values_list("ready_made_product_id", flat=True)
+        )
+
+        def allowed(key):
+            object_id, is_product = key
+            if is_product:
+                return object_id in available_product_ids
+            return object_id in available_item_ids
+
+        return [
+            dict(
+                document,
+                objectID=f"{document['id']}_{branch_id}",
+                branch_id=branch_id,
+            )
+            for document in index.search(query, allowed)
+        ]
@@ -0,0 +1,281 @@
+"""
+Module for atomic stock updates.
+"""
+import random
+import time
+from decimal import Decimal
+from functools import reduce, wraps
+from operator import or_
+
+from django.db import OperationalError, connection, transaction
+from django.db.models import Case, DecimalField, F, IntegerField, Q, Value, When
+
+from apps.storage.models import (
+    AvailableAtTheBranch,
+    ReadyMadeProductAvailableAtTheBranch,
+)
+from apps.storage.tasks import index_menu_task
+from utils.availability import update_availability_on_commit
+from utils.low_stock import (
+    detect_low_ingredients,
+    detect_low_ready_made_products,
+    get_limit,
+)
+from utils.dispatch import dispatch_on_commit
+from utils.menu_cache import bump_stock_version_on_commit
+
+
+# Messages of the errors after which the whole transaction can be safely run
+# again: PostgreSQL serialization failures and deadlocks, and SQLite write
+# lock contention.
+RETRYABLE_ERRORS = (
+    "could not serialize access",
+    "deadlock detected",
+    "database is locked",
+    "database table is locked",
+)
+RETRYABLE_PGCODES = ("40001", "40P01")
+
+
+class InsufficientStock(Exception):
+    """
+    Raised when a branch does not have enough stock for a write-off.
+    """
+
+    def __init__(self, branch_id, keys):
+        self.branch_id = branch_id
+        self.keys = keys
+        super().__init__(f"Not enough stock at branch {branch_id} for {keys}.")
+
+
+def is_retryable(error):
+    """
+    Checks if the database error is a serialization failure or a deadlock.
+    """
+    if getattr(error.__cause__, "pgcode", None) in RETRYABLE_PGCODES:
+        return True
+    message = str(error).lower()
+    return any(retryable in message for retryable in RETRYABLE_ERRORS)
+
+
+def retry_on_conflict(attempts=10, backoff=0.05, max_backoff=1.0):
+    """
+    Retries the decorated function on serialization failures and deadlocks.
+
+    The function must run its own transaction. Inside an outer atomic block
+    the transaction is already broken, so the error is raised to the caller.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            for attempt in range(attempts):
+                try:
+                    return func(*args, **kwargs)
+                except OperationalError as e:
+                    if (
+                        attempt == attempts - 1
+                        or connection.in_atomic_block
+                        or not is_retryable(e)
+                    ):
+                        raise
+                    delay = min(backoff * 2**attempt, max_backoff)
+                    time.sleep(delay * random.uniform(0.5, 1.5))
+
+        return wrapper
+
+    return decorator
+
+
+def decrement_ingredients(branch_id, demand):
+    """
+    Writes off {ingredient_id: quantity} from the branch stock.
+
+    Rows are locked in ingredient id order so concurrent orders can not
+    deadlock, and all of them are decremented by one
+    UPDATE ... SET quantity = quantity - X WHERE quantity >= X.
+    Raises InsufficientStock and rolls back if any ingredient is short.
+    Queryset updates send no signals, so menu snapshots, item availability,
+    the Algolia index and low stock alerts are updated here.
+    """
+    changes, limits = _decrement(
+        AvailableAtTheBranch.objects.filter(branch_id=branch_id),
+        "ingredient_id",
+        demand,
+        DecimalField(max_digits=10, decimal_places=2),
+        branch_id,
+    )
+    update_availability_on_commit([branch_id], ingredient_ids=demand)
+    detect_low_ingredients(branch_id, changes, limits)
+
+
+def decrement_ready_made_products(branch_id, demand):
+    """
+    Writes off {ready_made_product_id: quantity} from the branch stock.
+    """
+    changes, limits = _decrement(
+        ReadyMadeProductAvailableAtTheBranch.objects.filter(branch_id=branch_id),
+        "ready_made_product_id",
+        demand,
+        IntegerField(),
+        branch_id,
+    )
+    detect_low_ready_made_products(branch_id, changes, limits)
+
+
+def increment_ingredients(branch_id, supply):
+    """
+    Returns {ingredient_id: quantity} to the branch stock.
+    """
+    changes, limits = _increment(
+        AvailableAtTheBranch.objects.filter(branch_id=branch_id),
+        "ingredient_id",
+        supply,
+        DecimalField(max_digits=10, decimal_places=2),
+        branch_id,
+    )
+    update_availability_on_commit([branch_id], ingredient_ids=supply)
+    detect_low_ingredients(branch_id, changes, limits)
+
+
+def increment_ready_made_products(branch_id, supply):
+    """
+    Returns {ready_made_product_id: quantity} to the branch stock.
+    """
+    changes, limits = _increment(
+        ReadyMadeProductAvailableAtTheBranch.objects.filter(branch_id=branch_id),
+        "ready_made_product_id",
+        supply,
+        IntegerField(),
+        branch_id,
+    )
+    detect_low_ready_made_products(branch_id, changes, limits)
+
+
+def _decrement(queryset, key, demand, output_field, branch_id):
+    """
+    Locks the rows in key order and decrements them in one statement.
+    Returns {key: (old quantity, new quantity)} and {key: minimal limit}.
+
+    The stock of a key may be split over several rows; the demand is
+    taken from them in id order and the statement updates each row by id.
+    """
+    demand = {k: _value(v) for k, v in demand.items() if v > 0}
+    if not demand:
+        return {}, {}
+    keys = sorted(demand)
+    with transaction.atomic():
+        rows, limits = _lock(queryset, key, keys)
+        totals = _totals(rows)
+        short = [k for k in keys if totals.get(k, 0) < demand[k]]
+        if short:
+            raise InsufficientStock(branch_id, short)
+        write_offs = _allocate(rows, demand)
+        enough = reduce(
+            or_,
+            (
+                Q(id=row_id, quantity__gte=quantity)
+                for row_id, quantity in write_offs.items()
+            ),
+        )
+        updated = queryset.filter(enough).update(
+            quantity=F("quantity") - _by_key("id", write_offs, output_field)
+        )
+        if updated != len(write_offs):
+            raise InsufficientStock(branch_id, keys)
+        bump_stock_version_on_commit(branch_id)
+        dispatch_on_commit(index_menu_task, [branch_id])
+    return {k: (totals[k], totals[k] - demand[k]) for k in keys}, limits
+
+
+def _increment(queryset, key, supply, output_field, branch_id):
+    """
+    Locks the rows in key order and increments them in one statement.
+    Returns {key: (old quantity, new quantity)} of the existing rows and
+    {key: minimal limit}.
+
+    The supply of a key is added to its first row.
+    """
+    supply = {k: _value(v) for k, v in supply.items() if v > 0}
+    if not supply:
+        return {}, {}
+    keys = sorted(supply)
+    with transaction.atomic():
+        rows, limits = _lock(queryset, key, keys)
+        first_rows = {}
+        for row_id, k, _ in rows:
+            first_rows.setdefault(k, row_id)
+        additions = {row_id: supply[k] for k, row_id in first_rows.items()}
+        if additions:
+            queryset.filter(id__in=additions).update(
+                quantity=F("quantity") + _by_key("id", additions, output_field)
+            )
+        bump_stock_version_on_commit(branch_id)
+        dispatch_on_commit(index_menu_task, [branch_id])
+    totals = _totals(rows)
+    return {k: (q, q + supply[k]) for k, q in totals.items()}, limits
+
+
+def _lock(queryset, key, keys):
+    """
+    Locks the rows in key order and reads their quantities and minimal
+    limits before anything is written. Returns [(id, key, quantity)] and
+    {key: minimal limit}.
+    """
+    rows = (
+        queryset.filter(**{f"{key}__in": keys})
+        .select_for_update()
+        .order_by(key, "id")
+        .annotate(minimal_limit=get_limit(key))
+        .values_list("id", key, "quantity", "minimal_limit")
+    )
+    locked, limits = [], {}
+    for row_id, k, quantity, limit in rows:
+        locked.append((row_id, k, quantity))
+        limits[k] = limit
+    return locked, limits
+
+
+def _totals(rows):
+    """
+    Sums the quantities of the locked rows by key.
+    """
+    totals = {}
+    for _, k, quantity in rows:
+        totals[k] = totals.get(k, 0) + quantity
+    return totals
+
+
+def _allocate(rows, demand):
+    """
+    Splits the demand of every key over its rows in id order and returns
+    {row id: quantity to write off}.
+    """
+    remaining = dict(demand)
+    write_offs = {}
+    for row_id, k, quantity in rows:
+        take = min(max(quantity, 0), remaining[k])
+        if take > 0:
+            write_offs[row_id] = take
+            remaining[k] -= take
+    return write_offs
+
+
+def _by_key(key, quantities, output_field):
+    """
+    Builds CASE key WHEN k THEN quantity ... END.
+    """
+    return Case(
+        *[When(**{key: k}, then=Value(_value(v))) for k, v in quantities.items()],
+        default=Value(0),
+        output_field=output_field,
+    )
+
+
+def _value(quantity):
+    """
+    Normalizes a quantity for a query parameter.
+    """
+    if isinstance(quantity, float):
+        return Decimal(str(quantity))
+    return quantity
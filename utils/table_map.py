@@ -0,0 +1,114 @@
+"""
+Module for the table occupancy maps of the branches.
+
+The map of a branch holds its number of tables and {table: [order ids]}
+of the open orders at the tables, so a table is occupied while it is a
+key. It is cached whole in the shared cache and read with one cache get;
+it is built from the orders with one query when it is missing.
+
+The order and branch signals apply every change to the cached map after
+the transaction commits and then publish a refresh to the waiters of the
+branch, so the map is never older than the event. Changes and builds of
+a map hold a short cache lock, so a change is neither lost to a
+concurrent change nor overwritten by a build from older data. A build
+that does not get the lock is served without being cached, and a change
+that does not get it drops the cached map, so it is rebuilt on the next
+read.
+"""
+from django.core.cache import cache
+
+from apps.branches.models import Branch
+from apps.ordering.models import Order
+from utils.locks import cache_lock
+
+
+OPEN_STATUSES = ("new", "in_progress", "ready")
+# The signals keep the map current; the short timeout only bounds how long
+# a change that never reached the cache, such as a queryset update, is
+# served.
+TABLE_MAP_TIMEOUT = 60
+TABLE_MAP_KEY = "table_map:{branch_id}"
+LOCK_KEY = "table_map:lock:{branch_id}"
+# Seconds a lock is held at most, which is also how long a change waits
+# for a lock a crashed process left behind.
+LOCK_TIMEOUT = 5
+
+
+def _lock(branch_id):
+    """
+    Holds the lock of the map of the branch until the block exits and
+    yields whether it was acquired.
+    """
+    return cache_lock(LOCK_KEY.format(branch_id=branch_id), LOCK_TIMEOUT)
+
+
+def build_table_map(branch_id):
+    """
+    Builds the table map of the branch from its open orders. Raises
+    Branch.DoesNotExist for an unknown branch.
+    """
+    tables = Branch.objects.values_list("counts_of_tables", flat=True).get(id=branch_id)
+    orders = {}
+    for order_id, table in (
+        Order.objects.filter(branch_id=branch_id, status__in=OPEN_STATUSES, table__gt=0)
+        .order_by("id")
+        .values_list("id", "table")
+    ):
+        orders.setdefault(table, []).append(order_id)
+    return {"tables": tables, "orders": orders}
+
+
+def get_table_map(branch_id):
+    """
+    Returns the cached table map of the branch, building it on a miss.
+    """
+    key = TABLE_MAP_KEY.format(branch_id=branch_id)
+    table_map = cache.get(key)
+    if table_map is None:
+        with _lock(branch_id) as locked:
+            table_map = cache.get(key)
+            if table_map is None:
+                table_map = build_table_map(branch_id)
+                if locked:
+                    cache.set(key, table_map, TABLE_MAP_TIMEOUT)
+    return table_map
+
+
+def update_table_map(branch_id, order_id, table=None, status=None):
+    """
+    Applies the table and status of the order to the cached map of the
+    branch. A deleted order is applied without a table.
+    """
+    key = TABLE_MAP_KEY.format(branch_id=branch_id)
+    with _lock(branch_id) as locked:
+        if not locked:
+            cache.delete(key)
+            return
+        table_map = cache.get(key)
+        if table_map is None:
+            return
+        orders = table_map["orders"]
+        for number, order_ids in list(orders.items()):
+            if order_id in order_ids:
+                order_ids.remove(order_id)
+                if not order_ids:
+                    del orders[number]
+        if table and table > 0 and status in OPEN_STATUSES:
+            orders.setdefault(table, []).append(order_id)
+        cache.set(key, table_map, TABLE_MAP_TIMEOUT)
+
+
+def update_table_count(branch_id, tables):
+    """
+    Sets the number of tables of the cached map of the branch.
+    """
+    key = TABLE_MAP_KEY.format(branch_id=branch_id)
+    with _lock(branch_id) as locked:
+        if not locked:
+            cache.delete(key)
+            return
+        table_map = cache.get(key)
+        if table_map is None or table_map["tables"] == tables:
+            return
+        table_map["tables"] = tables
+        cache.set(key, table_map, TABLE_MAP_TIMEOUT)